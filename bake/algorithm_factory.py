@@ -0,0 +1,187 @@
+import json.decoder
+import logging
+
+import numpy as np
+
+from funscript.collect_funscripts import Resource
+from funscript.funscript import Funscript
+from qt_ui import settings
+from qt_ui.device_wizard.axes import AxisEnum
+from qt_ui.device_wizard.enums import DeviceConfiguration, DeviceType, WaveformType
+from qt_ui.models.funscript_kit_items import FunscriptKit
+from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
+from stim_math.audio_gen.continuous import ThreePhaseAlgorithm
+from stim_math.audio_gen.params import *
+from stim_math.audio_gen.pulse_based import DefaultThreePhasePulseBasedAlgorithm
+from stim_math.axis import create_precomputed_axis, AbstractTimestampMapper, AbstractMediaSync, AbstractAxis
+
+logger = logging.getLogger('restim.bake')
+
+
+def load_funscripts(kit: FunscriptKit, resources: list[Resource]) -> dict[AxisEnum, Funscript]:
+    """
+    Load the funscripts and link them to an axis, like ScriptMappingModel.auto_link_funscripts().
+    If multiple funscripts link to the same axis, the first one is used.
+    """
+    funscripts = {}
+    for resource in resources:
+        suffix = resource.funscript_type()
+        if not suffix:
+            continue
+        for kit_item in kit.funscript_conifg():
+            if kit_item.auto_loading and kit_item.allow_funscript_control and suffix in kit_item.funscript_names:
+                if kit_item.axis in funscripts:
+                    break
+                try:
+                    funscripts[kit_item.axis] = Funscript.from_file(resource.path)
+                    logger.info(f'linking `{resource.name()}` to {kit_item.axis.display_name()}.')
+                except json.decoder.JSONDecodeError:
+                    logger.error(f'Unable to parse funscript, broken? {resource.path}')
+                break
+    return funscripts
+
+
+class HeadlessAlgorithmFactory:
+    """
+    Qt-free counterpart of AlgorithmFactory, for baking audio without the main window.
+    Parameters without funscript are read from the settings, like the main window would on startup.
+    """
+    def __init__(self,
+                 kit: FunscriptKit,
+                 funscripts: dict[AxisEnum, Funscript],
+                 timestamp_mapper: AbstractTimestampMapper,
+                 media_sync: AbstractMediaSync,
+                 ):
+        self.kit = kit
+        self.funscripts = funscripts
+        self.timestamp_mapper = timestamp_mapper
+        self.media_sync = media_sync
+
+    def create_algorithm(self, device: DeviceConfiguration) -> AudioGenerationAlgorithm:
+        if device.device_type != DeviceType.AUDIO_THREE_PHASE:
+            raise RuntimeError('only audio devices can be baked')
+        if device.waveform_type == WaveformType.CONTINUOUS:
+            return self.create_3phase_continuous(device)
+        elif device.waveform_type == WaveformType.PULSE_BASED:
+            return self.create_3phase_pulsebased(device)
+        else:
+            raise RuntimeError('waveform type not supported for headless bake')
+
+    def create_3phase_continuous(self, device: DeviceConfiguration) -> AudioGenerationAlgorithm:
+        return ThreePhaseAlgorithm(
+            self.media_sync,
+            ThreephaseContinuousAlgorithmParams(
+                position=self.get_position_params(),
+                transform=self.get_transform_params(),
+                calibrate=self.get_calibrate_params(),
+                vibration_1=self.get_vibration_params(1),
+                vibration_2=self.get_vibration_params(2),
+                volume=self.get_volume_params(),
+                carrier_frequency=self.get_axis(AxisEnum.CARRIER_FREQUENCY, settings.mk312_carrier.get()),
+            ),
+            safety_limits=SafetyParams(
+                device.min_frequency,
+                device.max_frequency,
+            )
+        )
+
+    def create_3phase_pulsebased(self, device: DeviceConfiguration) -> AudioGenerationAlgorithm:
+        return DefaultThreePhasePulseBasedAlgorithm(
+            self.media_sync,
+            ThreephasePulsebasedAlgorithmParams(
+                position=self.get_position_params(),
+                transform=self.get_transform_params(),
+                calibrate=self.get_calibrate_params(),
+                vibration_1=self.get_vibration_params(1),
+                vibration_2=self.get_vibration_params(2),
+                volume=self.get_volume_params(),
+                carrier_frequency=self.get_axis(AxisEnum.CARRIER_FREQUENCY, settings.pulse_carrier_frequency.get()),
+                pulse_frequency=self.get_axis(AxisEnum.PULSE_FREQUENCY, settings.pulse_frequency.get()),
+                pulse_width=self.get_axis(AxisEnum.PULSE_WIDTH, settings.pulse_width.get()),
+                pulse_interval_random=self.get_axis(AxisEnum.PULSE_INTERVAL_RANDOM, settings.pulse_interval_random.get() / 100),
+                pulse_rise_time=self.get_axis(AxisEnum.PULSE_RISE_TIME, settings.pulse_rise_time.get()),
+            ),
+            safety_limits=SafetyParams(
+                device.min_frequency,
+                device.max_frequency,
+            )
+        )
+
+    def get_position_params(self):
+        return ThreephasePositionParams(
+            self.get_axis(AxisEnum.POSITION_ALPHA, 0.0),
+            self.get_axis(AxisEnum.POSITION_BETA, 0.0),
+        )
+
+    def get_transform_params(self):
+        combobox_selection = settings.threephase_transform_combobox_selection.get()
+        enabled = settings.threephase_transform_enabled.get()
+        return ThreephasePositionTransformParams(
+            transform_enabled=self.constant(enabled and combobox_selection == 0),
+            transform_rotation_degrees=self.constant(settings.threephase_transform_rotate.get()),
+            transform_mirror=self.constant(settings.threephase_transform_mirror.get()),
+            transform_top_limit=self.constant(settings.threephase_transform_limit_top.get()),
+            transform_bottom_limit=self.constant(settings.threephase_transform_limit_bottom.get()),
+            transform_left_limit=self.constant(settings.threephase_transform_limit_left.get()),
+            transform_right_limit=self.constant(settings.threephase_transform_limit_right.get()),
+
+            map_to_edge_enabled=self.constant(enabled and combobox_selection == 1),
+            map_to_edge_start=self.constant(settings.threephase_map_to_edge_start.get()),
+            map_to_edge_length=self.constant(settings.threephase_map_to_edge_length.get()),
+            map_to_edge_invert=self.constant(settings.threephase_map_to_edge_invert.get()),
+
+            exponent=self.constant(settings.threephase_exponent.get()),
+        )
+
+    def get_calibrate_params(self):
+        return ThreephaseCalibrationParams(
+            neutral=self.constant(settings.threephase_calibration_neutral.get()),
+            right=self.constant(settings.threephase_calibration_right.get()),
+            center=self.constant(settings.threephase_calibration_center.get()),
+        )
+
+    def get_volume_params(self):
+        return VolumeParams(
+            api=self.get_axis(AxisEnum.VOLUME_API, 1.0),
+            master=self.constant(1.0),      # ramp does NOT work in bake mode
+            inactivity=self.constant(1.0),  # inactivity does NOT work in bake mode
+            external=self.constant(1.0),    # external volume does NOT work in bake mode
+        )
+
+    def get_vibration_params(self, index: int):
+        if index == 1:
+            axes = (AxisEnum.VIBRATION_1_FREQUENCY, AxisEnum.VIBRATION_1_STRENGTH, AxisEnum.VIBRATION_1_LEFT_RIGHT_BIAS,
+                    AxisEnum.VIBRATION_1_HIGH_LOW_BIAS, AxisEnum.VIBRATION_1_RANDOM)
+            values = (settings.vibration_1_enabled, settings.vibration_1_frequency, settings.vibration_1_strength,
+                      settings.vibration_1_left_right_bias, settings.vibration_1_high_low_bias, settings.vibration_1_random)
+        else:
+            axes = (AxisEnum.VIBRATION_2_FREQUENCY, AxisEnum.VIBRATION_2_STRENGTH, AxisEnum.VIBRATION_2_LEFT_RIGHT_BIAS,
+                    AxisEnum.VIBRATION_2_HIGH_LOW_BIAS, AxisEnum.VIBRATION_2_RANDOM)
+            values = (settings.vibration_2_enabled, settings.vibration_2_frequency, settings.vibration_2_strength,
+                      settings.vibration_2_left_right_bias, settings.vibration_2_high_low_bias, settings.vibration_2_random)
+        enabled, frequency, strength, left_right_bias, high_low_bias, random = values
+        frequency_axis, strength_axis, left_right_bias_axis, high_low_bias_axis, random_axis = axes
+
+        # vibration is enabled automatically if any of the vibration axis is controlled by funscript
+        is_enabled = enabled.get() or any(axis in self.funscripts for axis in axes)
+        return VibrationParams(
+            enabled=self.constant(is_enabled),
+            frequency=self.get_axis(frequency_axis, frequency.get()),
+            strength=self.get_axis(strength_axis, strength.get() / 100),
+            left_right_bias=self.get_axis(left_right_bias_axis, left_right_bias.get() / 100),
+            high_low_bias=self.get_axis(high_low_bias_axis, high_low_bias.get() / 100),
+            random=self.get_axis(random_axis, random.get() / 100),
+        )
+
+    def constant(self, value) -> AbstractAxis:
+        return create_precomputed_axis([0], [value], self.timestamp_mapper)
+
+    def get_axis(self, axis: AxisEnum, default_value) -> AbstractAxis:
+        funscript = self.funscripts.get(axis, None)
+        if funscript is None:
+            return self.constant(default_value)
+
+        limit_min, limit_max = self.kit.limits_for_axis(axis)
+        return create_precomputed_axis(funscript.x,
+                                       np.clip(funscript.y, 0, 1) * (limit_max - limit_min) + limit_min,
+                                       self.timestamp_mapper)
@@ -0,0 +1,270 @@
+import collections
+import io
+import logging
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import soundfile as sf
+
+from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
+from stim_math.axis import AbstractMediaSync, AbstractTimestampMapper, Timeline
+from stim_math.axis_group import SharedTimeline
+
+logger = logging.getLogger('restim.bake_audio')
+
+
+class BakeTimestampMapper(AbstractTimestampMapper, AbstractMediaSync):
+    def __init__(self, epoch):
+        self.epoch = epoch
+
+    def is_playing(self) -> bool:
+        return True
+
+    def map_timestamp(self, timestamp):
+        return timestamp - self.epoch
+
+
+@dataclass
+class BakeSummary:
+    filename: str
+    samplerate: int
+    channels: int
+    duration_in_s: float
+    elapsed_in_s: float
+    interrupted: bool
+    peak_memory_in_bytes: int | None
+
+    def realtime_factor(self) -> float:
+        return self.duration_in_s / max(self.elapsed_in_s, 1e-9)
+
+    def to_dict(self) -> dict:
+        return {
+            'filename': self.filename,
+            'samplerate': self.samplerate,
+            'channels': self.channels,
+            'duration_in_s': self.duration_in_s,
+            'elapsed_in_s': self.elapsed_in_s,
+            'realtime_factor': self.realtime_factor(),
+            'interrupted': self.interrupted,
+            'peak_memory_in_bytes': self.peak_memory_in_bytes,
+        }
+
+
+def peak_memory_in_bytes() -> int | None:
+    """
+    :return: peak resident memory of this process, or None if not available on this platform.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+
+def timeline_chunks(samplerate: int, start_sample: int, end_sample: int, epoch: float, chunk_size: int):
+    """
+    Generate the timeline in chunks of at most chunk_size samples, on demand.
+    """
+    for start in range(start_sample, end_sample, chunk_size):
+        end = min(start + chunk_size, end_sample)
+        yield np.arange(start, end) / samplerate + epoch
+
+
+def audio_chunks(algo: AudioGenerationAlgorithm, samplerate: int, start_sample: int, end_sample: int, epoch: float,
+                 chunk_size: int):
+    """
+    Generate audio in chunks of shape (n, channels), ready to be written with soundfile.
+    The chunks are views into a reused buffer, and only valid until the next chunk is requested.
+    """
+    buffer = np.zeros((chunk_size, algo.channel_count()), dtype=np.float32)
+    for timeline in timeline_chunks(samplerate, start_sample, end_sample, epoch, chunk_size):
+        out = buffer[:len(timeline)]
+        for channel, data in enumerate(algo.generate_audio(samplerate, timeline, timeline)):
+            out[:, channel] = data
+        yield out
+
+
+# timelines of the algorithm being baked, in a worker process of parallel_audio_chunks()
+_worker_timelines = []
+
+
+class _TimelineCollector(pickle.Pickler):
+    """
+    Walks an algorithm like pickle does, to find the timelines of its precomputed axes (funscripts).
+    """
+    def __init__(self):
+        super().__init__(io.BytesIO(), pickle.HIGHEST_PROTOCOL)
+        self.timelines = {}     # id -> timeline
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (Timeline, SharedTimeline)):
+            self.timelines[id(obj)] = obj
+            return id(obj)      # not worth pickling, only collected
+        return None
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickles the given timelines as an index into the list, so the snapshot of an algorithm only holds its state.
+    Timelines are never modified, the lookup hints of a SharedTimeline do not change the result.
+    """
+    def __init__(self, file, timelines: list):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.indices = {id(timeline): i for i, timeline in enumerate(timelines)}
+
+    def persistent_id(self, obj):
+        return self.indices.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return _worker_timelines[pid]
+
+
+def _init_worker(timelines: list):
+    global _worker_timelines
+    _worker_timelines = timelines
+
+
+def _render_segment(snapshot: bytes, samplerate: int, start_sample: int, end_sample: int, epoch: float,
+                    chunk_size: int) -> np.ndarray:
+    algo, random_state = _SnapshotUnpickler(io.BytesIO(snapshot)).load()
+    np.random.set_state(random_state)
+    out = np.empty((end_sample - start_sample, algo.channel_count()), dtype=np.float32)
+    i = 0
+    for data in audio_chunks(algo, samplerate, start_sample, end_sample, epoch, chunk_size):
+        out[i:i + len(data)] = data
+        i += len(data)
+    return out
+
+
+def parallel_audio_chunks(algo: AudioGenerationAlgorithm, samplerate: int, start_sample: int, end_sample: int,
+                          epoch: float, chunk_size: int, workers: int, segment_size: int):
+    """
+    Like audio_chunks(), but the segments of segment_size samples are rendered in a process pool.
+
+    This process fast-forwards the algorithm with skip_audio() over the same chunk grid, and hands each worker
+    a pickled snapshot of the algorithm (carrier and vibration phase, pulse polarity and phase offset,
+    partially rendered pulse) plus the state of the random generator at the start of its segment.
+    The output is therefore identical to audio_chunks(), and the segments join sample-continuous.
+    The funscripts are sent to every worker once, when it starts, the snapshots refer to them.
+    Yields one array of shape (n, channels) per segment, in order.
+    """
+    # segment boundaries must be on the chunk grid, the algorithms sample some parameters once per chunk
+    segment_size = max(1, segment_size // chunk_size) * chunk_size
+    collector = _TimelineCollector()
+    collector.dump(algo)
+    timelines = list(collector.timelines.values())
+
+    pending = collections.deque()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(timelines, )) as executor:
+        try:
+            for start in range(start_sample, end_sample, segment_size):
+                end = min(start + segment_size, end_sample)
+                snapshot = io.BytesIO()
+                _SnapshotPickler(snapshot, timelines).dump((algo, np.random.get_state()))
+                snapshot = snapshot.getvalue()
+                pending.append(executor.submit(_render_segment, snapshot, samplerate, start, end, epoch, chunk_size))
+                if end < end_sample:
+                    for timeline in timeline_chunks(samplerate, start, end, epoch, chunk_size):
+                        algo.skip_audio(samplerate, timeline, timeline)
+
+                # limit the number of finished segments waiting in memory
+                while len(pending) > 2 * workers or (pending and pending[0].done()):
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def bake_audio(algo: AudioGenerationAlgorithm, filename: str, samplerate: int, duration_in_s: float, epoch: float,
+               progress=None, is_interrupted=None, chunk_size: int = None,
+               workers: int = 1, segment_duration_in_s: float = 30.0) -> BakeSummary | None:
+    """
+    Render the output of the algorithm to an audio file, as fast as possible.
+    Audio is generated and written in chunks, so memory usage does not depend on the duration.
+    :param epoch: timestamp that corresponds to the start of the media, see BakeTimestampMapper
+    :param progress: optional callback, called with the number of seconds baked so far
+    :param is_interrupted: optional callback, return True to stop baking
+    :param chunk_size: samples per chunk, defaults to 0.1s
+    :param workers: number of processes. With more than one, segments are rendered in parallel,
+        see parallel_audio_chunks(). The algorithm must be picklable. Limited to the number of cores,
+        this process also fast-forwards the algorithm, so one core gains nothing.
+    :param segment_duration_in_s: length of the segments for a parallel bake
+    :return: summary, or None if the output file could not be opened
+    """
+    logger.info('bake audio started.')
+    logger.info(f'target file: {filename}')
+    duration_in_samples = int(samplerate * duration_in_s)
+    chunk_size = chunk_size or int(samplerate / 10)
+    start_time = time.time()
+    try:
+        file = sf.SoundFile(filename, mode='w', samplerate=samplerate, channels=algo.channel_count())
+    except (TypeError, RuntimeError) as e:
+        logger.error("Could not open output file. Error message is:")
+        logger.error(e.__str__())
+        return None
+
+    samples_processed = 0
+    interrupted = False
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1:
+        logger.info(f'rendering in {workers} processes')
+        chunks = parallel_audio_chunks(algo, samplerate, 0, duration_in_samples, epoch, chunk_size,
+                                       workers, int(segment_duration_in_s * samplerate))
+    else:
+        chunks = audio_chunks(algo, samplerate, 0, duration_in_samples, epoch, chunk_size)
+
+    with file:
+        for data in chunks:
+            if is_interrupted and is_interrupted():
+                logger.warning('bake audio interrupted by user')
+                interrupted = True
+                break
+            file.write(data)
+            samples_processed += len(data)
+            if progress:
+                progress(samples_processed / samplerate)
+        chunks.close()
+
+    elapsed_time = time.time() - start_time
+    summary = BakeSummary(filename, samplerate, algo.channel_count(), samples_processed / samplerate, elapsed_time,
+                          interrupted, peak_memory_in_bytes())
+    if not interrupted:
+        peak_memory = f'{summary.peak_memory_in_bytes / 2**20:.0f} MB' if summary.peak_memory_in_bytes else 'unknown'
+        logger.info(f'bake {duration_in_s:.1f} seconds of audio in {elapsed_time:.1f} seconds '
+                    f'({summary.realtime_factor():.1f}x realtime, peak memory {peak_memory})')
+    return summary
@@ -0,0 +1,241 @@
+"""
+Benchmark the audio generation algorithms the way the audio callback drives them:
+one generate_audio() call per block, with real-time timestamps.
+
+Parameters that are set in the user interface are temporal axes (like the main window creates them),
+position and pulse frequency are precomputed axes from a synthetic funscript. The pulse-based-ramp case
+also drives pulse width and rise time from funscripts, so the pulse shape changes with every pulse.
+
+usage: python -m benchmarks.audio_algorithms [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from bake.audio import BakeTimestampMapper
+from benchmarks.results import save_results, load_results, compare_results
+from stim_math.audio_gen.continuous import ThreePhaseAlgorithm
+from stim_math.audio_gen.params import *
+from stim_math.audio_gen.pulse_based import DefaultThreePhasePulseBasedAlgorithm, ABTestThreePhasePulseBasedAlgorithm
+from stim_math.axis import create_temporal_axis, create_precomputed_axis
+
+BLOCK_SIZES = (64, 128, 256, 512, 1024, 2048, 4096)
+SAMPLE_RATES = (44100, 48000, 96000)
+ALGORITHMS = ('continuous', 'pulse-based', 'pulse-based-ramp', 'a-b-test')
+
+
+def synthetic_funscript(rng, duration=600.0, actions_per_second=4.0):
+    """
+    Random strokes, like a typical funscript.
+    """
+    n = int(duration * actions_per_second)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n) / actions_per_second)
+    y = rng.uniform(0, 1, n)
+    return x, y
+
+
+class SyntheticParameters:
+    def __init__(self, mapper: BakeTimestampMapper, seed=0):
+        self.mapper = mapper
+        self.rng = np.random.default_rng(seed)
+
+    def funscript_axis(self, low, high):
+        x, y = synthetic_funscript(self.rng)
+        return create_precomputed_axis(x, y * (high - low) + low, self.mapper)
+
+    def position(self):
+        return ThreephasePositionParams(self.funscript_axis(-1, 1), self.funscript_axis(-1, 1))
+
+    def transform(self):
+        a = create_temporal_axis
+        return ThreephasePositionTransformParams(
+            a(False), a(0.0), a(False), a(1.0), a(-1.0), a(-1.0), a(1.0),
+            a(False), a(0.0), a(180.0), a(False),
+            a(1.0))
+
+    def calibrate(self):
+        return ThreephaseCalibrationParams(create_temporal_axis(0.0),
+                                           create_temporal_axis(0.0),
+                                           create_temporal_axis(-0.7))
+
+    def vibration(self, enabled):
+        a = create_temporal_axis
+        return VibrationParams(a(enabled), a(2.0), a(0.5), a(0.0), a(0.0), a(0.0))
+
+    def volume(self):
+        a = create_temporal_axis
+        return VolumeParams(api=a(1.0), master=a(0.8), inactivity=a(1.0), external=a(1.0))
+
+    def safety_limits(self):
+        return SafetyParams(500, 1000)
+
+    def continuous(self) -> ThreePhaseAlgorithm:
+        return ThreePhaseAlgorithm(
+            self.mapper,
+            ThreephaseContinuousAlgorithmParams(
+                position=self.position(),
+                transform=self.transform(),
+                calibrate=self.calibrate(),
+                vibration_1=self.vibration(True),
+                vibration_2=self.vibration(False),
+                volume=self.volume(),
+                carrier_frequency=create_temporal_axis(700.0),
+            ),
+            self.safety_limits(),
+        )
+
+    def pulse_based(self, ramp=False) -> DefaultThreePhasePulseBasedAlgorithm:
+        a = create_temporal_axis
+        return DefaultThreePhasePulseBasedAlgorithm(
+            self.mapper,
+            ThreephasePulsebasedAlgorithmParams(
+                position=self.position(),
+                transform=self.transform(),
+                calibrate=self.calibrate(),
+                vibration_1=self.vibration(True),
+                vibration_2=self.vibration(False),
+                volume=self.volume(),
+                carrier_frequency=a(700.0),
+                pulse_frequency=self.funscript_axis(20, 80),
+                pulse_width=self.funscript_axis(4, 12) if ramp else a(6.0),
+                pulse_interval_random=a(0.1),
+                pulse_rise_time=self.funscript_axis(2, 5) if ramp else a(2.0),
+            ),
+            self.safety_limits(),
+        )
+
+    def a_b_test(self) -> ABTestThreePhasePulseBasedAlgorithm:
+        a = create_temporal_axis
+        return ABTestThreePhasePulseBasedAlgorithm(
+            self.mapper,
+            ThreephaseABTestAlgorithmParams(
+                position=self.position(),
+                transform=self.transform(),
+                calibrate=self.calibrate(),
+                vibration_1=self.vibration(True),
+                vibration_2=self.vibration(False),
+                volume=self.volume(),
+                a_volume=a(1.0),
+                a_train_duration=a(0.5),
+                a_carrier_frequency=a(700.0),
+                a_pulse_frequency=a(50.0),
+                a_pulse_width=a(6.0),
+                a_pulse_interval_random=a(0.1),
+                a_pulse_rise_time=a(2.0),
+                b_volume=a(0.8),
+                b_train_duration=a(0.5),
+                b_carrier_frequency=a(900.0),
+                b_pulse_frequency=a(30.0),
+                b_pulse_width=a(10.0),
+                b_pulse_interval_random=a(0.0),
+                b_pulse_rise_time=a(4.0),
+            ),
+            self.safety_limits(),
+            lambda is_a_cycle: None,
+        )
+
+    def create(self, algorithm: str):
+        return {
+            'continuous': self.continuous,
+            'pulse-based': self.pulse_based,
+            'pulse-based-ramp': lambda: self.pulse_based(ramp=True),
+            'a-b-test': self.a_b_test,
+        }[algorithm]()
+
+
+def benchmark(algorithm: str, samplerate: int, block_size: int, audio_seconds: float, alloc_blocks: int) -> dict:
+    # start the media halfway, so funscript lookups are not all at the boundary
+    start = time.time()
+    mapper = BakeTimestampMapper(start - 60)
+    algo = SyntheticParameters(mapper).create(algorithm)
+
+    n_blocks = max(int(audio_seconds * samplerate / block_size), 20)
+    block_index = np.arange(block_size)
+    sample = 0
+
+    def run_block():
+        nonlocal sample
+        steady_clock = (block_index + sample) / samplerate
+        algo.generate_audio(samplerate, steady_clock, steady_clock + start)
+        sample += block_size
+
+    # warm up caches and code paths
+    for _ in range(10):
+        run_block()
+
+    block_times = np.empty(n_blocks, dtype=np.int64)
+    for i in range(n_blocks):
+        t0 = time.perf_counter_ns()
+        run_block()
+        block_times[i] = time.perf_counter_ns() - t0
+
+    # allocations are measured in a separate pass, tracing slows everything down
+    tracemalloc.start()
+    allocated = np.empty(alloc_blocks, dtype=np.int64)
+    for i in range(alloc_blocks):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run_block()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated[i] = peak - before
+    tracemalloc.stop()
+
+    block_duration_ns = block_size / samplerate * 1e9
+    p99 = float(np.percentile(block_times, 99))
+    return {
+        'algorithm': algorithm,
+        'samplerate': samplerate,
+        'block_size': block_size,
+        'blocks': n_blocks,
+        'ns_per_sample': float(block_times.sum() / (n_blocks * block_size)),
+        'mean_block_us': float(block_times.mean() / 1e3),
+        'p99_block_us': p99 / 1e3,
+        'max_block_us': float(block_times.max() / 1e3),
+        'p99_load': p99 / block_duration_ns,    # fraction of the callback deadline
+        'alloc_bytes_per_block': float(np.median(allocated)),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark the audio generation algorithms')
+    parser.add_argument('--algorithm', choices=ALGORITHMS, action='append',
+                        help='algorithm to benchmark, can be repeated (default: all)')
+    parser.add_argument('--block-size', type=int, action='append',
+                        help=f'block size in frames, can be repeated (default: {BLOCK_SIZES})')
+    parser.add_argument('--samplerate', type=int, action='append',
+                        help=f'sample rate, can be repeated (default: {SAMPLE_RATES})')
+    parser.add_argument('--seconds', type=float, default=5.0,
+                        help='seconds of audio to generate per test case (default: 5)')
+    parser.add_argument('--alloc-blocks', type=int, default=50,
+                        help='number of blocks to trace allocations for (default: 50)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"algorithm":<16} {"rate":>6} {"block":>6} {"ns/sample":>10} {"p99 us":>10} {"p99 load":>9} {"alloc kB":>9}')
+    for algorithm in args.algorithm or ALGORITHMS:
+        for samplerate in args.samplerate or SAMPLE_RATES:
+            for block_size in args.block_size or BLOCK_SIZES:
+                r = benchmark(algorithm, samplerate, block_size, args.seconds, args.alloc_blocks)
+                results.append(r)
+                print(f'{algorithm:<16} {samplerate:>6} {block_size:>6} {r["ns_per_sample"]:>10.1f} '
+                      f'{r["p99_block_us"]:>10.1f} {r["p99_load"]:>9.3f} {r["alloc_bytes_per_block"] / 1024:>9.1f}')
+
+    if args.output:
+        save_results(args.output, 'audio_algorithms', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('algorithm', 'samplerate', 'block_size'),
+                                    metrics=('ns_per_sample', 'p99_block_us', 'alloc_bytes_per_block')):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Speed of the 1D to 2D funscript conversion: the previous per-action loop compared to the vectorized
+convert_1d_to_2d(), for scripts with a stroke every 50-600ms. With the same seed both must give
+identical output.
+
+usage: python -m benchmarks.funscript_conversion [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.results import save_results, load_results, compare_results
+from funscript.funscript import Funscript
+from funscript.funscript_conversion import convert_1d_to_2d
+
+DURATIONS = (600, 3600, 7200)     # seconds
+SEED = 1234
+
+
+def reference_convert_1d_to_2d(funscript: Funscript, random_direction_change_probability, rng):
+    at, pos = funscript.x, funscript.y
+
+    dir = 1
+
+    t_out = []
+    x_out = []
+    y_out = []
+
+    for i in range(len(pos) - 1):
+        start_t, end_t = at[i:i + 2]
+        start_p, end_p = pos[i:i + 2]
+
+        duration = end_t - start_t
+        if start_p == end_p:
+            n = 1
+        else:
+            if duration <= .100:
+                n = 2
+            elif duration <= .200:
+                n = 3
+            elif duration <= .300:
+                n = 4
+            elif duration <= .400:
+                n = 5
+            else:
+                n = 6
+
+        t = np.linspace(0.0, duration, n, endpoint=False)
+        theta = np.linspace(0, np.pi, n, endpoint=False)
+        center = (end_p + start_p) / 2
+        r = (start_p - end_p) / 2
+
+        if rng.random() < random_direction_change_probability:
+            dir = dir * -1
+
+        x = center + r * np.cos(theta)
+        y = r * dir * np.sin(theta) + 0.5
+        t_out += list(t + start_t)
+        x_out += list(x)
+        y_out += list(y)
+
+    return t_out, x_out, y_out
+
+
+def make_funscript(duration) -> Funscript:
+    rng = np.random.default_rng(duration)
+    at = np.cumsum(rng.integers(50, 600, int(duration / 0.3))) / 1000
+    pos = rng.choice([0, 10, 50, 90, 100], len(at)) / 100
+    return Funscript(at, pos)
+
+
+def best_time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(duration, repeat) -> dict:
+    funscript = make_funscript(duration)
+    expected = reference_convert_1d_to_2d(funscript, 0.1, np.random.default_rng(SEED))
+    result = convert_1d_to_2d(funscript, 0.1, SEED)
+    if not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+        raise RuntimeError(f'output differs from the reference for {duration}s')
+
+    reference = best_time(lambda: reference_convert_1d_to_2d(funscript, 0.1, np.random.default_rng(SEED)), repeat)
+    optimized = best_time(lambda: convert_1d_to_2d(funscript, 0.1, SEED), repeat)
+    return {
+        'duration': duration,
+        'actions': len(funscript.x),
+        'points': len(result[0]),
+        'reference_ms': reference * 1000,
+        'ms': optimized * 1000,
+        'speedup': reference / optimized,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark the 1D to 2D funscript conversion')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per case, the best is used (default: 3)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"duration":>8} {"actions":>8} {"points":>8} {"loop ms":>9} {"ms":>8} {"speedup":>8}')
+    for duration in DURATIONS:
+        r = benchmark(duration, args.repeat)
+        results.append(r)
+        print(f'{duration:>7}s {r["actions"]:>8} {r["points"]:>8} {r["reference_ms"]:>9.1f} {r["ms"]:>8.1f} '
+              f'{r["speedup"]:>7.1f}x')
+
+    if args.output:
+        save_results(args.output, 'funscript_conversion', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('duration',),
+                                    metrics=('ms',)):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
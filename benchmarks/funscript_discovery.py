@@ -0,0 +1,109 @@
+"""
+Speed of collect_funscripts() in a large library: the first lookup in a directory (cold, the directory is listed),
+later lookups of other media in the same directory (warm, one stat per directory) and a lookup after a file was
+added (the changed directory is listed again).
+
+The library is a single directory with a video and a few funscripts per video, plus a zip file with
+funscripts. Timings on a network share are dominated by the round trips, run with --directory on a share
+to measure those.
+
+usage: python -m benchmarks.funscript_discovery [--videos 10000] [--directory path] [--output results.json]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import zipfile
+
+from benchmarks.results import save_results, load_results, compare_results
+from funscript.collect_funscripts import collect_funscripts, FunscriptIndex
+
+AXES = ('', '.alpha', '.beta', '.volume')
+
+
+def make_library(directory, videos, zip_videos=1000):
+    for i in range(videos):
+        open(os.path.join(directory, f'video{i}.mp4'), 'wb').close()
+        for axis in AXES[:1 + i % len(AXES)]:
+            with open(os.path.join(directory, f'video{i}{axis}.funscript'), 'w') as f:
+                f.write('{"actions":[]}')
+    with zipfile.ZipFile(os.path.join(directory, 'zipped.zip'), 'w') as z:
+        for i in range(zip_videos):
+            for axis in AXES:
+                z.writestr(f'zipped{i}{axis}.funscript', '{"actions":[]}')
+    open(os.path.join(directory, 'zipped.mp4'), 'wb').close()
+    # an old mtime, so the index trusts the listings (see FunscriptIndex.racy_interval)
+    past = time.time() - 60
+    os.utime(directory, (past, past))
+
+
+def time_lookups(index_for_lookup, directory, media_names) -> float:
+    start = time.perf_counter()
+    for media in media_names:
+        collect_funscripts([directory], media, index_for_lookup())
+    return (time.perf_counter() - start) / len(media_names)
+
+
+def benchmark(directory, videos, lookups) -> dict:
+    rng = random.Random(0)
+    media_names = [f'video{rng.randrange(videos)}.mp4' for _ in range(lookups)]
+    files = len(os.listdir(directory))
+
+    cold = time_lookups(FunscriptIndex, directory, media_names[:max(1, lookups // 10)])
+
+    index = FunscriptIndex()
+    collect_funscripts([directory], media_names[0], index)
+    warm = time_lookups(lambda: index, directory, media_names)
+    zip_warm = time_lookups(lambda: index, directory, ['zipped.mp4'] * lookups)
+
+    # a new file changes the mtime of the directory
+    new_file = os.path.join(directory, 'new.funscript')
+    open(new_file, 'w').close()
+    past = time.time() - 60
+    os.utime(directory, (past, past))
+    changed = time_lookups(lambda: index, directory, media_names[:1])
+    os.remove(new_file)
+
+    return {
+        'files': files,
+        'cold_ms': cold * 1000,
+        'warm_ms': warm * 1000,
+        'zip_warm_ms': zip_warm * 1000,
+        'changed_ms': changed * 1000,
+        'scans': index.scans,
+        'hits': index.hits,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark funscript discovery')
+    parser.add_argument('--videos', type=int, default=10000, help='videos in the generated library (default: 10000)')
+    parser.add_argument('--lookups', type=int, default=200, help='media names to look up (default: 200)')
+    parser.add_argument('--directory', help='existing empty directory to generate the library in (default: temporary)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        make_library(directory, args.videos)
+        r = benchmark(directory, args.videos, args.lookups)
+    print(f'{r["files"]} files: cold {r["cold_ms"]:.2f}ms, warm {r["warm_ms"]:.3f}ms, '
+          f'warm in zip {r["zip_warm_ms"]:.3f}ms, after a change {r["changed_ms"]:.2f}ms per lookup')
+
+    results = [dict(r, videos=args.videos)]
+    if args.output:
+        save_results(args.output, 'funscript_discovery', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('videos',),
+                                    metrics=('cold_ms', 'warm_ms', 'zip_warm_ms', 'changed_ms')):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
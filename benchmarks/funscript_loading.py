@@ -0,0 +1,132 @@
+"""
+Speed of parsing funscript actions: the json parser with a loop over the actions (the previous method)
+compared to the scanner in funscript.actions_parser, for the compact layout written by most editors
+and the layout of Python's json.dump. Both must give identical arrays, and the same exception for
+broken scripts.
+
+usage: python -m benchmarks.funscript_loading [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.results import save_results, load_results, compare_results
+from funscript.actions_parser import parse_actions, parse_actions_json, scan_actions
+
+ACTION_COUNTS = (10_000, 100_000, 1_000_000)
+LAYOUTS = {
+    'compact': {'separators': (',', ':')},
+    'spaced': {},
+}
+
+# broken or unusual actions that the scanner must leave to json
+BROKEN = (
+    b'{"actions":[{"a5t":1,"pos":2}]}',
+    b'{"actions":[{"at":1,"p1os":2}]}',
+    b'{"actions":[{"at":1,"pos":2}5,{"at":3,"pos":4}]}',
+    b'{"actions":[5{"at":1,"pos":2}]}',
+    b'{"actions":[{"at":1,"pos":2},5]}',
+    b'{"actions":[{"at":1 2,"pos":2}]}',
+    b'{"actions":[{"at":01,"pos":2}]}',
+    b'{"actions":[{"at":,"pos":2}]}',
+    b'{"actions":[{"at":1,"pos":2},]}',
+    b'{"actions":[{"at":1,"pos":2}{"at":3,"pos":4}]}',
+    b'{"actions":[{"at":-1,"pos":2}]}',
+    b'{"actions":[{"at":1.5,"pos":2}]}',
+)
+
+
+def outcome(parse, data):
+    try:
+        return [values.tolist() for values in parse(data)]
+    except Exception as e:
+        return type(e), str(e)
+
+
+def check_broken():
+    for data in BROKEN:
+        if scan_actions(data) is not None:
+            raise RuntimeError(f'scanner accepted {data!r}')
+        if outcome(parse_actions, data) != outcome(parse_actions_json, data):
+            raise RuntimeError(f'result differs from json for {data!r}')
+
+
+def make_funscript(n, layout) -> bytes:
+    rng = np.random.default_rng(n)
+    at = np.cumsum(rng.integers(30, 500, n))
+    pos = rng.integers(0, 101, n)
+    js = {
+        'version': '1.0',
+        'inverted': False,
+        'range': 100,
+        'actions': [{'at': int(a), 'pos': int(p)} for a, p in zip(at, pos)],
+        'metadata': {'title': 'benchmark'},
+    }
+    return json.dumps(js, **LAYOUTS[layout]).encode('utf-8')
+
+
+def best_time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(n, layout, repeat) -> dict:
+    data = make_funscript(n, layout)
+    if scan_actions(data) is None:
+        raise RuntimeError(f'{layout} layout is not handled by the scanner')
+    expected = parse_actions_json(data)
+    result = parse_actions(data)
+    if not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+        raise RuntimeError(f'scanner result differs from json for {n} actions, {layout} layout')
+
+    reference = best_time(lambda: parse_actions_json(data), repeat)
+    optimized = best_time(lambda: parse_actions(data), repeat)
+    return {
+        'actions': n,
+        'layout': layout,
+        'megabytes': len(data) / 1e6,
+        'reference_ms': reference * 1000,
+        'ms': optimized * 1000,
+        'actions_per_s': n / optimized,
+        'speedup': reference / optimized,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark funscript parsing')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per case, the best is used (default: 5)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    check_broken()
+    results = []
+    print(f'{"actions":>8} {"layout":>8} {"MB":>6} {"json ms":>9} {"ms":>8} {"actions/s":>10} {"speedup":>8}')
+    for n in ACTION_COUNTS:
+        for layout in LAYOUTS:
+            r = benchmark(n, layout, args.repeat)
+            results.append(r)
+            print(f'{n:>8} {layout:>8} {r["megabytes"]:>6.1f} {r["reference_ms"]:>9.1f} {r["ms"]:>8.1f} '
+                  f'{r["actions_per_s"]:>10.3g} {r["speedup"]:>7.1f}x')
+
+    if args.output:
+        save_results(args.output, 'funscript_loading', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('actions', 'layout'),
+                                    metrics=('ms',)):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
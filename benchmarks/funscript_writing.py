@@ -0,0 +1,93 @@
+"""
+Speed of writing funscripts: a list of dicts and json.dump (the previous method) compared to
+funscript.actions_writer, for dense generated scripts. Also reports the size of the compact mode.
+
+usage: python -m benchmarks.funscript_writing [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+
+from benchmarks.results import save_results, load_results, compare_results
+from funscript.actions_writer import to_actions, write_actions
+
+ACTION_COUNTS = (10_000, 100_000, 1_000_000)
+
+
+def make_script(n):
+    # like the output of the simfile conversion: a sample every 10ms, with flat parts
+    rng = np.random.default_rng(n)
+    x = np.arange(n) * 0.01
+    y = np.clip(np.sin(x * rng.uniform(1, 3)) * 1.2, 0, 1)
+    return x, y
+
+
+def reference(x, y) -> str:
+    actions = [{"at": int(at * 1000), "pos": int(pos * 100)} for at, pos in zip(x, y)]
+    return json.dumps({"actions": actions})
+
+
+def optimized(x, y, compact=False) -> str:
+    f = io.StringIO()
+    write_actions(f, *to_actions(x, y, compact))
+    return f.getvalue()
+
+
+def best_time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(n, repeat) -> dict:
+    x, y = make_script(n)
+    reference_time = best_time(lambda: reference(x, y), repeat)
+    optimized_time = best_time(lambda: optimized(x, y), repeat)
+    compact_time = best_time(lambda: optimized(x, y, compact=True), repeat)
+    return {
+        'actions': n,
+        'reference_ms': reference_time * 1000,
+        'ms': optimized_time * 1000,
+        'compact_ms': compact_time * 1000,
+        'speedup': reference_time / optimized_time,
+        'megabytes': len(optimized(x, y)) / 1e6,
+        'compact_megabytes': len(optimized(x, y, compact=True)) / 1e6,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark funscript writing')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per case, the best is used (default: 3)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"actions":>8} {"json ms":>9} {"ms":>8} {"compact":>8} {"speedup":>8} {"MB":>6} {"compact MB":>10}')
+    for n in ACTION_COUNTS:
+        r = benchmark(n, args.repeat)
+        results.append(r)
+        print(f'{n:>8} {r["reference_ms"]:>9.1f} {r["ms"]:>8.1f} {r["compact_ms"]:>8.1f} {r["speedup"]:>7.1f}x '
+              f'{r["megabytes"]:>6.1f} {r["compact_megabytes"]:>10.1f}')
+
+    if args.output:
+        save_results(args.output, 'funscript_writing', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('actions',),
+                                    metrics=('ms', 'compact_ms')):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Speed and accuracy of the carrier oscillator, compared to the previous method:
+np.linspace of angles, float64 cos/sin and a cast to float32.
+
+The error is the largest absolute deviation from float64 cos/sin over all tested blocks,
+including phases after hours of playback. 'ramp' is a carrier frequency that changes every block,
+as when it is driven by a funscript, which defeats the table cache.
+
+usage: python -m benchmarks.oscillator [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.results import save_results, load_results, compare_results
+from stim_math.sine_generator import AngleGenerator, Oscillator
+
+BLOCK_SIZES = (64, 256, 1024, 4096)
+FREQUENCIES = (500.0, 733.3, 1000.0)
+SAMPLERATE = 44100
+
+
+def reference_block(angle: AngleGenerator, n, frequency, samplerate):
+    theta = angle.generate(n, frequency, samplerate)
+    return np.cos(theta).astype(np.float32), np.sin(theta).astype(np.float32)
+
+
+def time_per_sample(f, n, repeat):
+    f()
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter_ns() - start) / (repeat * n)
+
+
+def ramp(frequency, blocks):
+    """
+    :return: one frequency per block, rising from frequency to 1.5 * frequency
+    """
+    return frequency * np.linspace(1, 1.5, blocks)
+
+
+def max_error(n, frequencies, start_theta):
+    oscillator = Oscillator()
+    oscillator.theta = start_theta
+    theta = start_theta
+    out_cos = np.empty(n, dtype=np.float32)
+    out_sin = np.empty(n, dtype=np.float32)
+    error = 0.0
+    for frequency in frequencies:
+        oscillator.generate_into(n, frequency, SAMPLERATE, out_cos, out_sin)
+        exact = theta + 2 * np.pi * frequency * np.arange(n) / SAMPLERATE
+        error = max(error,
+                    np.abs(out_cos - np.cos(exact)).max(),
+                    np.abs(out_sin - np.sin(exact)).max())
+        theta = theta + 2 * np.pi * frequency * (n / SAMPLERATE)
+    return float(error)
+
+
+def benchmark(n, frequency, repeat) -> dict:
+    angle = AngleGenerator()
+    reference = time_per_sample(lambda: reference_block(angle, n, frequency, SAMPLERATE), n, repeat)
+
+    oscillator = Oscillator()
+    out_cos = np.empty(n, dtype=np.float32)
+    out_sin = np.empty(n, dtype=np.float32)
+    optimized = time_per_sample(lambda: oscillator.generate_into(n, frequency, SAMPLERATE, out_cos, out_sin),
+                                n, repeat)
+
+    frequencies = iter(ramp(frequency, repeat + 1))
+    ramped = time_per_sample(lambda: oscillator.generate_into(n, next(frequencies), SAMPLERATE, out_cos, out_sin),
+                             n, repeat)
+
+    return {
+        'block_size': n,
+        'frequency': frequency,
+        'reference_ns_per_sample': reference,
+        'ns_per_sample': optimized,
+        'ramp_ns_per_sample': ramped,
+        'speedup': reference / optimized,
+        'max_error': max_error(n, [frequency] * 50, 0.0),
+        'max_error_after_10h': max_error(n, [frequency] * 50, 2 * np.pi * frequency * 36000),
+        'max_error_ramp': max_error(n, ramp(frequency, 50), 2 * np.pi * frequency * 36000),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark the carrier oscillator')
+    parser.add_argument('--repeat', type=int, default=2000, help='blocks per measurement (default: 2000)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"block":>6} {"freq":>7} {"ref ns":>8} {"ns":>8} {"ramp ns":>8} {"speedup":>8} {"error":>9} {"err 10h":>9} {"err ramp":>9}')
+    for n in BLOCK_SIZES:
+        for frequency in FREQUENCIES:
+            r = benchmark(n, frequency, args.repeat)
+            results.append(r)
+            print(f'{n:>6} {frequency:>7.1f} {r["reference_ns_per_sample"]:>8.2f} {r["ns_per_sample"]:>8.2f} '
+                  f'{r["ramp_ns_per_sample"]:>8.2f} {r["speedup"]:>7.1f}x '
+                  f'{r["max_error"]:>9.1e} {r["max_error_after_10h"]:>9.1e} {r["max_error_ramp"]:>9.1e}')
+
+    if args.output:
+        save_results(args.output, 'oscillator', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('block_size', 'frequency'),
+                                    metrics=('ns_per_sample', 'ramp_ns_per_sample', 'max_error', 'max_error_ramp')):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+
+def environment() -> dict:
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def save_results(path, benchmark: str, results: list[dict]):
+    with open(path, 'w') as f:
+        json.dump({'benchmark': benchmark, 'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load_results(path) -> list[dict]:
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare_results(results: list[dict], baseline: list[dict], keys: tuple[str, ...], metrics: tuple[str, ...],
+                    threshold=0.10) -> list[str]:
+    """
+    Compare results to a baseline run. Lower is better for all metrics.
+    :param keys: fields that identify a test case
+    :param threshold: relative change that is reported as regression or improvement
+    :return: one line per test case
+    """
+    baseline = {tuple(r[k] for k in keys): r for r in baseline}
+    lines = []
+    for r in results:
+        case = tuple(r[k] for k in keys)
+        old = baseline.get(case)
+        if old is None:
+            lines.append(f'{case}: not in baseline')
+            continue
+        changes = []
+        verdict = ''
+        for metric in metrics:
+            if not old.get(metric) or r.get(metric) is None:
+                continue
+            ratio = r[metric] / old[metric]
+            changes.append(f'{metric} {old[metric]:.4g} -> {r[metric]:.4g} ({(ratio - 1) * 100:+.0f}%)')
+            if ratio > 1 + threshold:
+                verdict = 'REGRESSION'
+            elif ratio < 1 - threshold and not verdict:
+                verdict = 'improved'
+        lines.append(f'{case}: {", ".join(changes)} {verdict}'.rstrip())
+    return lines
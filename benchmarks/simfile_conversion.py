@@ -0,0 +1,140 @@
+"""
+Speed of rendering simfile notes to electrode intensity and projecting the intensity to alpha/beta:
+the previous per-sample loops compared to the vectorized notes_to_intensity() and
+electrode_intensity_to_position_3p(), for generated charts of a few minutes. Both must give the same output.
+
+usage: python -m benchmarks.simfile_conversion [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.results import save_results, load_results, compare_results
+from simfile.conversion import Note, notes_to_intensity, electrode_intensity_to_position_3p
+from simfile.interpolation import interpolator_normal
+
+MEASURES = (50, 200, 500)
+
+
+def reference_to_xy(note: Note, x, interp):
+    y = []
+    for t in x:
+        y.append(max(
+            np.nan_to_num(interp(-note.time_until_next_press(t))),
+            np.nan_to_num(interp(note.time_since_last_press(t))),
+        ))
+    return y
+
+
+def reference_notes_to_intensity(notes, interp):
+    measures = notes.notes.split(',')
+    measures = [measure.strip().split('\n') for measure in measures]
+    lanes = [Note(), Note(), Note(), Note()]
+    for (measure_no, measure) in enumerate(measures):
+        for beat_no, beat in enumerate(measure):
+            t = measure_no + beat_no / len(measure)
+            for note, n in zip(lanes, beat):
+                note.add_note(t, n)
+
+    x = np.arange(0, len(measures) + 1, 1.0/64)
+    return x, tuple(reference_to_xy(note, x, interp) for note in lanes)
+
+
+def reference_position_3p(a, b, c):
+    a_vec = np.array([1, 0])
+    b_vec = np.array([-0.5, np.sqrt(3) / 2])
+    c_vec = np.array([-0.5, -np.sqrt(3) / 2])
+
+    alpha = []
+    beta = []
+    for i in range(len(a)):
+        p = a_vec * a[i] + b_vec * b[i] + c_vec * c[i]
+        norm = np.linalg.norm(p)
+        if norm > 1:
+            p = p / norm
+        alpha.append(p[0])
+        beta.append(p[1])
+    return alpha, beta
+
+
+def make_chart(measures):
+    # 4th to 16th notes, with some holds and jumps
+    rng = np.random.default_rng(measures)
+    chart = []
+    for _ in range(measures):
+        beats = rng.choice(list('000000012'), (rng.choice([4, 8, 16]), 4))
+        chart.append('\n'.join(''.join(beat) for beat in beats))
+    return SimpleNamespace(notes='\n' + ',\n'.join(chart) + '\n')
+
+
+def best_time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(measures, repeat) -> dict:
+    notes = make_chart(measures)
+    x, expected = reference_notes_to_intensity(notes, interpolator_normal)
+    _, result = notes_to_intensity(notes, interpolator_normal)
+    if not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+        raise RuntimeError(f'output differs from the reference for {measures} measures')
+    a, b, c, d = result
+    # np.linalg.norm may differ in the last bit
+    if not np.allclose(electrode_intensity_to_position_3p(a, b, c), reference_position_3p(a, b, c),
+                       rtol=0, atol=1e-12):
+        raise RuntimeError(f'projection differs from the reference for {measures} measures')
+
+    reference = best_time(lambda: reference_notes_to_intensity(notes, interpolator_normal), repeat)
+    optimized = best_time(lambda: notes_to_intensity(notes, interpolator_normal), repeat)
+    reference_projection = best_time(lambda: reference_position_3p(a, b, c), repeat)
+    projection = best_time(lambda: electrode_intensity_to_position_3p(a, b, c), repeat)
+    return {
+        'measures': measures,
+        'samples': len(x),
+        'reference_ms': reference * 1000,
+        'ms': optimized * 1000,
+        'speedup': reference / optimized,
+        'reference_projection_ms': reference_projection * 1000,
+        'projection_ms': projection * 1000,
+        'projection_speedup': reference_projection / projection,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark the simfile note to intensity rendering')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per case, the best is used (default: 3)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"":>17} {"rendering":>28} {"projection":>28}')
+    print(f'{"measures":>8} {"samples":>8} {"loop ms":>9} {"ms":>8} {"speedup":>9} '
+          f'{"loop ms":>9} {"ms":>8} {"speedup":>9}')
+    for measures in MEASURES:
+        r = benchmark(measures, args.repeat)
+        results.append(r)
+        print(f'{measures:>8} {r["samples"]:>8} {r["reference_ms"]:>9.1f} {r["ms"]:>8.2f} {r["speedup"]:>8.1f}x '
+              f'{r["reference_projection_ms"]:>9.1f} {r["projection_ms"]:>8.2f} {r["projection_speedup"]:>8.1f}x')
+
+    if args.output:
+        save_results(args.output, 'simfile_conversion', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('measures',),
+                                    metrics=('ms', 'projection_ms')):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Speed of parsing T-Code messages: splitting the message with re.split and a TCodeCommand per token
+(the previous method of the TCP, UDP and WebSocket servers) compared to net.tcode.parse_commands(), in commands
+per second. Messages hold 1 to 64 commands, 10% of the tokens are malformed. Both must give the same commands.
+
+usage: python -m benchmarks.tcode_parsing [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.results import save_results, load_results, compare_results
+from net.tcode import TCodeCommand, InvalidTCodeException, parse_commands
+
+COMMANDS_PER_MESSAGE = (1, 4, 16, 64)
+MESSAGES = 20000
+MALFORMED = ('L0', 'L0I100', 'L0x5', 'L05I-1', 'D1', 'L05I1I2')
+
+
+def reference(msg):
+    commands = []
+    for cmd in re.split('\\s|\n|\r', msg):
+        if len(cmd) < 3:
+            continue
+        try:
+            tcode = TCodeCommand.parse_command(cmd)
+            commands.append((tcode.axis_identifier, tcode.value, tcode.interval))
+        except InvalidTCodeException:
+            pass
+    return commands
+
+
+def make_messages(commands_per_message, count):
+    rng = random.Random(commands_per_message)
+    messages = []
+    for _ in range(count):
+        tokens = []
+        for _ in range(commands_per_message):
+            if rng.random() < 0.1:
+                tokens.append(rng.choice(MALFORMED))
+            else:
+                axis = rng.choice(('L0', 'L1', 'L2', 'V0', 'A0'))
+                interval = f'I{rng.randrange(1, 200)}' if rng.random() < 0.8 else ''
+                tokens.append(f'{axis}{rng.randrange(10000):04d}{interval}')
+        messages.append(' '.join(tokens) + '\n')
+    return messages
+
+
+def best_time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(commands_per_message, repeat) -> dict:
+    messages = make_messages(commands_per_message, MESSAGES // commands_per_message)
+    commands = sum(len(reference(msg)) for msg in messages)
+    if any(parse_commands(msg) != reference(msg) for msg in messages):
+        raise RuntimeError(f'output differs from the reference for {commands_per_message} commands per message')
+
+    reference_time = best_time(lambda: [reference(msg) for msg in messages], repeat)
+    optimized_time = best_time(lambda: [parse_commands(msg) for msg in messages], repeat)
+    return {
+        'commands_per_message': commands_per_message,
+        'reference_commands_per_s': commands / reference_time,
+        'commands_per_s': commands / optimized_time,
+        'us_per_command': optimized_time / commands * 1e6,
+        'speedup': reference_time / optimized_time,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark T-Code parsing')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per case, the best is used (default: 5)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare to the results in this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    print(f'{"per message":>11} {"split cmd/s":>12} {"cmd/s":>12} {"speedup":>8}')
+    for n in COMMANDS_PER_MESSAGE:
+        r = benchmark(n, args.repeat)
+        results.append(r)
+        print(f'{n:>11} {r["reference_commands_per_s"]:>12.0f} {r["commands_per_s"]:>12.0f} {r["speedup"]:>7.1f}x')
+
+    if args.output:
+        save_results(args.output, 'tcode_parsing', results)
+    if args.baseline:
+        print()
+        for line in compare_results(results, load_results(args.baseline),
+                                    keys=('commands_per_message',),
+                                    metrics=('us_per_command',)):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
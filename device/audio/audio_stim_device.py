@@ -8,6 +8,8 @@ import sounddevice as sd
 from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
 from qt_ui import settings
 from device.output_device import OutputDevice
+from device.audio.callback_statistics import CallbackStatistics, CallbackStatisticsSnapshot
+from device.audio.prefill_renderer import PrefillRenderer, PrefillStatus
 
 logger = logging.getLogger('restim.audio')
 
@@ -51,6 +53,8 @@ class AudioStimDevice(OutputDevice):
         self.offset = 0
         self.algorithm = None
         self.previous_error = []
+        self.statistics = CallbackStatistics()
+        self.renderer = None
 
     def start(self, host_api_name, audio_device_name, latency, algorithm: AudioGenerationAlgorithm,
               mapping_parameters: list[ChannelMappingParameters]):
@@ -76,23 +80,32 @@ class AudioStimDevice(OutputDevice):
                 logger.error(f"Device only has {device_channels} channels, so this won't work....")
                 continue
 
+            render_ahead = settings.audio_render_ahead.get()
             try:
                 self.frame_number = 0
+                self.statistics = CallbackStatistics(settings.audio_statistics_log_interval.get())
                 self.stream = sd.OutputStream(
                     samplerate=samplerate,
                     device=device_index,
                     channels=mapping_parameter.device_audio_channels,
                     dtype=np.float32,
-                    callback=self.callback,
+                    callback=self.callback_prefill if render_ahead > 0 else self.callback,
                     latency=latency,
                 )
                 self.sample_rate = self.stream.samplerate
                 self.algorithm = algorithm
                 self.channel_map = mapping_parameter.device_channel_map
                 self.offset = time.time()
+                if render_ahead > 0:
+                    logger.info(f'rendering audio {render_ahead}s ahead on a separate thread')
+                    self.renderer = PrefillRenderer(algorithm, self.sample_rate, render_ahead, lambda: self.offset)
+                    self.renderer.start()
                 self.stream.start()
             except sd.PortAudioError as e:
                 logger.error(f"Portaudio says: {e}")
+                if self.renderer is not None:
+                    self.renderer.stop()
+                    self.renderer = None
                 continue
 
             logger.info("Portaudio says: Success!")
@@ -127,6 +140,7 @@ class AudioStimDevice(OutputDevice):
 
             try:
                 self.frame_number = 0
+                self.statistics = CallbackStatistics(settings.audio_statistics_log_interval.get())
                 self.stream = sd.Stream(
                     samplerate=samplerate,
                     device=(input_device_index, output_device_index),
@@ -149,7 +163,26 @@ class AudioStimDevice(OutputDevice):
         if self.stream is not None:
             self.stream.stop()  # blocks
             self.stream.close()
+            if self.statistics.callbacks:
+                self.statistics.log()
         self.stream = None
+        if self.renderer is not None:
+            self.renderer.stop()
+            logger.info(f'audio prefill: {self.renderer.status()}')
+        self.renderer = None
+
+    def callback_statistics(self) -> CallbackStatisticsSnapshot:
+        """
+        Timing and underflow statistics of the audio callback, safe to poll from any thread.
+        """
+        return self.statistics.snapshot()
+
+    def prefill_status(self) -> PrefillStatus | None:
+        """
+        Fill level of the render-ahead queue, or None if audio is rendered in the callback.
+        """
+        renderer = self.renderer
+        return renderer.status() if renderer is not None else None
 
     def is_connected_and_running(self) -> bool:
         return self.stream is not None
@@ -159,7 +192,15 @@ class AudioStimDevice(OutputDevice):
             return [ChannelMappingParameters(2, [0, 1])]
         raise RuntimeError('Invalid audio algorithm')
 
+    def record_statistics(self, frames, patime, status, start):
+        duration = time.perf_counter() - start
+        headroom = None
+        if patime.currentTime:
+            headroom = patime.outputBufferDacTime - patime.currentTime - duration
+        self.statistics.record(frames, self.sample_rate, duration, status, headroom)
+
     def callback(self, outdata: np.ndarray, frames: int, patime, status: sd.CallbackFlags):
+        start = time.perf_counter()
         outdata.fill(0.0)
 
         # generate timeline that is guaranteed to increase at a steady rate.
@@ -169,37 +210,61 @@ class AudioStimDevice(OutputDevice):
                                    frames, endpoint=False)
         self.frame_number += frames
 
+        old_offset = self.sync_clock(frames, steady_clock[-1])
+        command_timeline = steady_clock + np.linspace(old_offset, self.offset, frames, endpoint=False)
+
+        # generate audio
+        data = np.array(self.algorithm.generate_audio(self.sample_rate, steady_clock, command_timeline)).T
+        for in_channel, out_channel in enumerate(self.channel_map):
+            outdata[:, out_channel] = data[:, in_channel]
+        self.record_statistics(frames, patime, status, start)
+
+    def callback_prefill(self, outdata: np.ndarray, frames: int, patime, status: sd.CallbackFlags):
+        start = time.perf_counter()
+        outdata.fill(0.0)
+
+        # same clock as callback(), but the audio was already rendered by the prefill thread
+        last_sample_time = (self.frame_number + frames - 1) / self.sample_rate
+        self.frame_number += frames
+        self.sync_clock(frames, last_sample_time)
+
+        self.renderer.read_into(outdata, self.channel_map)
+        self.record_statistics(frames, patime, status, start)
+
+    def sync_clock(self, frames: int, last_sample_time: float) -> float:
+        """
+        Adjust self.offset, the offset from steady clock to system time.
+        :param last_sample_time: steady clock of the last sample of the block
+        :return: the offset before adjustment
+        """
         # generate timestamp of output samples
         # slowly sync the timestamp to the actual audio rate.
         # use equation: steady_clock[-1] + offset = system_time
         # minimize error to 0
         system_time = time.time()
-        offset = system_time - steady_clock[-1]
+        offset = system_time - last_sample_time
         if abs(self.offset - offset) > 1:
             logger.error('audio output desync (>1s). Stopping...')
             # todo: set error flag, somewhere
             self.previous_error = []
             raise sd.CallbackAbort()
-        else:
-            dt = frames / self.sample_rate
-            error = offset - self.offset
-            self.previous_error.append(error)
-            self.previous_error = self.previous_error[-8:]
-            error = np.average(self.previous_error)  # very poor low-pass filter
-            max_adjustment = dt * 0.02   # adjust maximally 0.02 s/s
-            adjustment = np.clip(-max_adjustment, error * dt, max_adjustment)
-            # print(error * 1000, adjustment * 1000, adjustment * 44100 / frames * 100, self.previous_error)
-            old_offset = self.offset
-            self.offset += adjustment
-            command_timeline = steady_clock + np.linspace(old_offset, self.offset, frames, endpoint=False)
-
-        # generate audio
-        data = np.array(self.algorithm.generate_audio(self.sample_rate, steady_clock, command_timeline)).T
-        for in_channel, out_channel in enumerate(self.channel_map):
-            outdata[:, out_channel] = data[:, in_channel]
 
-    def callback_rw(self, indata, outdata, frames, time, status):
+        dt = frames / self.sample_rate
+        error = offset - self.offset
+        self.previous_error.append(error)
+        self.previous_error = self.previous_error[-8:]
+        error = np.average(self.previous_error)  # very poor low-pass filter
+        max_adjustment = dt * 0.02   # adjust maximally 0.02 s/s
+        adjustment = np.clip(-max_adjustment, error * dt, max_adjustment)
+        # print(error * 1000, adjustment * 1000, adjustment * 44100 / frames * 100, self.previous_error)
+        old_offset = self.offset
+        self.offset += adjustment
+        return old_offset
+
+    def callback_rw(self, indata, outdata, frames, patime, status):
+        start = time.perf_counter()
         data = np.array(self.algorithm.modify_audio(np.array(indata))).T
         for in_channel, out_channel in enumerate(self.channel_map):
             outdata[:, out_channel] = data[:, in_channel]
+        self.record_statistics(frames, patime, status, start)
 
@@ -0,0 +1,131 @@
+import bisect
+import logging
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger('restim.audio')
+
+
+# upper edges of the callback duration histogram, in seconds. The last bin counts everything slower.
+HISTOGRAM_EDGES = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+@dataclass
+class CallbackStatisticsSnapshot:
+    callbacks: int
+    frames: int
+    histogram: list[int]            # callback count per bin, see histogram_labels()
+    output_underflows: int
+    output_overflows: int
+    input_underflows: int
+    input_overflows: int
+    deadline_misses: int            # callbacks that took longer than the duration of their block
+    mean_load: float                # compute time / block duration, averaged over all callbacks
+    max_load: float
+    last_load: float
+    min_headroom_in_s: float | None  # smallest time between the end of the callback and the DAC output time
+
+    @staticmethod
+    def histogram_labels() -> list[str]:
+        labels = [f'<{edge * 1000:g}ms' for edge in HISTOGRAM_EDGES]
+        labels.append(f'>={HISTOGRAM_EDGES[-1] * 1000:g}ms')
+        return labels
+
+    def summary(self) -> str:
+        headroom = 'unknown' if self.min_headroom_in_s is None else f'{self.min_headroom_in_s * 1000:.1f}ms'
+        return (f'{self.callbacks} callbacks, load mean {self.mean_load:.3f} max {self.max_load:.3f}, '
+                f'{self.deadline_misses} deadline misses, '
+                f'{self.output_underflows} output underflows, {self.output_overflows} output overflows, '
+                f'min headroom {headroom}')
+
+
+class CallbackStatistics:
+    """
+    Always-on timing statistics for an audio callback.
+
+    record() is called from the audio thread and only does a handful of integer and float updates.
+    snapshot() can be called from any thread, it does not lock so the fields may be off by one callback.
+    If log_interval is set, a summary is logged at most once per interval, as warning if
+    underflows or deadline misses happened since the previous summary.
+    """
+    def __init__(self, log_interval: float = 0):
+        self.log_interval = log_interval
+        self.reset()
+
+    def reset(self):
+        self.callbacks = 0
+        self.frames = 0
+        self.histogram = [0] * (len(HISTOGRAM_EDGES) + 1)
+        self.output_underflows = 0
+        self.output_overflows = 0
+        self.input_underflows = 0
+        self.input_overflows = 0
+        self.deadline_misses = 0
+        self.total_load = 0.0
+        self.max_load = 0.0
+        self.last_load = 0.0
+        self.min_headroom = None
+        self._last_log = time.perf_counter()
+        self._logged_problems = 0
+
+    def record(self, frames: int, samplerate: float, duration: float, status=None, headroom: float = None):
+        """
+        :param duration: time spent in the callback, in seconds
+        :param status: sounddevice.CallbackFlags of the callback
+        :param headroom: time between the end of the callback and the moment the first sample is played
+        """
+        self.callbacks += 1
+        self.frames += frames
+        self.histogram[bisect.bisect_right(HISTOGRAM_EDGES, duration)] += 1
+
+        load = duration * samplerate / frames if frames else 0.0
+        self.last_load = load
+        self.total_load += load
+        if load > self.max_load:
+            self.max_load = load
+        if load > 1:
+            self.deadline_misses += 1
+
+        if status:
+            self.output_underflows += bool(status.output_underflow)
+            self.output_overflows += bool(status.output_overflow)
+            self.input_underflows += bool(status.input_underflow)
+            self.input_overflows += bool(status.input_overflow)
+
+        if headroom is not None and (self.min_headroom is None or headroom < self.min_headroom):
+            self.min_headroom = headroom
+
+        if self.log_interval:
+            now = time.perf_counter()
+            if now - self._last_log >= self.log_interval:
+                self._last_log = now
+                self.log()
+
+    def problems(self) -> int:
+        # input overflows only occur on the duplex stream of start_modify()
+        return self.deadline_misses + self.output_underflows + self.output_overflows + self.input_overflows
+
+    def log(self):
+        problems = self.problems()
+        if problems > self._logged_problems:
+            logger.warning(f'audio callback: {self.snapshot().summary()}')
+        else:
+            logger.info(f'audio callback: {self.snapshot().summary()}')
+        self._logged_problems = problems
+
+    def snapshot(self) -> CallbackStatisticsSnapshot:
+        callbacks = self.callbacks
+        return CallbackStatisticsSnapshot(
+            callbacks=callbacks,
+            frames=self.frames,
+            histogram=list(self.histogram),
+            output_underflows=self.output_underflows,
+            output_overflows=self.output_overflows,
+            input_underflows=self.input_underflows,
+            input_overflows=self.input_overflows,
+            deadline_misses=self.deadline_misses,
+            mean_load=self.total_load / callbacks if callbacks else 0.0,
+            max_load=self.max_load,
+            last_load=self.last_load,
+            min_headroom_in_s=self.min_headroom,
+        )
@@ -0,0 +1,120 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
+from stim_math.sample_queue import SampleRing
+
+logger = logging.getLogger('restim.audio')
+
+
+@dataclass
+class PrefillStatus:
+    fill_in_s: float        # audio in the queue right now
+    min_fill_in_s: float    # lowest fill seen by the audio callback
+    lookahead_in_s: float   # target fill
+    underruns: int          # callbacks that found the queue short
+    dropped_frames: int     # frames output as silence because of underruns
+
+
+class PrefillRenderer:
+    """
+    Renders audio on a dedicated thread, lookahead seconds ahead of the audio callback.
+    The callback only copies from the ring with read_into().
+
+    Samples keep the timestamps they would get when rendered inside the callback:
+    steady clock is the frame number, command time is steady clock plus the clock offset
+    that the callback maintains (see AudioStimDevice.sync_clock). Funscripts are therefore
+    still evaluated at the time the sample is played, live parameter changes are heard
+    after up to lookahead seconds.
+    """
+    def __init__(self, algorithm: AudioGenerationAlgorithm, samplerate: float, lookahead: float,
+                 clock_offset, block_size: int = 256):
+        """
+        :param clock_offset: callable that returns the current offset from steady clock to command time
+        """
+        self.algorithm = algorithm
+        self.samplerate = samplerate
+        self.lookahead = lookahead
+        self.clock_offset = clock_offset
+        self.block_size = block_size
+
+        self.target_fill = max(int(lookahead * samplerate), block_size)
+        self.ring = SampleRing(algorithm.channel_count(), self.target_fill + block_size)
+
+        self.frame_number = 0       # next frame to render, producer side
+        self.dropped_frames = 0     # consumer side
+        self.underruns = 0          # consumer side
+        self.min_fill = None        # consumer side
+        self._accounted_dropped_frames = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='audio prefill', daemon=True)
+
+    def start(self):
+        # fill the queue before the stream starts
+        self.render_until_full()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def run(self):
+        poll_interval = self.block_size / self.samplerate / 2
+        try:
+            while not self._stop.is_set():
+                if not self.render_until_full():
+                    self._stop.wait(poll_interval)
+        except Exception:
+            logger.exception('audio prefill thread crashed, output is silent.')
+
+    def render_until_full(self) -> bool:
+        """
+        :return: True if anything was rendered
+        """
+        rendered = False
+        while len(self.ring) + self.block_size <= self.target_fill and not self._stop.is_set():
+            self.render_block()
+            rendered = True
+        return rendered
+
+    def render_block(self):
+        # frames that were output as silence are skipped, to keep the steady clock in sync with the output
+        dropped = self.dropped_frames
+        self.frame_number += dropped - self._accounted_dropped_frames
+        self._accounted_dropped_frames = dropped
+
+        frames = self.block_size
+        steady_clock = np.linspace(self.frame_number / self.samplerate,
+                                   (self.frame_number + frames) / self.samplerate,
+                                   frames, endpoint=False)
+        command_timeline = steady_clock + self.clock_offset()
+        self.ring.write(self.algorithm.generate_audio(self.samplerate, steady_clock, command_timeline))
+        self.frame_number += frames
+
+    def read_into(self, outdata: np.ndarray, channel_map) -> int:
+        """
+        Audio callback side. Frames that are not available are left untouched and counted as dropped.
+        """
+        fill = len(self.ring)
+        if self.min_fill is None or fill < self.min_fill:
+            self.min_fill = fill
+        n = self.ring.read_into(outdata, channel_map)
+        if n < outdata.shape[0]:
+            self.underruns += 1
+            self.dropped_frames += outdata.shape[0] - n
+        return n
+
+    def status(self) -> PrefillStatus:
+        min_fill = self.min_fill or 0
+        return PrefillStatus(
+            fill_in_s=len(self.ring) / self.samplerate,
+            min_fill_in_s=min_fill / self.samplerate,
+            lookahead_in_s=self.target_fill / self.samplerate,
+            underruns=self.underruns,
+            dropped_frames=self.dropped_frames,
+        )
@@ -6,6 +6,7 @@ from stim_math.audio_gen.base_classes import RemoteGenerationAlgorithm
 from stim_math.audio_gen.params import SafetyParamsFOC, FOCStimParams, FourphaseFOCStimParams
 from stim_math.audio_gen.various import ThreePhasePosition, FourPhasePosition
 from stim_math.axis import AbstractMediaSync
+from stim_math.axis_group import AxisGroup
 from device.focstim.constants_pb2 import AxisType
 from stim_math import limits
 
@@ -20,6 +21,22 @@ class FOCStimFourphaseAlgorithm(RemoteGenerationAlgorithm):
         self.params = params
         self.safety_limits = safety_limits
         self.position_params = FourPhasePosition(params.position)
+        self.axes = AxisGroup({
+            'volume_api': params.volume.api,
+            'carrier_frequency': params.carrier_frequency,
+            'pulse_frequency': params.pulse_frequency,
+            'pulse_width': params.pulse_width,
+            'pulse_rise_time': params.pulse_rise_time,
+            'pulse_interval_random': params.pulse_interval_random,
+            'calibrate_center': params.calibrate.center,
+            'calibrate_a': params.calibrate.a,
+            'calibrate_b': params.calibrate.b,
+            'calibrate_c': params.calibrate.c,
+            'calibrate_d': params.calibrate.d,
+            'alpha': params.position.alpha,
+            'beta': params.position.beta,
+            'gamma': params.position.gamma,
+        })
 
         epsilon = 0.0001
         assert safety_limits.waveform_amplitude_amps >= (limits.WaveformAmpltiudeFOC.min - epsilon)
@@ -35,10 +52,11 @@ class FOCStimFourphaseAlgorithm(RemoteGenerationAlgorithm):
             return np.clip(p, 0, 1)
 
         t = time.time()
+        values = self.axes.evaluate_at(t)
 
         volume = \
             np.clip(self.params.volume.master.last_value(), 0, 1) * \
-            np.clip(self.params.volume.api.interpolate(t), 0, 1) * \
+            np.clip(values.volume_api, 0, 1) * \
             np.clip(self.params.volume.inactivity.last_value(), 0, 1) * \
             np.clip(self.params.volume.external.last_value(), 0, 1)
 
@@ -50,12 +68,11 @@ class FOCStimFourphaseAlgorithm(RemoteGenerationAlgorithm):
                                     self.safety_limits.maximum_carrier_frequency)
         tau = self.params.tau.last_value() * 1e-6
 
-        carrier_frequency = self.params.carrier_frequency.interpolate(t)
-        carrier_frequency = np.clip(carrier_frequency, minimum_frequency, maximum_frequency)
+        carrier_frequency = np.clip(values.carrier_frequency, minimum_frequency, maximum_frequency)
         derating = self.frequency_derating_factor(maximum_frequency, carrier_frequency, tau)
         volume *= np.clip(derating, 0, 1)
 
-        alpha, beta, gamma = self.position_params.get_position(t)
+        alpha, beta, gamma = self.position_params.normalize_position(values.alpha, values.beta, values.gamma)
 
         if not self.media.is_playing():
             volume *= 0
@@ -65,16 +82,16 @@ class FOCStimFourphaseAlgorithm(RemoteGenerationAlgorithm):
             AxisType.AXIS_POSITION_BETA: beta,
             AxisType.AXIS_POSITION_GAMMA: gamma,
             AxisType.AXIS_WAVEFORM_AMPLITUDE_AMPS: volume * volume * self.safety_limits.waveform_amplitude_amps,
-            AxisType.AXIS_CARRIER_FREQUENCY_HZ: self.params.carrier_frequency.interpolate(t),
-            AxisType.AXIS_PULSE_FREQUENCY_HZ: self.params.pulse_frequency.interpolate(t),
-            AxisType.AXIS_PULSE_WIDTH_IN_CYCLES: self.params.pulse_width.interpolate(t),
-            AxisType.AXIS_PULSE_RISE_TIME_CYCLES: self.params.pulse_rise_time.interpolate(t),
-            AxisType.AXIS_PULSE_INTERVAL_RANDOM_PERCENT: self.params.pulse_interval_random.interpolate(t),
-            AxisType.AXIS_CALIBRATION_4_CENTER: self.params.calibrate.center.interpolate(t),
-            AxisType.AXIS_CALIBRATION_4_A: self.params.calibrate.a.interpolate(t),
-            AxisType.AXIS_CALIBRATION_4_B: self.params.calibrate.b.interpolate(t),
-            AxisType.AXIS_CALIBRATION_4_C: self.params.calibrate.c.interpolate(t),
-            AxisType.AXIS_CALIBRATION_4_D: self.params.calibrate.d.interpolate(t),
+            AxisType.AXIS_CARRIER_FREQUENCY_HZ: values.carrier_frequency,
+            AxisType.AXIS_PULSE_FREQUENCY_HZ: values.pulse_frequency,
+            AxisType.AXIS_PULSE_WIDTH_IN_CYCLES: values.pulse_width,
+            AxisType.AXIS_PULSE_RISE_TIME_CYCLES: values.pulse_rise_time,
+            AxisType.AXIS_PULSE_INTERVAL_RANDOM_PERCENT: values.pulse_interval_random,
+            AxisType.AXIS_CALIBRATION_4_CENTER: values.calibrate_center,
+            AxisType.AXIS_CALIBRATION_4_A: values.calibrate_a,
+            AxisType.AXIS_CALIBRATION_4_B: values.calibrate_b,
+            AxisType.AXIS_CALIBRATION_4_C: values.calibrate_c,
+            AxisType.AXIS_CALIBRATION_4_D: values.calibrate_d,
         }
 
     def frequency_derating_factor(self, max_frequency, frequency, tau):
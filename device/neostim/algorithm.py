@@ -15,6 +15,7 @@ from device.neostim import limits
 from stim_math.audio_gen.params import NeoStimParams, NeoStimDebugParams
 from stim_math.audio_gen.various import ThreePhasePosition
 from stim_math.axis import AbstractMediaSync
+from stim_math.axis_group import AxisGroup
 
 
 class NeoStimAlgorithm(QObject, NeoStimPTGenerator):
@@ -23,6 +24,15 @@ class NeoStimAlgorithm(QObject, NeoStimPTGenerator):
         self.media = media
         self.params = params
         self.position_params = ThreePhasePosition(params.position, params.transform)
+        self.axes = AxisGroup({
+            'volume_api': params.volume.api,
+            'pulse_frequency': params.pulse_frequency,
+            'carrier_frequency': params.carrier_frequency,
+            'inversion_time': params.inversion_time,
+            'switch_time': params.switch_time,
+            'alpha': params.position.alpha,
+            'beta': params.position.beta,
+        })
 
         self.params = params
         self.device: NeoStim = None
@@ -64,16 +74,17 @@ class NeoStimAlgorithm(QObject, NeoStimPTGenerator):
                                                 struct.pack(b'BB', Encoding.UnsignedInt1.value, intensity))
 
         # collect pulse parameters
+        values = self.axes.evaluate_at(t)
         volume = \
             np.clip(self.params.volume.master.last_value(), 0, 1) * \
-            np.clip(self.params.volume.api.interpolate(t), 0, 1) * \
+            np.clip(values.volume_api, 0, 1) * \
             np.clip(self.params.volume.inactivity.last_value(), 0, 1) * \
             np.clip(self.params.volume.external.last_value(), 0, 1)
 
         if not self.media.is_playing():
             volume *= 0
 
-        alpha, beta = self.position_params.get_position(t)
+        alpha, beta = self.position_params.transform_position(values.alpha, values.beta)
         calibration_neutral = self.params.calibrate.neutral.last_value()
         calibration_right = self.params.calibrate.right.last_value()
         calibration_center = self.params.calibrate.center.last_value()
@@ -81,15 +92,14 @@ class NeoStimAlgorithm(QObject, NeoStimPTGenerator):
         center_calib = stim_math.threephase.ThreePhaseCenterCalibration(calibration_center)
         volume *= center_calib.get_scale(alpha, beta)
 
-        pulse_freq = self.params.pulse_frequency.interpolate(t)
-        pulse_freq = np.clip(pulse_freq, limits.PulseFrequency.min, limits.PulseFrequency.max)
+        pulse_freq = np.clip(values.pulse_frequency, limits.PulseFrequency.min, limits.PulseFrequency.max)
 
-        carrier_frequency = np.clip(self.params.carrier_frequency.interpolate(t), limits.CarrierFrequency.min,
+        carrier_frequency = np.clip(values.carrier_frequency, limits.CarrierFrequency.min,
                                     limits.CarrierFrequency.max)
         pulse_width = int(500000.0 / carrier_frequency)
         duty_cycle_at_max_power = np.clip(self.params.duty_cycle_at_max_power.last_value(), limits.DutyCycle.min, limits.DutyCycle.max)
-        inversion_time = self.params.inversion_time.interpolate(t)
-        switch_time = self.params.switch_time.interpolate(t)
+        inversion_time = values.inversion_time
+        switch_time = values.switch_time
         debug: NeoStimDebugParams = self.params.debug.last_value()
 
         self.pulse_planner.set_debug_options(debug)
@@ -0,0 +1,146 @@
+import json
+
+import numpy as np
+
+# the only layouts the scanner accepts, after removing whitespace and digits. Anything else uses json.
+TEMPLATES = (
+    (b'{"at":,"pos":}', False),
+    (b'{"pos":,"at":}', True),      # True: pos comes first
+)
+WHITESPACE = b' \t\r\n'
+# whitespace may only be removed between tokens. Digits, key letters and quotes are mapped to 'w',
+# a whitespace run between two of those would join numbers (or change a key).
+TOKEN_CLASSES = bytes.maketrans(b'0123456789atpos"' + WHITESPACE, b'w' * 16 + b' ' * len(WHITESPACE))
+CHUNK_DIGITS = 8
+U64 = np.uint64
+
+
+def parse_actions(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parse the actions of a funscript into (at in seconds, pos from 0 to 1).
+
+    Scripts in the usual layout, {"at": integer, "pos": integer} for every action on a single line,
+    are scanned without building an object per action. Everything else (fractions, extra fields,
+    pretty-printed or broken files) goes through json, so the results and the exceptions are the same
+    as parse_actions_json().
+    """
+    scanned = scan_actions(data)
+    if scanned is not None:
+        return scanned
+    return parse_actions_json(data)
+
+
+def parse_actions_json(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    x = []
+    y = []
+    js = json.loads(data.decode('utf-8'))
+    for action in js['actions']:
+        at = float(action['at']) / 1000
+        pos = float(action['pos']) * 0.01
+        x.append(at)
+        y.append(pos)
+    return np.array(x), np.array(y)
+
+
+def scan_actions(data: bytes) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    :return: (x, y) or None if the file is not in the layout this scanner handles
+    """
+    # the actions array, its objects contain no brackets
+    start = data.find(b'"actions"')
+    if start < 0 or data.find(b'"actions"', start + 1) >= 0:
+        return None
+    begin = data.find(b'[', start)
+    end = data.find(b']', begin)
+    if begin < 0 or end < 0:
+        return None
+    body = data[begin + 1:end]
+
+    # everything else is parsed by json, which also checks that actions is a top-level key
+    try:
+        rest = json.loads((data[:begin + 1] + data[end:]).decode('utf-8'))
+    except ValueError:
+        return None
+    if not isinstance(rest, dict) or rest.get('actions') != []:
+        return None
+
+    if any(c in body for c in WHITESPACE):
+        # pretty-printed actions are not faster to scan than to parse with json
+        if b'\n' in body or joins_tokens(body):
+            return None
+        body = body.translate(None, WHITESPACE)
+    if not body:
+        return np.zeros(0), np.zeros(0)
+
+    # after removing the digits, the body must be the template repeated
+    skeleton = body.translate(None, b'0123456789') + b','
+    for template, pos_first in TEMPLATES:
+        if len(skeleton) % (len(template) + 1) == 0:
+            rows = np.frombuffer(skeleton, np.uint8).reshape(-1, len(template) + 1)
+            if (rows == np.frombuffer(template + b',', np.uint8)).all():
+                break
+    else:
+        return None
+
+    # the template check ignores the digits: every run of digits must also be a value, right after a colon
+    a = np.frombuffer(body, np.uint8)
+    is_digit = (a - np.uint8(ord('0'))) < 10
+    runs = np.count_nonzero(is_digit[1:] > is_digit[:-1]) + is_digit[0]
+    after_colon = np.count_nonzero(is_digit[1:] & (a[:-1] == ord(':')))
+    if runs != 2 * len(rows) or after_colon != runs:
+        return None
+
+    values = parse_integers(body.translate(None, b'{}"atpos:'))
+    if values is None or len(values) != 2 * len(rows):
+        return None
+    at, pos = (values[1::2], values[0::2]) if pos_first else (values[0::2], values[1::2])
+    return at / 1000, pos * 0.01
+
+
+def joins_tokens(body: bytes) -> bool:
+    """
+    :return: True if removing the whitespace would join two numbers or change a key
+    """
+    classes = body.translate(TOKEN_CLASSES)
+    while b'  ' in classes:
+        classes = classes.replace(b'  ', b' ')
+    return b'w w' in classes
+
+
+def parse_integers(numbers: bytes) -> np.ndarray | None:
+    """
+    Parse comma separated non-negative integers of up to 2 * CHUNK_DIGITS digits.
+    :return: float64 values or None if the input is not in that format
+    """
+    a = np.frombuffer(numbers + b',' + bytes(CHUNK_DIGITS), np.uint8)
+    ends = np.flatnonzero(a == ord(','))
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    if lengths.min() < 1 or lengths.max() > 2 * CHUNK_DIGITS:
+        return None
+    if ((lengths > 1) & (a[starts] == ord('0'))).any():      # leading zeros are not valid json
+        return None
+
+    # the last (up to) eight digits, plus the digits before those for long numbers
+    high_lengths = np.maximum(lengths - CHUNK_DIGITS, 0)
+    values = parse_chunks(a, starts + high_lengths, lengths - high_lengths)
+    long = np.flatnonzero(high_lengths)
+    if len(long):
+        values[long] += parse_chunks(a, starts[long], high_lengths[long]) * U64(10 ** CHUNK_DIGITS)
+    return values.astype(np.float64)
+
+
+def parse_chunks(a: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    SWAR: read eight bytes from every start, the first digit in the lowest byte. Shift the digits up,
+    so the missing leading digits are zero bytes, and combine the digits pairwise in three steps.
+    """
+    chunks = np.lib.stride_tricks.sliding_window_view(a, CHUNK_DIGITS)[starts].view('<u8')[:, 0]
+    shift = ((CHUNK_DIGITS - lengths) * 8).astype(U64)
+    chunks = (chunks << shift) - (U64(0x3030303030303030) << shift)
+    chunks = ((chunks & U64(0x0F0F0F0F0F0F0F0F)) * U64(2561)) >> U64(8)
+    chunks = ((chunks & U64(0x00FF00FF00FF00FF)) * U64(6553601)) >> U64(16)
+    chunks = ((chunks & U64(0x0000FFFF0000FFFF)) * U64(42949672960001)) >> U64(32)
+    return chunks
@@ -0,0 +1,45 @@
+import numpy as np
+
+ACTION = '{"at": %d, "pos": %d}'
+SEPARATOR = ', '
+CHUNK_SIZE = 65536
+
+
+def to_actions(x: np.ndarray, y: np.ndarray, compact=False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert (time in seconds, position from 0 to 1) to funscript integers: at in milliseconds, pos from 0 to 100.
+    :param compact: drop points that do not change the script: repeated points, and points
+    in the middle of a run with the same position.
+    """
+    at = np.rint(np.asarray(x, dtype=np.float64) * 1000).astype(np.int64)
+    pos = np.clip(np.rint(np.asarray(y, dtype=np.float64) * 100), 0, 100).astype(np.int64)
+    if compact and len(at) > 1:
+        repeated = np.zeros(len(at), dtype=bool)
+        repeated[1:] = (at[1:] == at[:-1]) & (pos[1:] == pos[:-1])
+        at, pos = at[~repeated], pos[~repeated]
+    if compact and len(at) > 2:
+        # the first and last point of a flat run define it
+        inside_run = np.zeros(len(at), dtype=bool)
+        inside_run[1:-1] = (pos[1:-1] == pos[:-2]) & (pos[1:-1] == pos[2:])
+        at, pos = at[~inside_run], pos[~inside_run]
+    return at, pos
+
+
+def write_actions(f, at: np.ndarray, pos: np.ndarray):
+    """
+    Write a funscript with integer actions to a text file, in the layout of json.dump.
+    The actions are formatted in chunks, without creating an object per action.
+    """
+    values = np.empty(2 * len(at), dtype=np.int64)
+    values[0::2] = at
+    values[1::2] = pos
+    full_chunk = SEPARATOR.join([ACTION] * CHUNK_SIZE)
+
+    f.write('{"actions": [')
+    for begin in range(0, len(at), CHUNK_SIZE):
+        count = min(CHUNK_SIZE, len(at) - begin)
+        template = full_chunk if count == CHUNK_SIZE else SEPARATOR.join([ACTION] * count)
+        if begin:
+            f.write(SEPARATOR)
+        f.write(template % tuple(values[2 * begin:2 * (begin + count)].tolist()))
+    f.write(']}')
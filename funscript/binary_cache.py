@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger('restim.funscript')
+
+
+# magic, format version, size and mtime of the funscript, number of actions, sha1 of the funscript.
+# Padded to 64 bytes, so the arrays that follow are aligned.
+HEADER = struct.Struct('<8sIQqQ20s12x')
+MAGIC = b'RSTMFSC\0'
+FORMAT_VERSION = 1
+SUFFIX = '.bin'
+
+
+class FunscriptBinaryCache:
+    """
+    On-disk cache of parsed funscripts, so a known funscript is loaded without reading or parsing the json.
+
+    Each funscript is one file in the cache directory, named after the hash of its absolute path:
+    a header with the size, mtime and sha1 of the funscript, followed by the x and y arrays as
+    little-endian float64, which can be memory-mapped. An entry is used if size and mtime still match,
+    with verify_hash also if the sha1 of the funscript matches (this reads the funscript, but skips the json).
+
+    Entries are written to a temporary file and renamed, so concurrent readers never see partial entries.
+    When the directory grows beyond max_size_in_bytes, the least recently used entries are removed.
+    """
+    def __init__(self, directory, max_size_in_bytes=256 * 1024 * 1024, verify_hash=False):
+        self.directory = directory
+        self.max_size_in_bytes = max_size_in_bytes
+        self.verify_hash = verify_hash
+
+    def entry_path(self, path) -> str:
+        key = os.path.normcase(os.path.abspath(path)).encode('utf-8', 'surrogatepass')
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + SUFFIX)
+
+    def load(self, path, stat: os.stat_result = None) -> tuple[np.ndarray, np.ndarray, bytes] | None:
+        """
+        :param stat: os.stat() of the funscript, if already known
+        :return: read-only memory-mapped (x, y) and the sha1 of the funscript,
+        or None if the funscript is not cached or changed
+        """
+        try:
+            stat = stat or os.stat(path)
+            entry = self.entry_path(path)
+            with open(entry, 'rb') as f:
+                header = f.read(HEADER.size)
+                if len(header) != HEADER.size:
+                    return None
+                magic, version, size, mtime_ns, count, sha1 = HEADER.unpack(header)
+                if magic != MAGIC or version != FORMAT_VERSION or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                    return None
+                if self.verify_hash and sha1 != sha1_digest(path):
+                    return None
+                if count == 0:
+                    data = np.zeros((2, 0))
+                else:
+                    data = np.memmap(f, dtype='<f8', mode='r', offset=HEADER.size, shape=(2, count))
+            os.utime(entry)     # mtime is the last use, for eviction
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f'unable to read funscript cache for {path}: {e}')
+            return None
+        return data[0], data[1], sha1
+
+    def store(self, path, x: np.ndarray, y: np.ndarray, stat: os.stat_result, sha1: bytes):
+        """
+        :param stat: os.stat() of the funscript before it was read
+        :param sha1: digest of the funscript content
+        """
+        if self.max_size_in_bytes <= 0:
+            return
+        x = np.asarray(x, dtype='<f8')
+        y = np.asarray(y, dtype='<f8')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, stat.st_size, stat.st_mtime_ns, len(x), sha1))
+                    f.write(x.tobytes())
+                    f.write(y.tobytes())
+                os.replace(temp_path, self.entry_path(path))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f'unable to write funscript cache for {path}: {e}')
+            return
+        self.evict()
+
+    def invalidate(self, path):
+        try:
+            os.remove(self.entry_path(path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.debug(f'unable to remove cache entry for {path}: {e}')
+
+    def entries(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.name.endswith(SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def entry_stats(self) -> list[tuple[os.stat_result, str]]:
+        """
+        :return: (stat, path) of every entry. Entries removed in the meantime, by another loader thread
+        or process, are skipped.
+        """
+        stats = []
+        for entry in self.entries():
+            try:
+                stats.append((entry.stat(), entry.path))
+            except OSError:
+                continue
+        return stats
+
+    def size_in_bytes(self) -> int:
+        return sum(stat.st_size for stat, _ in self.entry_stats())
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size_in_bytes.
+        """
+        entries = [(stat.st_mtime_ns, stat.st_size, entry_path) for stat, entry_path in self.entry_stats()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_size_in_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                total -= size
+            except OSError as e:
+                # on windows, entries that are still memory-mapped can not be removed
+                logger.debug(f'unable to evict {entry_path}: {e}')
+
+    def clear(self):
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logger.debug(f'unable to remove {entry.path}: {e}')
+
+
+def sha1_digest(path) -> bytes:
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while data := f.read(2 ** 16):
+            sha1.update(data)
+    return sha1.digest()
+
+
+_cache: FunscriptBinaryCache | None = None
+
+
+def configure(directory, max_size_in_bytes, verify_hash=False):
+    """
+    Enable the binary cache for Funscript.from_file(). A size of 0 disables it.
+    """
+    global _cache
+    if directory and max_size_in_bytes > 0:
+        _cache = FunscriptBinaryCache(directory, max_size_in_bytes, verify_hash)
+    else:
+        _cache = None
+
+
+def get_cache() -> FunscriptBinaryCache | None:
+    return _cache
@@ -1,4 +1,8 @@
+import collections
 import os
+import stat
+import threading
+import time
 import zipfile
 import pathlib
 import logging
@@ -48,9 +52,108 @@ class Resource:
         return self.path.__repr__()
 
 
+class DirectoryListing:
+    """
+    The entries of one directory or zip file, grouped by the prefix that is compared to the media name.
+    """
+    def __init__(self, path: str, signature: tuple, is_zip: bool, trusted: bool):
+        self.path = path
+        self.signature = signature  # mtime (and size for zip files) at the time of the scan
+        self.is_zip = is_zip
+        self.trusted = trusted      # False if the directory changed so recently that its mtime may not change again
+        self.by_prefix = {}         # lowercase prefix -> [(name, is_dir, lowercase extension, zip member)]
+        self.zip_flags = {}         # name -> zipfile.is_zipfile(), for files that matched a media name
+
+    def add(self, name: str, is_dir: bool, at: str = None):
+        if is_dir:
+            # directories match on their full name, but only outside of zip files
+            key, extension = name, ''
+        else:
+            key, _, extension = split_funscript_path(name)
+        self.by_prefix.setdefault(key.lower(), []).append((name, is_dir, extension.lower(), at))
+
+    def matches(self, prefix: str) -> list[tuple]:
+        return self.by_prefix.get(prefix.lower(), [])
+
+    def is_zipfile(self, name: str) -> bool:
+        if name not in self.zip_flags:
+            self.zip_flags[name] = zipfile.is_zipfile(os.path.join(self.path, name))
+        return self.zip_flags[name]
+
+
+class FunscriptIndex:
+    """
+    Cache of directory and zip listings for collect_funscripts(), shared by all lookups.
+
+    A listing is reused as long as the mtime of the directory (or size and mtime of the zip file)
+    is unchanged, so a lookup in a known directory costs one stat instead of listing it.
+    Directories modified less than racy_interval before their scan are scanned again on the next
+    lookup, because a file added within the mtime resolution (2s on FAT, coarse on some network shares)
+    does not change the mtime.
+    """
+    def __init__(self, max_directories=1024, racy_interval=2.0):
+        self.max_directories = max_directories
+        self.racy_interval = racy_interval
+        self._listings = collections.OrderedDict()     # path -> DirectoryListing
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.hits = 0
+
+    def listing(self, path: str) -> DirectoryListing:
+        """
+        :raise OSError: if the path can not be read
+        :raise zipfile.BadZipFile: if the path is a file but not a zip file
+        """
+        st = os.stat(path)
+        is_zip = not stat.S_ISDIR(st.st_mode)
+        signature = (st.st_size, st.st_mtime_ns) if is_zip else (st.st_mtime_ns,)
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is not None and listing.signature == signature and listing.trusted:
+                self._listings.move_to_end(path)
+                self.hits += 1
+                return listing
+
+        trusted = time.time_ns() - st.st_mtime_ns > self.racy_interval * 1e9
+        listing = DirectoryListing(path, signature, is_zip, trusted)
+        if is_zip:
+            for node in zipfile.Path(path).iterdir():
+                listing.add(node.name, False, node.at)
+        else:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    listing.add(entry.name, is_dir)
+
+        with self._lock:
+            self.scans += 1
+            self._listings[path] = listing
+            self._listings.move_to_end(path)
+            while len(self._listings) > self.max_directories:
+                self._listings.popitem(last=False)
+        return listing
+
+    def invalidate(self, path: str = None):
+        """
+        Forget the listing of path, or of all paths.
+        """
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(path, None)
+
+
+funscript_index = FunscriptIndex()
+
+
 def collect_funscripts(
         dirs: list[str],
-        media: str
+        media: str,
+        index: FunscriptIndex = None,
 ) -> list[Resource]:
     """
     Search the directories in order for funscripts. Stop searching when at least one funscript is found in a directly.
@@ -58,57 +161,44 @@ def collect_funscripts(
     zipfiles are supported.
     :param dirs:
     :param media:
+    :param index: directory listings to use, the shared funscript_index by default
     :return:
     """
-    def path_is_zip(path):
-        try:
-            zipfile.Path(path)
-            return True
-        except OSError:
-            return False
-
+    index = index or funscript_index
     dir_stack = dirs[:]
-    new_dirs = []
     collected_files = []
 
     media_prefix, _, media_extension = split_funscript_path(media)
 
     while dir_stack and len(collected_files) == 0:
+        new_dirs = []
+        new_zips = []
         try:
             current_dir = os.path.expanduser(dir_stack[0])
             del dir_stack[0]
 
             logger.info(f'detecting funscripts from {current_dir}')
-
-            try:
-                traversing_a_zip = True
-                traversable = zipfile.Path(current_dir)
-            except OSError:
-                traversing_a_zip = False
-                traversable = pathlib.Path(current_dir)
-
-            for node in traversable.iterdir():
-                full_path = os.path.join(current_dir, node.name)
-                if not traversing_a_zip and node.is_dir(): # do not support dir-in-zip
-                    if case_insensitive_compare(node.name, media_prefix):
-                        new_dirs.append(full_path)
-                else:
-                    a, b, c = split_funscript_path(full_path)
-                    if case_insensitive_compare(a, media_prefix):
-                        if not traversing_a_zip and zipfile.is_zipfile(full_path):    # do not support zip-in-zip
-                            new_dirs.append(full_path)
-                        elif case_insensitive_compare(c, 'funscript'):
-                            collected_files.append(Resource(node))
-
-        except OSError as e:    # unreachable network?
+            listing = index.listing(current_dir)
+
+            zip_root = None
+            for name, is_dir, extension, at in listing.matches(media_prefix):
+                full_path = os.path.join(current_dir, name)
+                if listing.is_zip:
+                    if extension == 'funscript':
+                        # all members share the ZipFile of the root
+                        zip_root = zip_root or zipfile.Path(current_dir)
+                        collected_files.append(Resource(zipfile.Path(zip_root.root, at)))
+                elif is_dir:
+                    new_dirs.append(full_path)
+                elif listing.is_zipfile(name):    # do not support zip-in-zip
+                    new_zips.append(full_path)
+                elif extension == 'funscript':
+                    collected_files.append(Resource(pathlib.Path(full_path)))
+
+        except (OSError, zipfile.BadZipFile) as e:    # unreachable network?
             pass
 
         # make sure to search dirs before zipfiles
-        new_zips = list(filter(path_is_zip, new_dirs))
-        new_dirs = list(filter(lambda x: not path_is_zip(x), new_dirs))
         dir_stack = new_dirs + new_zips + dir_stack
-        new_dirs = []
-
-
 
     return collected_files
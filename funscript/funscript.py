@@ -1,29 +1,30 @@
 import numpy as np
-import json
 import time
 import logging
 import hashlib
 import pathlib
 
+from funscript import binary_cache
+from funscript.actions_parser import parse_actions
+from funscript.actions_writer import to_actions, write_actions
+from funscript.memory_cache import FunscriptMemoryCache
 
-logger = logging.getLogger('restim.funscript')
 
+logger = logging.getLogger('restim.funscript')
 
-# TOOD: consider cleaning up old files
-funscript_cache = {
 
-}
+# loaded funscripts, by content. The budget is set from the settings on startup.
+funscript_cache = FunscriptMemoryCache(128 * 1024 * 1024)
 
 
-def sha1_hash(path):
-    sha1 = hashlib.sha1()
-    with path.open('rb') as f:
-        while True:
-            data = f.read(2 ** 16)
-            sha1.update(data)
-            if not data:
-                break
-    return sha1.hexdigest()
+def invalidate_cache(path):
+    """
+    Call when a funscript file was written or removed, to drop it from the memory and binary cache.
+    """
+    funscript_cache.invalidate(path)
+    disk_cache = binary_cache.get_cache()
+    if disk_cache is not None:
+        disk_cache.invalidate(path)
 
 
 class Funscript:
@@ -34,36 +35,54 @@ class Funscript:
     @staticmethod
     def from_file(filename_or_path):
         start = time.time()
-        x = []
-        y = []
 
         if isinstance(filename_or_path, str):
             path = pathlib.Path(filename_or_path)
         else:
             path = filename_or_path
 
-        hash = sha1_hash(path)
-        if hash in funscript_cache:
+        # files inside a zip (zipfile.Path) have no stat, they are only cached by content
+        stat = path.stat() if isinstance(path, pathlib.PurePath) else None
+        if stat is not None:
+            funscript = funscript_cache.get_path(path, stat)
+            if funscript is not None:
+                logger.info(f'imported {path} from cache')
+                return funscript
+
+        disk_cache = binary_cache.get_cache() if stat is not None else None
+        if disk_cache is not None:
+            cached = disk_cache.load(path, stat)
+            if cached is not None:
+                x, y, digest = cached
+                funscript = Funscript(x, y)
+                funscript_cache.put(digest.hex(), funscript, path, stat)
+                logger.info(f'imported {path} from binary cache in {time.time() - start} seconds')
+                return funscript
+
+        # read once, for both the hash and the parser
+        data = path.read_bytes()
+        digest = hashlib.sha1(data).digest()
+        hash = digest.hex()
+        funscript = funscript_cache.get(hash, path, stat)
+        if funscript is not None:
             logger.info(f'imported {path} from cache')
-            return funscript_cache[hash]
+            return funscript
 
-        with path.open(encoding='utf-8') as f:
-            js = json.load(f)
-            for action in js['actions']:
-                at = float(action['at']) / 1000
-                pos = float(action['pos']) * 0.01
-                x.append(at)
-                y.append(pos)
+        x, y = parse_actions(data)
 
         end = time.time()
         logger.info(f'imported {path} in {end-start} seconds')
         funscript = Funscript(x, y)
-        funscript_cache[hash] = funscript
+        funscript_cache.put(hash, funscript, path, stat)
+        if disk_cache is not None:
+            disk_cache.store(path, funscript.x, funscript.y, stat, digest)
         return funscript
 
-    def save_to_path(self, path):
-        actions = [{"at": int(at * 1000), "pos": int(pos * 100)} for at, pos in zip(self.x, self.y)]
-        js = {"actions": actions}
+    def save_to_path(self, path, compact=False):
+        """
+        :param compact: drop points that do not change the script, see actions_writer.to_actions()
+        """
+        at, pos = to_actions(self.x, self.y, compact)
         with open(path, 'w') as f:
-            json.dump(js, f)
-
+            write_actions(f, at, pos)
+        invalidate_cache(path)
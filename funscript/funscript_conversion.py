@@ -1,47 +1,44 @@
 import numpy as np
 from funscript.funscript import Funscript
 
-
-def convert_1d_to_2d(funscript: Funscript, random_direction_change_probability=0.1):
-    at, pos = funscript.x, funscript.y
-
-    dir = 1
-
-    t_out = []
-    x_out = []
-    y_out = []
-
-    for i in range(len(pos) - 1):
-        start_t, end_t = at[i:i + 2]
-        start_p, end_p = pos[i:i + 2]
-
-        duration = end_t - start_t
-        if start_p == end_p:
-            n = 1
-        else:
-            if duration <= .100:
-                n = 2
-            elif duration <= .200:
-                n = 3
-            elif duration <= .300:
-                n = 4
-            elif duration <= .400:
-                n = 5
-            else:
-                n = 6
-
-        t = np.linspace(0.0, duration, n, endpoint=False)
-        theta = np.linspace(0, np.pi, n, endpoint=False)
-        center = (end_p + start_p) / 2
-        r = (start_p - end_p) / 2
-
-        if np.random.random() < random_direction_change_probability:
-            dir = dir * -1
-
-        x = center + r * np.cos(theta)
-        y = r * dir * np.sin(theta) + 0.5
-        t_out += list(t + start_t)
-        x_out += list(x)
-        y_out += list(y)
-
-    return t_out, x_out, y_out
+# segments up to these durations (in seconds) get 2, 3, 4, 5 points, longer ones 6
+SEGMENT_DURATIONS = np.array([.100, .200, .300, .400])
+
+
+def convert_1d_to_2d(funscript: Funscript, random_direction_change_probability=0.1,
+                     rng: np.random.Generator | int | None = None):
+    """
+    Every stroke becomes a half circle from the start to the end position, alpha along the stroke and
+    beta perpendicular to it. The side of the circle changes with random_direction_change_probability.
+
+    :param rng: random generator or seed, for reproducible output
+    :return: (t, alpha, beta) arrays
+    """
+    rng = np.random.default_rng(rng)
+    at, pos = np.asarray(funscript.x), np.asarray(funscript.y)
+    if len(pos) < 2:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+
+    start_t, end_t = at[:-1], at[1:]
+    start_p, end_p = pos[:-1], pos[1:]
+    duration = end_t - start_t
+
+    # points per segment
+    n = 2 + np.searchsorted(SEGMENT_DURATIONS, duration, side='left')
+    n[start_p == end_p] = 1
+
+    # one draw per segment, in order, so the stream is the same as drawing in a loop
+    flips = rng.random(len(duration)) < random_direction_change_probability
+    direction = np.where(np.cumsum(flips) % 2, -1, 1)
+
+    # point k of a segment, like np.linspace(0, ..., n, endpoint=False)
+    segment = np.repeat(np.arange(len(n)), n)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(n) - n, n)
+    t = k * (duration / n)[segment]
+    theta = k * (np.pi / n)[segment]
+
+    center = ((end_p + start_p) / 2)[segment]
+    r = ((start_p - end_p) / 2)[segment]
+    x = center + r * np.cos(theta)
+    y = r * direction[segment] * np.sin(theta) + 0.5
+    return t + start_t[segment], x, y
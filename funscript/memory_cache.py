@@ -0,0 +1,150 @@
+import collections
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger('restim.funscript')
+
+
+@dataclass
+class FunscriptCacheStatistics:
+    hits: int
+    misses: int
+    evictions: int              # entries removed to stay within the budget
+    invalidations: int          # entries removed because the file changed
+    entries: int
+    size_in_bytes: int
+    max_size_in_bytes: int
+
+    def summary(self) -> str:
+        return (f'{self.entries} funscripts, {self.size_in_bytes / 2 ** 20:.1f}/{self.max_size_in_bytes / 2 ** 20:.0f}MiB, '
+                f'{self.hits} hits, {self.misses} misses, {self.evictions} evictions, '
+                f'{self.invalidations} invalidations')
+
+
+def path_key(path) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def stat_key(stat: os.stat_result) -> tuple[int, int]:
+    return stat.st_size, stat.st_mtime_ns
+
+
+class FunscriptMemoryCache:
+    """
+    In-process cache of loaded funscripts, least recently used first out.
+
+    Entries are keyed by the sha1 of the funscript content, so identical files share one entry.
+    The size of an entry is the size of its arrays, entries are evicted until the total fits in
+    max_size_in_bytes. Funscripts larger than the budget are not cached.
+
+    Files on disk are also indexed by path with their size and mtime, so a known file is found
+    without reading it. A file with a different size or mtime is looked up by content again.
+    invalidate() drops a file explicitly, for files that are rewritten within the mtime resolution.
+
+    Cached funscripts are shared, they must not be modified.
+    """
+    def __init__(self, max_size_in_bytes: int):
+        self.max_size_in_bytes = max_size_in_bytes
+        self._entries = collections.OrderedDict()   # sha1 hex -> (funscript, size in bytes)
+        self._paths = {}                            # path key -> (stat key, sha1 hex)
+        self._size_in_bytes = 0
+        self._lock = threading.Lock()               # funscripts may be loaded from several threads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_path(self, path, stat: os.stat_result):
+        """
+        :return: the funscript last stored for this file, if the file did not change since
+        """
+        key = path_key(path)
+        with self._lock:
+            known = self._paths.get(key)
+            if known is None:
+                return None
+            if known[0] != stat_key(stat) or known[1] not in self._entries:
+                del self._paths[key]
+                return None
+            return self._hit(known[1])
+
+    def get(self, sha1: str, path=None, stat: os.stat_result = None):
+        """
+        :param path, stat: file the content was read from, to find it with get_path() next time
+        :return: the funscript with this content
+        """
+        with self._lock:
+            if sha1 not in self._entries:
+                return None
+            if stat is not None:
+                self._paths[path_key(path)] = (stat_key(stat), sha1)
+            return self._hit(sha1)
+
+    def _hit(self, sha1: str):
+        self.hits += 1
+        self._entries.move_to_end(sha1)
+        return self._entries[sha1][0]
+
+    def put(self, sha1: str, funscript, path=None, stat: os.stat_result = None):
+        """
+        Store a funscript that had to be loaded, counts as a miss.
+        """
+        size = funscript.x.nbytes + funscript.y.nbytes
+        with self._lock:
+            self.misses += 1
+            if size > self.max_size_in_bytes:
+                return
+            if sha1 in self._entries:
+                self._size_in_bytes -= self._entries[sha1][1]
+            self._entries[sha1] = (funscript, size)
+            self._entries.move_to_end(sha1)
+            self._size_in_bytes += size
+            if stat is not None:
+                self._paths[path_key(path)] = (stat_key(stat), sha1)
+            self._evict()
+
+    def _evict(self):
+        while self._size_in_bytes > self.max_size_in_bytes:
+            sha1, (_, size) = self._entries.popitem(last=False)
+            self._size_in_bytes -= size
+            self.evictions += 1
+            logger.debug(f'evicted funscript {sha1} from memory cache, {size} bytes')
+
+    def invalidate(self, path):
+        """
+        Forget a file that was changed or removed. Its content is dropped too,
+        unless another cached file has the same content.
+        """
+        with self._lock:
+            known = self._paths.pop(path_key(path), None)
+            if known is None:
+                return
+            sha1 = known[1]
+            if sha1 in self._entries and not any(other == sha1 for _, other in self._paths.values()):
+                self._size_in_bytes -= self._entries.pop(sha1)[1]
+                self.invalidations += 1
+
+    def resize(self, max_size_in_bytes: int):
+        with self._lock:
+            self.max_size_in_bytes = max_size_in_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._size_in_bytes = 0
+
+    def statistics(self) -> FunscriptCacheStatistics:
+        with self._lock:
+            return FunscriptCacheStatistics(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                invalidations=self.invalidations,
+                entries=len(self._entries),
+                size_in_bytes=self._size_in_bytes,
+                max_size_in_bytes=self.max_size_in_bytes,
+            )
@@ -1,3 +1,5 @@
+import re
+
 import numpy as np
 
 
@@ -10,6 +12,12 @@ class InvalidTCodeException(Exception):
     pass
 
 
+# the usual form of a command: axis, digits, optional interval. Anything else is left to parse_command().
+COMMAND = re.compile(r'(\S\S)([0-9]+)(?:I([0-9]+))?')
+# whitespace separated tokens of a message, split in the usual form or the whole token
+SCANNER = re.compile(r'(?<!\S)(\S\S)([0-9]+)(?:I([0-9]+))?(?!\S)|(\S+)')
+
+
 class TCodeCommand:
     def __init__(self, axis_identifier: str, value: float, interval: int=0):
         self.axis_identifier = axis_identifier
@@ -27,6 +35,11 @@ class TCodeCommand:
                 raise InvalidTCodeException()
 
         buf = buf.strip()
+        match = COMMAND.fullmatch(buf)
+        if match:
+            axis_identifier, value, interval = match.groups()
+            return TCodeCommand(axis_identifier, float(value) / (10**len(value)), int(interval) if interval else 0)
+
         if len(buf) < 3:
             raise InvalidTCodeException()
 
@@ -52,3 +65,23 @@ class TCodeCommand:
 
     def __str__(self):
         return self.format_cmd()
+
+
+def parse_commands(msg: str) -> list[tuple[str, float, int]]:
+    """
+    Parse all whitespace separated commands in a message, like calling TCodeCommand.parse_command()
+    on every token. Invalid tokens are skipped.
+
+    :return: (axis identifier, value, interval) per command, in order
+    """
+    commands = []
+    for axis_identifier, value, interval, other in SCANNER.findall(msg):
+        if other:
+            try:
+                cmd = TCodeCommand.parse_command(other)
+            except InvalidTCodeException:
+                continue
+            commands.append((cmd.axis_identifier, cmd.value, cmd.interval))
+        else:
+            commands.append((axis_identifier, float(value) / (10**len(value)), int(interval) if interval else 0))
+    return commands
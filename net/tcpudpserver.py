@@ -1,10 +1,9 @@
-import re
 import logging
 
 from PySide6 import QtCore, QtNetwork
 from PySide6.QtNetwork import QHostAddress
 
-from net.tcode import TCodeCommand, InvalidTCodeException
+from net.tcode import parse_commands
 from qt_ui import settings
 
 from functools import partial
@@ -60,30 +59,21 @@ class TcpUdpServer(QtCore.QObject):
         while socket.canReadLine():
             msg = socket.readLine()
             msg = msg.data().decode('utf-8')
-            for cmd in re.split('\\s|\n|\r', msg):
-                if len(cmd) < 3:
-                    continue
-                try:
-                    tcode = TCodeCommand.parse_command(cmd)
-                    self.new_tcode_command.emit(tcode)
-                except InvalidTCodeException as e:
-                    pass
+            commands = parse_commands(msg)
+            if commands:
+                self.new_tcode_commands.emit(commands)
 
     def udp_data_received(self):
         while self.udp_socket.hasPendingDatagrams():
             datagram = self.udp_socket.receiveDatagram()
             msg = datagram.data()
             msg = msg.data().decode('utf-8')
-            for cmd in re.split('\\s|\n|\r', msg):
-                if len(cmd) < 3:
-                    continue
-                try:
-                    tcode = TCodeCommand.parse_command(cmd)
-                    self.new_tcode_command.emit(tcode)
-                except InvalidTCodeException as e:
-                    pass
+            commands = parse_commands(msg)
+            if commands:
+                self.new_tcode_commands.emit(commands)
 
     def clientDisconnected(self):
         self.tcp_connections = [con for con in self.tcp_connections if con.state() == QtNetwork.QAbstractSocket.UnconnectedState]
 
-    new_tcode_command = QtCore.Signal(TCodeCommand)
+    # list of (axis identifier, value, interval), see net.tcode.parse_commands()
+    new_tcode_commands = QtCore.Signal(list)
@@ -1,10 +1,9 @@
-import re
 import logging
 
 from PySide6 import QtCore, QtWebSockets, QtNetwork
 from PySide6.QtNetwork import QHostAddress
 
-from net.tcode import TCodeCommand, InvalidTCodeException
+from net.tcode import parse_commands
 from qt_ui import settings
 
 logger = logging.getLogger('restim.websocket')
@@ -40,14 +39,12 @@ class WebSocketServer(QtCore.QObject):
         self.connections.append(conn)
 
     def textMessageReceived(self, msg):
-        for cmd in re.split('\\s|\n|\r', msg):
-            try:
-                tcode = TCodeCommand.parse_command(cmd)
-                self.new_tcode_command.emit(tcode)
-            except InvalidTCodeException:
-                pass
+        commands = parse_commands(msg)
+        if commands:
+            self.new_tcode_commands.emit(commands)
 
     def clientDisconnected(self):
         self.connections = [con for con in self.connections if con.state() == QtNetwork.QAbstractSocket.UnconnectedState]
 
-    new_tcode_command = QtCore.Signal(TCodeCommand)
+    # list of (axis identifier, value, interval), see net.tcode.parse_commands()
+    new_tcode_commands = QtCore.Signal(list)
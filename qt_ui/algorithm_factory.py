@@ -494,13 +494,16 @@ class AlgorithmFactory:
         if not self.load_funscripts:
             return None
 
-        funscript_item = self.script_mapping.get_config_for_axis(axis)
-        if funscript_item:
+        # only wait for the scripts of this axis, the others keep loading in the background.
+        # If the first script fails to load, the next script linked to the axis is used.
+        for funscript_item in self.script_mapping.get_configs_for_axis(axis):
+            script = funscript_item.wait()
+            if script is None:
+                continue
             limit_min, limit_max = limits or self.kit.limits_for_axis(axis)
             # TODO: not very memory efficient if multiple algorithms reference the same script.
             # but worst-case it only wastes a few MB or so...
-            return create_precomputed_axis(funscript_item.script.x,
-                                           np.clip(funscript_item.script.y, 0, 1) * (limit_max - limit_min) + limit_min,
+            return create_precomputed_axis(script.x,
+                                           np.clip(script.y, 0, 1) * (limit_max - limit_min) + limit_min,
                                            self.timestamp_mapper)
-        else:
-            return None
+        return None
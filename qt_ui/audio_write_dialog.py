@@ -1,9 +1,6 @@
 import logging
-import numpy as np
 import time
 
-import soundfile as sf
-
 from PySide6 import QtGui, QtCore
 from PySide6.QtCore import QThread, QUrl
 from PySide6.QtMultimedia import QMediaPlayer
@@ -13,28 +10,13 @@ from qt_ui.algorithm_factory import AlgorithmFactory
 from qt_ui.audio_write_dialog_ui import Ui_AudioWriteDialog
 from qt_ui.models.funscript_kit import FunscriptKitModel
 from qt_ui.models.script_mapping import ScriptMappingModel
-from stim_math.axis import AbstractMediaSync, AbstractTimestampMapper
 from qt_ui.device_wizard.enums import DeviceConfiguration
 from qt_ui.file_dialog import FileDialog
+from bake.audio import BakeTimestampMapper, bake_audio
 
 logger = logging.getLogger('restim.bake_audio')
 
 
-class DummyTimestamMapper(AbstractTimestampMapper, AbstractMediaSync):
-    def __init__(self, epoch):
-        self.epoch = epoch
-
-    def is_playing(self) -> bool:
-        return True
-
-    def map_timestamp(self, timestamp):
-        return timestamp - self.epoch
-
-
-def chunker(seq, size):
-    return (seq[pos:pos + size] for pos in range(0, len(seq), size))
-
-
 class AudioWriteDialog(QDialog, Ui_AudioWriteDialog):
     def __init__(self, mainwindow,
                  kit: FunscriptKitModel,
@@ -83,14 +65,13 @@ class AudioWriteDialog(QDialog, Ui_AudioWriteDialog):
 
         samplerate = int(self.samplerate_spinbox.currentText())
         duration_in_s = float(self.duration_spinbox.value())
-        duration_in_samples = int(samplerate * duration_in_s)
 
         self.progressBar.setMaximum(int(duration_in_s))
         self.progressBar.setValue(5)
         self.progressBar.setFormat("%v/%m")
 
         epoch = time.time() + 100
-        dummy_mapper = DummyTimestamMapper(epoch)
+        dummy_mapper = BakeTimestampMapper(epoch)
 
         filename = self.file_edit.text()
         if not filename:
@@ -113,33 +94,10 @@ class AudioWriteDialog(QDialog, Ui_AudioWriteDialog):
                 super(Worker, self).__init__(parent)
 
             def run(self) -> None:
-                logger.info('bake audio started.')
-                logger.info(f'target file: {filename}')
                 self.progress.emit(0)
-                start_time = time.time()
-                try:
-                    file = sf.SoundFile(filename, mode='w', samplerate=samplerate, channels=algo.channel_count())
-                except TypeError as e:
-                    logger.error("Could not open output file. Error message is:")
-                    logger.error(e.__str__())
-                    return
-
-                # TODO: for a 3 hour file this allocates 4GB of data, which is completely unnecessary
-                timeline = np.linspace(0, duration_in_s, duration_in_samples) + epoch
-                samples_processed = 0
-                for chunk in chunker(timeline, int(samplerate/10)):
-                    if self.isInterruptionRequested():
-                        logger.warning('bake audio interrupted by user')
-                        break
-                    samples_processed += len(chunk)
-                    self.progress.emit(int(samples_processed / samplerate))
-                    data = np.vstack(algo.generate_audio(samplerate, chunk, chunk)).T
-                    file.write(data)
-                file.close()
-                end_time = time.time()
-                elapsed_time = end_time - start_time
-                if not self.isInterruptionRequested():
-                    logger.info(f'bake {duration_in_s:.1f} seconds of audio in {elapsed_time:.1f} seconds ({duration_in_s / elapsed_time:.1f}x realtime)')
+                bake_audio(algo, filename, samplerate, duration_in_s, epoch,
+                           progress=lambda seconds: self.progress.emit(int(seconds)),
+                           is_interrupted=self.isInterruptionRequested)
 
             progress = QtCore.Signal(int)
 
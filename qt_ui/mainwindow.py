@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 from enum import Enum
 
 from PySide6 import QtGui, QtCore
@@ -29,6 +30,8 @@ import qt_ui.focstim_flash_dialog
 import qt_ui.funscript_decomposition_dialog
 import qt_ui.preferences_dialog
 import qt_ui.settings
+import funscript.binary_cache
+import funscript.funscript
 import net.serialproxy
 import net.buttplug_wsdm_client
 from qt_ui import resources
@@ -165,10 +168,10 @@ class Window(QMainWindow, Ui_MainWindow):
         self.output_device = None
 
         self.websocket_server = net.websocketserver.WebSocketServer(self)
-        self.websocket_server.new_tcode_command.connect(self.tcode_command_router.route_command)
+        self.websocket_server.new_tcode_commands.connect(self.tcode_command_router.route_commands)
 
         self.tcpudp_server = net.tcpudpserver.TcpUdpServer(self)
-        self.tcpudp_server.new_tcode_command.connect(self.tcode_command_router.route_command)
+        self.tcpudp_server.new_tcode_commands.connect(self.tcode_command_router.route_commands)
 
         self.serial_proxy = net.serialproxy.SerialProxy(self)
         self.serial_proxy.new_tcode_command.connect(self.tcode_command_router.route_command)
@@ -235,6 +238,7 @@ class Window(QMainWindow, Ui_MainWindow):
         self.autostart_timer.setSingleShot(True)
         self.autostart_timer.timeout.connect(self.autostart_timeout)
         self.autostart_timer.setInterval(5000)
+        self.first_sound_logged_for = None  # media change that time-to-first-sound was logged for
 
     def connect_signals_slots_actionbar(self):
         def uncheck():
@@ -502,6 +506,7 @@ class Window(QMainWindow, Ui_MainWindow):
             load_funscripts=not self.page_media.is_internal(),
         )
         algorithm = algorithm_factory.create_algorithm(device)
+        algorithm_ready_at = time.perf_counter()
 
         if device.device_type in [
             DeviceType.AUDIO_THREE_PHASE,
@@ -558,6 +563,20 @@ class Window(QMainWindow, Ui_MainWindow):
         else:
             raise RuntimeError("Unknown device type")
 
+        self.log_time_to_first_sound(algorithm_ready_at)
+
+    def log_time_to_first_sound(self, algorithm_ready_at):
+        model = self.page_media.model
+        if self.playstate != PlayState.PLAYING or model.media_changed_at in (None, self.first_sound_logged_for):
+            return
+        now = time.perf_counter()
+        loaded = 'still loading' if model.scripts_loaded_at is None else \
+            f'{model.scripts_loaded_at - model.media_changed_at:.3f}s'
+        logger.info(f'time to first sound after media change: {now - model.media_changed_at:.3f}s '
+                    f'(algorithm ready after {algorithm_ready_at - model.media_changed_at:.3f}s, '
+                    f'all funscripts loaded: {loaded})')
+        self.first_sound_logged_for = model.media_changed_at   # only the first start after a media change
+
     def signal_stop(self, new_playstate: PlayState = PlayState.STOPPED):
         """Stop signal generation."""
         if self.output_device is not None:
@@ -763,6 +782,7 @@ class Window(QMainWindow, Ui_MainWindow):
         if self.output_device is not None:
             self.output_device.stop()
         self.save_settings()
+        logger.info(f'funscript cache: {funscript.funscript.funscript_cache.statistics().summary()}')
         event.accept()
 
 
@@ -774,6 +794,11 @@ def run():
     logger.setLevel(logging.DEBUG)
     logging.getLogger('matplotlib').setLevel(logging.WARN)
 
+    funscript.binary_cache.configure(qt_ui.settings.funscript_cache_directory.get(),
+                                     int(qt_ui.settings.funscript_cache_size_mb.get() * 1024 * 1024),
+                                     qt_ui.settings.funscript_cache_verify_hash.get())
+    funscript.funscript.funscript_cache.resize(int(qt_ui.settings.funscript_memory_cache_size_mb.get() * 1024 * 1024))
+
     def excepthook(exc_type, exc_value, exc_tb):
         exc_info = (exc_type, exc_value, exc_tb)
         logger.critical('Exception occurred', exc_info=exc_info)
@@ -1,50 +1,9 @@
 import typing
-from dataclasses import dataclass
 from PySide6.QtCore import QModelIndex, Qt, QAbstractTableModel
 
-from qt_ui.device_wizard.axes import AxisEnum, all_axis
+from qt_ui.device_wizard.axes import AxisEnum
 from qt_ui.settings import get_settings_instance
-
-
-defaults = {
-    AxisEnum.POSITION_ALPHA: ('alpha', 'L0', -1, 1, True, True),
-    AxisEnum.POSITION_BETA: ('beta', 'L1', -1, 1, True, True),
-    AxisEnum.POSITION_GAMMA: ('gamma', '', -1, 1, True, True),
-    AxisEnum.VOLUME_API: ('volume', 'V0', 0, 1, True, True),
-    AxisEnum.VOLUME_EXTERNAL: ('', '', 0, 1, False, False),
-    AxisEnum.CARRIER_FREQUENCY: ('frequency', 'C0', 500, 1000, True, True),
-
-    AxisEnum.PULSE_FREQUENCY: ('pulse_frequency', 'P0', 0, 100, True, True),
-    AxisEnum.PULSE_WIDTH: ('pulse_width', 'P1', 4, 10, True, True),
-    AxisEnum.PULSE_INTERVAL_RANDOM: ('pulse_interval_random', 'P2', 0, 1, True, True),
-    AxisEnum.PULSE_RISE_TIME: ('pulse_rise_time', 'P3', 2, 20, True, True),
-
-    AxisEnum.VIBRATION_1_FREQUENCY: ('vib1_frequency', '', 0, 100, True, True),
-    AxisEnum.VIBRATION_1_STRENGTH: ('vib1_strength', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_1_LEFT_RIGHT_BIAS: ('vib1_left_right_bias', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_1_HIGH_LOW_BIAS: ('vib1_up_down_bias', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_1_RANDOM: ('vib1_random', '', 0, 1, True, True),
-
-    AxisEnum.VIBRATION_2_FREQUENCY: ('vib2_frequency', '', 0, 100, True, True),
-    AxisEnum.VIBRATION_2_STRENGTH: ('vib2_strength', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_2_LEFT_RIGHT_BIAS: ('vib2_left_right_bias', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_2_HIGH_LOW_BIAS: ('vib2_up_down_bias', '', 0, 1, True, True),
-    AxisEnum.VIBRATION_2_RANDOM: ('vib2_random', '', 0, 1, True, True),
-}
-
-@dataclass
-class FunscriptKitItem:
-    axis: AxisEnum
-    funscript_names: [str]
-    tcode_axis_name = str
-    limit_min: float
-    limit_max: float
-    auto_loading: bool
-    allow_funscript_control: bool
-
-
-def split_functipt_names(str):
-    return [x.strip() for x in str.split(',') if len(x.strip()) > 0]
+from qt_ui.models.funscript_kit_items import defaults, FunscriptKitItem, split_functipt_names, load_kit_items_from_settings
 
 
 class FunscriptKitModel(QAbstractTableModel):
@@ -55,24 +14,7 @@ class FunscriptKitModel(QAbstractTableModel):
     @staticmethod
     def load_from_settings():
         kit = FunscriptKitModel()
-        for axis in all_axis:
-            kit.children.append(FunscriptKitItem(axis, '', None, None, False, False))
-
-        settings = get_settings_instance()
-        settings.beginGroup('funscript_configuration')
-        for item in kit.children:
-            default_funscript_name, default_tcode_axis_name, default_min, default_max, default_auto_load, default_allow_funscript_control = defaults[item.axis]
-
-            settings.beginGroup(item.axis.settings_key())
-            item.funscript_names = split_functipt_names(settings.value('funscript_names', default_funscript_name, str))
-            item.limit_min = settings.value('limit_min', default_min, float)
-            item.limit_max = settings.value('limit_max', default_max, float)
-            item.auto_loading = settings.value('auto_loading', default_auto_load, bool)
-            item.tcode_axis_name = settings.value('tcode_axis', default_tcode_axis_name, str)
-            item.allow_funscript_control = default_allow_funscript_control
-            settings.endGroup()
-
-        settings.endGroup()
+        kit.children = load_kit_items_from_settings()
         return kit
 
     def save_to_settings(self):
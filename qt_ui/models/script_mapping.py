@@ -1,10 +1,13 @@
 from __future__ import annotations  # multiple return values
 
 import json.decoder
+import time
 import typing
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
 
-from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt, Signal
 from PySide6.QtGui import QColor
 
 import qt_ui.device_wizard
@@ -17,6 +20,15 @@ import funscript.collect_funscripts
 
 logger = logging.getLogger('restim.script_mapping')
 
+# funscripts are loaded in the background, so detecting the scripts of a video does not block the ui
+loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix='funscript loader')
+
+
+class LoadState(Enum):
+    LOADING = 0
+    READY = 1
+    FAILED = 2
+
 
 class HeaderTreeItem(TreeItem):
     def __init__(self, parent: TreeItem=None):
@@ -50,16 +62,40 @@ class FunscriptTreeItem(TreeItem):
         self.is_removable = False
         self.first_of_its_kind = False
 
-        # load funscript immediately. This makes the UI feel sluggish on connecting/disconnecting
-        # but has the advantage of not requiring any file IO when audio starts.
+        # start loading immediately, in the background. Audio start only waits for the scripts it uses.
+        self.path = resource.path
+        self.script = None
+        self.state = LoadState.LOADING
+        self.future = loader.submit(Funscript.from_file, resource.path)
+
+    def wait(self) -> Funscript | None:
+        """
+        Block until the funscript is loaded. Only call from the ui thread.
+        :return: the funscript, or None if loading failed
+        """
+        if self.state == LoadState.LOADING:
+            self.finish_loading()
+        return self.script
+
+    def finish_loading(self):
         try:
-            self.script = Funscript.from_file(resource.path)
-        except json.decoder.JSONDecodeError as e:
-            logger.error(f'Unable to parse funscript, broken? {resource.path}')
-            self.script = None
+            self.script = self.future.result()
+            self.state = LoadState.READY
+        except json.decoder.JSONDecodeError:
+            logger.error(f'Unable to parse funscript, broken? {self.path}')
+            self.state = LoadState.FAILED
+        except Exception:
+            logger.exception(f'Unable to load funscript {self.path}')
+            self.state = LoadState.FAILED
+
+    def cancel_loading(self):
+        self.future.cancel()
+
+    def is_loading(self) -> bool:
+        return self.state == LoadState.LOADING
 
     def has_broken_script(self) -> bool:
-        return self.script is None
+        return self.state == LoadState.FAILED
 
     def data(self, column):
         if column == 0:
@@ -67,6 +103,8 @@ class FunscriptTreeItem(TreeItem):
         if column == 1:
             if self.has_broken_script():
                 return "funscript loading failed"
+            if self.is_loading():
+                return f'{self.axis.display_name()} (loading)'
             return self.axis.display_name()
         if column == 2:
             return self.is_removable
@@ -102,6 +140,12 @@ class ScriptMappingModel(QAbstractItemModel):
         self._funscripts_auto = ResourceCategory('Funscripts (auto-detected)', self._root)
         self._root.appendChild(self._funscripts_auto)
 
+        # perf_counter() of the last detection and of the moment all its scripts were loaded, for time-to-first-sound
+        self.media_changed_at = None
+        self.scripts_loaded_at = None
+        # queued, so items are only updated on the ui thread, and never inside a model reset
+        self.scriptLoaded.connect(self.script_loaded, Qt.QueuedConnection)
+
     def data(self, index: QModelIndex, role: int = ...) -> typing.Any:
         if not index.isValid():
             return None
@@ -116,6 +160,8 @@ class ScriptMappingModel(QAbstractItemModel):
             if isinstance(index.internalPointer(), FunscriptTreeItem):
                 if index.internalPointer().has_broken_script():
                     return QColor(255, 0, 0)
+                if index.internalPointer().is_loading():
+                    return QColor(128, 128, 128)
             return None
         else:
             return None
@@ -217,21 +263,50 @@ class ScriptMappingModel(QAbstractItemModel):
     def add_funscript_resource_auto(self, item: FunscriptTreeItem):
         item.parent = self._funscripts_auto
         self._funscripts_auto.appendChild(item)
+        self.watch_loading(item)
 
     def add_funscript_resource_manual(self, item: FunscriptTreeItem):
         item.parent = self._funscripts_manual
         item.is_removable = True
         self._funscripts_manual.appendChild(item)
+        self.watch_loading(item)
         self.refresh_active_files()
 
+    def watch_loading(self, item: FunscriptTreeItem):
+        item.future.add_done_callback(lambda _: self.scriptLoaded.emit(item))
+
+    def script_loaded(self, item: FunscriptTreeItem):
+        if item not in item.parent.children:
+            return  # removed while loading
+        if item.is_loading():
+            item.finish_loading()
+        if item.has_broken_script() and item.axis != AxisEnum.NONE:
+            # a script that can't be loaded is never linked, see auto_link_funscript()
+            item.axis = AxisEnum.NONE
+            self.refresh_active_files()
+        row = item.parent.children.index(item)
+        self.dataChanged.emit(self.createIndex(row, 0, item), self.createIndex(row, 2, item),
+                              [Qt.DisplayRole, Qt.ForegroundRole])
+
+        if self.media_changed_at is not None and self.scripts_loaded_at is None \
+                and not any(i.is_loading() for i in self.funscript_conifg()):
+            self.scripts_loaded_at = time.perf_counter()
+            logger.info(f'loaded {len(self.funscript_conifg())} funscripts '
+                        f'{self.scripts_loaded_at - self.media_changed_at:.3f}s after media change')
+
     def funscript_conifg(self) -> list[FunscriptTreeItem]:
         return self._funscripts_manual.children + self._funscripts_auto.children
 
     def get_config_for_axis(self, axis: AxisEnum) -> FunscriptTreeItem | None:
-        for funscript in self._funscripts_manual.children + self._funscripts_auto.children:
-            if funscript.axis == axis:
-                return funscript
-        return None
+        """
+        :return: the first script linked to axis, possibly still loading
+        """
+        configs = self.get_configs_for_axis(axis)
+        return configs[0] if configs else None
+
+    def get_configs_for_axis(self, axis: AxisEnum) -> list[FunscriptTreeItem]:
+        return [funscript for funscript in self._funscripts_manual.children + self._funscripts_auto.children
+                if funscript.axis == axis and not funscript.has_broken_script()]
 
     def refresh_active_files(self):
         used = {AxisEnum.NONE}
@@ -251,7 +326,10 @@ class ScriptMappingModel(QAbstractItemModel):
         :return:
         """
         dirty = self._funscripts_auto.childCount() > 0
+        self.cancel_loading(self._funscripts_auto.children)
         self._funscripts_auto.children.clear()
+        self.media_changed_at = time.perf_counter()
+        self.scripts_loaded_at = None
 
         resources = funscript.collect_funscripts.collect_funscripts(search_directories, media_file)
         for res in resources:
@@ -262,11 +340,17 @@ class ScriptMappingModel(QAbstractItemModel):
     def clear_auto_detected_funscripts(self):
         if self._funscripts_auto.childCount():
             self.beginRemoveRows(self.createIndex(0, 0, self._funscripts_auto), 0, self._funscripts_auto.childCount())
+            self.cancel_loading(self._funscripts_auto.children)
             self._funscripts_auto.children.clear()
             self.endRemoveRows()
             return True
         return False
 
+    @staticmethod
+    def cancel_loading(items: list[FunscriptTreeItem]):
+        for item in items:
+            item.cancel_loading()
+
     def auto_link_funscripts(self, kit: FunscriptKitModel) -> None:
         for item in self.funscript_conifg():
             self.auto_link_funscript(kit, item)
@@ -285,3 +369,5 @@ class ScriptMappingModel(QAbstractItemModel):
                         logger.info(f'auto-linking `{item.file_name}` to {kit_item.axis.display_name()}.')
                         return
         logger.info(f'auto-linking `{item.file_name}` failed')
+
+    scriptLoaded = Signal(object)  # emitted from the loader threads when a FunscriptTreeItem finished loading
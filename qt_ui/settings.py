@@ -1,13 +1,82 @@
-from PySide6.QtCore import QSettings
+import configparser
 import os
 
+# set by use_ini_file(), for tools that run without Qt
+_ini_parser = None
+
 
 def get_settings_instance():
+    if _ini_parser is not None:
+        return IniFileSettings(_ini_parser)
+
+    from PySide6.QtCore import QSettings
     cwd = os.getcwd()
     path = os.path.join(cwd, 'restim.ini')
     return QSettings(path, QSettings.IniFormat)
 
 
+def use_ini_file(path):
+    """
+    Read all settings from the given ini file, without Qt. Changes to the settings are not saved.
+    """
+    global _ini_parser
+    parser = configparser.ConfigParser(delimiters=('=',), interpolation=None, strict=False)
+    parser.optionxform = str    # keys are case-sensitive
+    parser.read(path, encoding='utf-8')
+    _ini_parser = parser
+
+
+class IniFileSettings:
+    """
+    Read-only subset of the QSettings interface, for ini files written by QSettings.
+    """
+    def __init__(self, parser: configparser.ConfigParser):
+        self.parser = parser
+        self.groups = []
+
+    def beginGroup(self, prefix):
+        self.groups.append(prefix)
+
+    def endGroup(self):
+        self.groups.pop()
+
+    def value(self, key, default_value=None, dtype=None):
+        section, _, name = '/'.join(self.groups + [key]).partition('/')
+        if not name:
+            section, name = 'General', section
+        try:
+            raw = self.parser.get(section, name.replace('/', '\\'))
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return default_value
+
+        if raw == '@Invalid()':
+            return default_value
+        try:
+            if dtype is bool:
+                return raw.lower() == 'true'
+            if dtype is int:
+                return int(float(raw))
+            if dtype is float:
+                return float(raw)
+            if dtype is list:
+                return [self._unquote(item.strip()) for item in raw.split(',') if item.strip()]
+        except ValueError:
+            return default_value
+        return self._unquote(raw)
+
+    @staticmethod
+    def _unquote(raw):
+        if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+            return raw[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        return raw
+
+    def setValue(self, key, value):
+        pass
+
+    def sync(self):
+        pass
+
+
 class Setting:
     def __init__(self, key, default_value, dtype):
         self.key = key
@@ -122,12 +191,18 @@ media_sync_stop_audio_automatically = Setting('media_sync/stop_audio_automatical
 audio_api = Setting("audio/api-name", "", str)
 audio_output_device = Setting("audio/device-name", "", str)
 audio_latency = Setting("audio/latency", 'high', str)
+audio_statistics_log_interval = Setting("audio/statistics-log-interval", 0.0, float)  # seconds, 0 = off
+audio_render_ahead = Setting("audio/render-ahead", 0.0, float)  # seconds, 0 = render in the audio callback
 
 additional_search_paths = Setting('additional_search_paths', [], list)
 
 file_dialog_last_dir = Setting('file_dialog_last_dir', '', str)
 
 funscript_conversion_random_direction_change_probability = Setting('funscript/random_direction_change_probability', 0.1, float)
+funscript_cache_directory = Setting('funscript/cache_directory', 'funscript-cache', str)  # relative to the working directory
+funscript_cache_size_mb = Setting('funscript/cache_size_mb', 256, float)  # 0 = no binary cache
+funscript_cache_verify_hash = Setting('funscript/cache_verify_hash', False, bool)
+funscript_memory_cache_size_mb = Setting('funscript/memory_cache_size_mb', 128, float)  # 0 = no in-process cache
 
 simfile_conversion_atk_sus_rel_index = Setting('simfile/atk_sus_rel_index', 1, int)
 simfile_conversion_output_debug_scripts = Setting('simfile/output_debug_scripts', False, bool)
@@ -5,13 +5,11 @@ from PySide6.QtWidgets import QDialog, QFileDialog
 
 from qt_ui.simfile_conversion_dialog_ui import Ui_SimfileConversionDialog
 from qt_ui.file_dialog import FileDialog
-from funscript.funscript import Funscript
 
 from simfile.simfile import Simfile
-from simfile.conversion import notes_to_intensity, electrode_intensity_to_position_3p
+from simfile.conversion import notes_to_funscripts
 from simfile.interpolation import interpolators
 
-import numpy as np
 from qt_ui import settings
 
 
@@ -74,37 +72,19 @@ class SimfileConversionDialog(QDialog, Ui_SimfileConversionDialog):
         interpolator = self.comboBox_interpolation.currentData()
 
         try:
-            x, (a, b, c, d) = notes_to_intensity(notes, interpolator)
-            alpha, beta = electrode_intensity_to_position_3p(a, b, c)
+            funscripts = notes_to_funscripts(self.simfile, notes, interpolator,
+                                             self.checkBox_debug_scripts.isChecked())
         except Exception as e:
             traceback.print_exception(e)
             self.plainTextEdit.setText(''.join(traceback.format_exception(e)))
             return
 
-        alpha = np.array(alpha) / 2 + 0.5
-        beta = np.array(beta) / 2 + 0.5
-
         if len(self.simfile.bpms.bpms) > 1:
             self.plainTextEdit.appendPlainText(f'simfile contains multiple BPM, which is not currently supported.')
 
-        bpm = self.simfile.bpms.bpms[0][1]
-        offset = self.simfile.offset
-        t = x * (4 * 60 / bpm) - offset
-
-        if self.checkBox_debug_scripts.isChecked():
-            self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('e1'))[1]}")
-            Funscript(t, a).save_to_path(self.funscript_path('e1'))
-            self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('e2'))[1]}")
-            Funscript(t, b).save_to_path(self.funscript_path('e2'))
-            self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('e3'))[1]}")
-            Funscript(t, c).save_to_path(self.funscript_path('e3'))
-            self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('e4'))[1]}")
-            Funscript(t, d).save_to_path(self.funscript_path('e4'))
-
-        self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('alpha'))[1]}")
-        Funscript(t, alpha).save_to_path(self.funscript_path('alpha'))
-        self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path('beta'))[1]}")
-        Funscript(t, beta).save_to_path(self.funscript_path('beta'))
+        for affix, funscript in funscripts.items():
+            self.plainTextEdit.appendPlainText(f"writing {os.path.split(self.funscript_path(affix))[1]}")
+            funscript.save_to_path(self.funscript_path(affix))
 
     def funscript_path(self, affix):
         base, ext = os.path.splitext(self.simfile_path)
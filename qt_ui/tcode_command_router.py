@@ -123,3 +123,13 @@ class TCodeCommandRouter:
             route.axis.add(route.remap(cmd.value), cmd.interval / 1000.0)
         except KeyError:
             pass
+
+    def route_commands(self, commands: list[tuple[str, float, int]]):
+        """
+        :param commands: (axis identifier, value, interval), see net.tcode.parse_commands()
+        """
+        mapping = self.mapping
+        for axis_identifier, value, interval in commands:
+            route = mapping.get(axis_identifier)
+            if route is not None:
+                route.axis.add(route.remap(value), interval / 1000.0)
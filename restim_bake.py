@@ -0,0 +1,128 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from qt_ui import settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='restim_bake',
+        description='bake funscripts to audio, without user interface')
+
+    parser.add_argument('media', nargs='+',
+                        help='media file or funscript. Funscripts with the same name are used.')
+    parser.add_argument('--settings', default='restim.ini',
+                        help='restim settings file, for device configuration, kit and parameters (default: restim.ini)')
+    parser.add_argument('--search-path', action='append', default=[],
+                        help='additional directory or zip to search for funscripts')
+    parser.add_argument('--output-dir',
+                        help='directory to write the audio files to (default: next to media)')
+    parser.add_argument('--extension', default='wav',
+                        help='output file type (default: wav)')
+    parser.add_argument('--samplerate', type=int, default=44100)
+    parser.add_argument('--duration', type=float,
+                        help='duration in seconds (default: length of the longest funscript)')
+    parser.add_argument('--waveform', choices=['continuous', 'pulse-based'],
+                        help='override the waveform type from the settings')
+    parser.add_argument('--min-frequency', type=float,
+                        help='override the minimum carrier frequency from the settings')
+    parser.add_argument('--max-frequency', type=float,
+                        help='override the maximum carrier frequency from the settings')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of processes to render with, at most the number of cores. '
+                             'Gains most for long files with the continuous waveform (default: 1)')
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    logger = logging.getLogger('restim.bake')
+    args = parse_args()
+
+    # must be done before anything reads the settings
+    settings.use_ini_file(args.settings)
+
+    from funscript import binary_cache
+    from funscript.collect_funscripts import collect_funscripts, split_funscript_path
+    from qt_ui.device_wizard.enums import DeviceConfiguration, DeviceType, WaveformType
+    from qt_ui.models.funscript_kit_items import FunscriptKit
+    from bake.algorithm_factory import HeadlessAlgorithmFactory, load_funscripts
+    from bake.audio import BakeTimestampMapper, bake_audio
+
+    binary_cache.configure(settings.funscript_cache_directory.get(),
+                           int(settings.funscript_cache_size_mb.get() * 1024 * 1024),
+                           settings.funscript_cache_verify_hash.get())
+
+    device = DeviceConfiguration.from_settings()
+    device.device_type = DeviceType.AUDIO_THREE_PHASE
+    if args.waveform == 'continuous':
+        device.waveform_type = WaveformType.CONTINUOUS
+    elif args.waveform == 'pulse-based':
+        device.waveform_type = WaveformType.PULSE_BASED
+    if args.min_frequency is not None:
+        device.min_frequency = args.min_frequency
+    if args.max_frequency is not None:
+        device.max_frequency = args.max_frequency
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    kit = FunscriptKit.load_from_settings()
+    search_paths = args.search_path + settings.additional_search_paths.get()
+
+    failures = 0
+    for media in args.media:
+        media_dir = os.path.dirname(os.path.abspath(media))
+        media_prefix, _, _ = split_funscript_path(media)
+        output = os.path.join(args.output_dir or media_dir, f'{media_prefix}.{args.extension}')
+
+        funscripts = load_funscripts(kit, collect_funscripts([media_dir] + search_paths, media))
+        if args.duration is not None:
+            duration = args.duration
+        elif funscripts:
+            duration = max((script.x[-1] for script in funscripts.values() if len(script.x)), default=None)
+            if duration is None:
+                logger.error(f'all funscripts for {media} are empty, and no duration given. Skipping.')
+                failures += 1
+                continue
+        else:
+            logger.error(f'no funscripts found for {media}, and no duration given. Skipping.')
+            failures += 1
+            continue
+
+        epoch = time.time() + 100
+        mapper = BakeTimestampMapper(epoch)
+        try:
+            algorithm = HeadlessAlgorithmFactory(kit, funscripts, mapper, mapper).create_algorithm(device)
+        except RuntimeError as e:
+            logger.error(str(e))
+            return 1
+
+        last_report = time.time()
+
+        def progress(seconds):
+            nonlocal last_report
+            if time.time() - last_report > 5:
+                last_report = time.time()
+                logger.info(f'{media_prefix}: {seconds:.0f}/{duration:.0f} seconds ({seconds / duration * 100:.0f}%)')
+
+        summary = bake_audio(algorithm, output, args.samplerate, duration, epoch, progress=progress,
+                             workers=args.jobs)
+        if summary is None:
+            failures += 1
+            continue
+
+        result = summary.to_dict()
+        result['media'] = media
+        result['axes'] = sorted(axis.display_name() for axis in funscripts)
+        print(json.dumps(result), flush=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from simfile.batch import convert_pack, interpolators_by_key, FileResult
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='restim_simfile',
+        description='convert all simfiles (.sm) in a song pack to funscripts, without user interface')
+
+    parser.add_argument('directory',
+                        help='song pack directory, searched recursively for .sm files')
+    parser.add_argument('--output-dir',
+                        help='directory to write the funscripts to, with the layout of the pack (default: next to the simfiles)')
+    parser.add_argument('--difficulty', action='append',
+                        help='chart difficulty to convert, for example Hard. Can be repeated (default: all)')
+    parser.add_argument('--interpolator', action='append', choices=list(interpolators_by_key),
+                        help='attack/sustain/release to convert with. Can be repeated (default: normal)')
+    parser.add_argument('--debug-scripts', action='store_true',
+                        help='also write the intensity of every electrode (e1-e4)')
+    parser.add_argument('--force', action='store_true',
+                        help='convert charts whose funscripts are newer than the simfile')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of processes to convert with (default: number of cores)')
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    logger = logging.getLogger('restim.simfile_batch')
+    args = parse_args()
+
+    def progress(result: FileResult):
+        logger.info(f'{result.path}: {result.converted} converted, {result.skipped} up to date')
+        for warning in result.warnings:
+            logger.warning(f'{result.path}: {warning}')
+        for chart, message in result.failures:
+            logger.error(f'{result.path} {chart}: {message}')
+
+    summary = convert_pack(args.directory, args.output_dir, args.difficulty, args.interpolator or ['normal'],
+                           args.debug_scripts, args.force, args.jobs, progress)
+    logger.info(f'{summary.converted} charts converted in {summary.elapsed_in_s:.1f}s '
+                f'({summary.charts_per_second():.1f} charts/s), {summary.skipped} up to date, '
+                f'{len(summary.failures)} failed')
+    print(json.dumps(summary.to_dict()), flush=True)
+    return 1 if summary.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import collections
+import logging
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from simfile.simfile import Simfile
+from simfile.conversion import notes_to_funscripts
+from simfile.interpolation import interpolators
+
+logger = logging.getLogger('restim.simfile_batch')
+
+# short names for the command line and output files: 'slow', 'normal', 'fast', 'very_fast'
+interpolators_by_key = {name.partition(' (')[0].replace(' ', '_'): interp for name, interp in interpolators}
+
+
+@dataclass
+class FileResult:
+    path: str
+    converted: int = 0
+    skipped: int = 0
+    failures: list[tuple[str, str]] = field(default_factory=list)    # (chart, error message)
+    warnings: list[str] = field(default_factory=list)
+
+
+@dataclass
+class BatchSummary:
+    files: int = 0
+    converted: int = 0
+    skipped: int = 0
+    failures: list[tuple[str, str, str]] = field(default_factory=list)    # (path, chart, error message)
+    elapsed_in_s: float = 0
+
+    def charts_per_second(self) -> float:
+        return self.converted / max(self.elapsed_in_s, 1e-9)
+
+    def add(self, result: FileResult):
+        self.files += 1
+        self.converted += result.converted
+        self.skipped += result.skipped
+        self.failures += [(result.path, chart, message) for chart, message in result.failures]
+
+    def to_dict(self) -> dict:
+        return {
+            'files': self.files,
+            'converted': self.converted,
+            'skipped': self.skipped,
+            'failed': len(self.failures),
+            'elapsed_in_s': self.elapsed_in_s,
+            'charts_per_second': self.charts_per_second(),
+        }
+
+
+def find_simfiles(directory) -> list[str]:
+    """
+    :return: paths of all .sm files below directory, sorted
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        found += [os.path.join(root, name) for name in files if name.lower().endswith('.sm')]
+    return sorted(found)
+
+
+def output_prefix(path, pack_directory, output_directory=None) -> str:
+    """
+    :return: path of the output files without suffix, next to the simfile or at the same relative
+    location in output_directory.
+    """
+    base = os.path.splitext(path)[0]
+    if output_directory is None:
+        return base
+    return os.path.join(output_directory, os.path.relpath(base, pack_directory))
+
+
+def chart_names(simfile: Simfile) -> list[str]:
+    """
+    :return: '{steps type} {difficulty}' for every chart of the simfile. Charts that share it (usually Edit
+    charts) get their description added, or their number if the descriptions do not tell them apart.
+    """
+    names = [f'{notes.steps_type} {notes.difficulty}' for notes in simfile.notes]
+    repeated = {name for name, count in collections.Counter(names).items() if count > 1}
+    descriptions = [re.sub(r'[^\w\- ]', '_', notes.description).strip() for notes in simfile.notes]
+    described = collections.Counter(zip(names, descriptions))
+    for i, (name, description) in enumerate(zip(names, descriptions)):
+        if name in repeated:
+            if description and described[name, description] == 1:
+                names[i] = f'{name} {description}'
+            else:
+                names[i] = f'{name} {i + 1}'
+    return names
+
+
+def is_up_to_date(output_paths, source_mtime) -> bool:
+    try:
+        return all(os.stat(path).st_mtime >= source_mtime for path in output_paths)
+    except OSError:
+        return False
+
+
+def convert_simfile(path, prefix, difficulties=None, interpolator_keys=('normal', ),
+                    electrode_scripts=False, force=False) -> FileResult:
+    """
+    Convert all charts of one simfile, with every interpolator. A chart is written to
+    '{prefix} [{chart name} {interpolator}].{axis}.funscript', see chart_names().
+    Charts whose output files are newer than the simfile are skipped, unless force is set.
+
+    :param difficulties: difficulties to convert, case insensitive. None for all.
+    """
+    result = FileResult(path)
+    try:
+        source_mtime = os.stat(path).st_mtime
+        simfile = Simfile.from_file(path)
+    except Exception as e:
+        result.failures.append(('', ''.join(traceback.format_exception_only(e)).strip()))
+        return result
+
+    if len(simfile.bpms.bpms) > 1:
+        result.warnings.append('simfile contains multiple BPM, which is not currently supported.')
+
+    wanted = None if difficulties is None else {difficulty.lower() for difficulty in difficulties}
+    affixes = ['e1', 'e2', 'e3', 'e4', 'alpha', 'beta'] if electrode_scripts else ['alpha', 'beta']
+    for notes, name in zip(simfile.notes, chart_names(simfile)):
+        if wanted is not None and notes.difficulty.lower() not in wanted:
+            continue
+        for key in interpolator_keys:
+            chart = f'{name} {key}'
+            output_paths = {affix: f'{prefix} [{chart}].{affix}.funscript' for affix in affixes}
+            if not force and is_up_to_date(output_paths.values(), source_mtime):
+                result.skipped += 1
+                continue
+
+            try:
+                funscripts = notes_to_funscripts(simfile, notes, interpolators_by_key[key], electrode_scripts)
+                os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+                for affix, funscript in funscripts.items():
+                    funscript.save_to_path(output_paths[affix])
+            except Exception as e:
+                result.failures.append((chart, ''.join(traceback.format_exception_only(e)).strip()))
+                continue
+            result.converted += 1
+    return result
+
+
+def convert_pack(directory, output_directory=None, difficulties=None, interpolator_keys=('normal', ),
+                 electrode_scripts=False, force=False, workers=1, progress=None) -> BatchSummary:
+    """
+    Convert all simfiles in a song pack, see convert_simfile(). With more than one worker,
+    the simfiles are parsed and converted in a process pool.
+
+    :param progress: optional callback, called with the FileResult of every simfile
+    """
+    for key in interpolator_keys:
+        if key not in interpolators_by_key:
+            raise ValueError(f'unknown interpolator {key!r}, expected one of {", ".join(interpolators_by_key)}')
+
+    start_time = time.perf_counter()
+    summary = BatchSummary()
+    jobs = [(path, output_prefix(path, directory, output_directory), difficulties, tuple(interpolator_keys),
+             electrode_scripts, force)
+            for path in find_simfiles(directory)]
+
+    def finished(result: FileResult):
+        summary.add(result)
+        if progress:
+            progress(result)
+
+    if workers > 1 and len(jobs) > 1:
+        logger.info(f'converting {len(jobs)} simfiles in {workers} processes')
+        with ProcessPoolExecutor(workers) as executor:
+            for future in as_completed([executor.submit(convert_simfile, *job) for job in jobs]):
+                finished(future.result())
+    else:
+        for job in jobs:
+            finished(convert_simfile(*job))
+
+    summary.elapsed_in_s = time.perf_counter() - start_time
+    return summary
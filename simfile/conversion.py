@@ -1,5 +1,7 @@
 from simfile.simfile import Notes, BPM, Simfile
 from simfile.interpolation import Interpolator
+from stim_math import transforms_4
+from funscript.funscript import Funscript
 
 
 import numpy as np
@@ -39,57 +41,114 @@ class Note:
             return 999
 
     def to_xy(self, x, interp: Interpolator):
-        y = []
-        for t in x:
-            y.append(max(
-                np.nan_to_num(interp(-self.time_until_next_press(t))),
-                np.nan_to_num(interp(self.time_since_last_press(t))),
-            ))
-        return y
+        """
+        Intensity at all sample times x: the envelope of the nearest press before and after each sample.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        presses = np.asarray(self.presses, dtype=np.float64)
+        if len(presses) == 0:
+            until_next = since_last = np.full(len(x), 999.0)
+        else:
+            # one search: the last press at or before x, the next press is the one after it, or x itself
+            last = np.searchsorted(presses, x, 'right') - 1
+            last_press = presses[np.maximum(last, 0)]
+            next_press = presses[np.minimum(last + 1, len(presses) - 1)]
+            since_last = np.where(last >= 0, x - last_press, 999)
+            until_next = np.where((last >= 0) & (last_press == x), 0.0,
+                                  np.where(last + 1 < len(presses), next_press - x, 999))
+        return np.maximum(
+            np.nan_to_num(interp(-until_next)),
+            np.nan_to_num(interp(since_last)),
+        )
+
+
+def parse_note_grid(notes: str) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    :return: time in measures of every beat, array (beat, lane) with the note character codes,
+    number of measures
+    """
+    measures = [measure.strip().split('\n') for measure in notes.split(',')]
+    beats = [beat for measure in measures for beat in measure]
+    for beat in beats:
+        if len(beat) != 4:
+            raise ValueError(f'expected 4 notes per beat, got {beat!r}')
+
+    lengths = np.array([len(measure) for measure in measures])
+    measure_no = np.repeat(np.arange(len(measures)), lengths)
+    beat_no = np.arange(len(beats)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    t = measure_no + beat_no / lengths[measure_no]
+    grid = np.frombuffer(''.join(beats).encode('utf-32-le'), dtype='<u4').reshape(-1, 4)
+    return t, grid, len(measures)
 
 
 def notes_to_intensity(notes: Notes, interp: Interpolator):
-    measures = notes.notes.split(',')
-    measures = [measure.strip().split('\n') for measure in measures]
-
-    a_note = Note()
-    b_note = Note()
-    c_note = Note()
-    d_note = Note()
-
-    for (measure_no, measure) in enumerate(measures):
-        for beat_no, beat in enumerate(measure):
-            t = measure_no + beat_no / len(measure)
-            a, b, c, d = beat
-            a_note.add_note(t, a)
-            b_note.add_note(t, b)
-            c_note.add_note(t, c)
-            d_note.add_note(t, d)
-
-    end_t = len(measures) + 1
+    t, grid, measure_count = parse_note_grid(notes.notes)
+
+    lanes = []
+    for column in grid.T:
+        note = Note()
+        note.presses = t[(column == ord('1')) | (column == ord('2'))]
+        note.releases = t[(column == ord('1')) | (column == ord('3'))]
+        lanes.append(note)
+
+    end_t = measure_count + 1
     x = np.arange(0, end_t, 1.0/64)
-    a = a_note.to_xy(x, interp)
-    b = b_note.to_xy(x, interp)
-    c = c_note.to_xy(x, interp)
-    d = d_note.to_xy(x, interp)
+    a, b, c, d = [note.to_xy(x, interp) for note in lanes]
 
     return x, (a, b, c, d)
 
 
+def project_electrode_intensity(intensities, vectors) -> np.ndarray:
+    """
+    Sum of the electrode directions weighted by their intensity, scaled down where the length exceeds 1.
+
+    :param intensities: one array per electrode
+    :param vectors: direction of every electrode
+    :return: array (axis, sample)
+    """
+    p = sum(np.multiply.outer(vec, np.asarray(intensity, dtype=np.float64))
+            for intensity, vec in zip(intensities, vectors))
+    norm = np.sqrt(np.sum(p ** 2, axis=0))
+    return p / np.maximum(norm, 1)
+
+
 def electrode_intensity_to_position_3p(a, b, c):
     a_vec = np.array([1, 0])
     b_vec = np.array([-0.5, np.sqrt(3) / 2])
     c_vec = np.array([-0.5, -np.sqrt(3) / 2])
 
-    alpha = []
-    beta = []
-    for i in range(len(a)):
-        p = a_vec * a[i] + b_vec * b[i] + c_vec * c[i]
-        norm = np.linalg.norm(p)
-        if norm > 1:
-            p = p / norm
-
-        alpha.append(p[0])
-        beta.append(p[1])
-
-    return alpha, beta
\ No newline at end of file
+    alpha, beta = project_electrode_intensity((a, b, c), (a_vec, b_vec, c_vec))
+    return alpha, beta
+
+
+def electrode_intensity_to_position_4p(a, b, c, d):
+    """
+    Four electrodes at the corners of the tetrahedron of stim_math.transforms_4.
+    :return: (alpha, beta, gamma)
+    """
+    vectors = (transforms_4.a_vec, transforms_4.b_vec, transforms_4.c_vec, transforms_4.d_vec)
+    alpha, beta, gamma = project_electrode_intensity((a, b, c, d), vectors)
+    return alpha, beta, gamma
+
+
+def notes_to_funscripts(simfile: Simfile, notes: Notes, interp: Interpolator,
+                        electrode_scripts=False) -> dict[str, Funscript]:
+    """
+    Convert one chart of a simfile to alpha and beta funscripts, and optionally the intensity
+    of the four electrodes (e1-e4). Only the first BPM of the simfile is used.
+
+    :return: funscripts by suffix
+    """
+    x, (a, b, c, d) = notes_to_intensity(notes, interp)
+    alpha, beta = electrode_intensity_to_position_3p(a, b, c)
+
+    bpm = simfile.bpms.bpms[0][1]
+    t = x * (4 * 60 / bpm) - simfile.offset
+
+    funscripts = {}
+    if electrode_scripts:
+        for suffix, intensity in zip(('e1', 'e2', 'e3', 'e4'), (a, b, c, d)):
+            funscripts[suffix] = Funscript(t, intensity)
+    funscripts['alpha'] = Funscript(t, alpha / 2 + 0.5)
+    funscripts['beta'] = Funscript(t, beta / 2 + 0.5)
+    return funscripts
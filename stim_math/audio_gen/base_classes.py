@@ -25,6 +25,14 @@ class AudioGenerationAlgorithm(ABC):
         """
         pass
 
+    def skip_audio(self, samplerate, steady_clock: np.ndarray, system_time_estimate: np.ndarray):
+        """
+        Advance the internal state (carrier phase, pulse train, ...) exactly like generate_audio() would,
+        without the cost of rendering the audio where possible.
+        Used to seed the segments of a parallel bake.
+        """
+        self.generate_audio(samplerate, steady_clock, system_time_estimate)
+
 
 class AudioModifyAlgorithm(ABC):
     @abstractmethod
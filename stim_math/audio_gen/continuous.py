@@ -4,9 +4,9 @@ import numpy as np
 
 from stim_math import threephase
 from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
-from stim_math.audio_gen.various import VibrationAlgorithm, ThreePhasePosition
+from stim_math.audio_gen.various import VibrationAlgorithm, ThreePhasePosition, ThreePhaseCalibration
 from stim_math.axis import AbstractMediaSync
-from stim_math.sine_generator import AngleGenerator
+from stim_math.sine_generator import Oscillator
 
 from stim_math.audio_gen.params import *
 
@@ -23,13 +23,21 @@ class ThreePhaseAlgorithm(AudioGenerationAlgorithm):
         self.params = params
         self.vibration = VibrationAlgorithm(params.vibration_1, params.vibration_2)
         self.position = ThreePhasePosition(params.position, params.transform)
+        self.calibration = ThreePhaseCalibration(params.calibrate)
         self.safety_limits = safety_limits
 
-        self.carrier_angle = AngleGenerator()
+        self.carrier = Oscillator()
+        self._carrier_buffer = np.empty((2, 0), dtype=np.float32)
 
     def channel_count(self) -> int:
         return 2
 
+    def carrier_frequency(self, system_time_estimate: np.ndarray):
+        frequency = self.params.carrier_frequency.interpolate(system_time_estimate[0])
+        return np.clip(frequency,
+                       self.safety_limits.minimum_carrier_frequency,
+                       self.safety_limits.maximum_carrier_frequency)
+
     def generate_audio(self, samplerate, steady_clock: np.ndarray, system_time_estimate: np.ndarray):
         volume = \
             np.clip(self.params.volume.master.last_value(), 0, 1) * \
@@ -40,30 +48,31 @@ class ThreePhaseAlgorithm(AudioGenerationAlgorithm):
         if not self.media.is_playing():
             volume *= 0
 
-        frequency = self.params.carrier_frequency.interpolate(system_time_estimate[0])
-        frequency = np.clip(frequency,
-                            self.safety_limits.minimum_carrier_frequency,
-                            self.safety_limits.maximum_carrier_frequency)
-        theta_carrier = self.carrier_angle.generate(len(steady_clock), frequency, samplerate)
+        n = len(steady_clock)
+        if self._carrier_buffer.shape[1] < n:
+            self._carrier_buffer = np.empty((2, n), dtype=np.float32)
+        carrier_x, carrier_y = self._carrier_buffer[:, :n]
+        self.carrier.generate_into(n, self.carrier_frequency(system_time_estimate), samplerate, carrier_x, carrier_y)
 
         alpha, beta = self.position.get_position(system_time_estimate)
 
         # center scaling
-        center_calib = threephase.ThreePhaseCenterCalibration(self.params.calibrate.center.last_value())
-        volume *= center_calib.get_scale(alpha, beta)
+        volume *= self.calibration.center_scale(alpha, beta)
 
         # exponent transform
         # transform = ThreePhaseExponentAdjustment(self.params.threephase_exponent.last_value())
         # volume *= transform.get_scale(alpha, beta)
 
-        # hardware calibration
-        hw = threephase.ThreePhaseHardwareCalibration(self.params.calibrate.neutral.last_value(),
-                                                      self.params.calibrate.right.last_value())
-
+        # hardware calibration is applied by the output matrix
         tp = threephase.ThreePhaseSignalGenerator()
-        L, R = tp.generate(theta_carrier, alpha, beta)
-        L, R = hw.apply_transform(L, R)
+        L, R = tp.generate_from_carrier(carrier_x, carrier_y, alpha, beta,
+                                        output_matrix=self.calibration.output_matrix())
 
         L *= volume
         R *= volume
         return L, R
+
+    def skip_audio(self, samplerate, steady_clock: np.ndarray, system_time_estimate: np.ndarray):
+        # only the carrier and vibration phase carry over between calls
+        self.vibration.skip(system_time_estimate[0], samplerate, len(steady_clock))
+        self.carrier.skip(len(steady_clock), self.carrier_frequency(system_time_estimate), samplerate)
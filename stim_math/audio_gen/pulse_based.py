@@ -6,10 +6,19 @@ import stim_math.pulse
 import stim_math.threephase
 from stim_math.audio_gen.base_classes import AudioGenerationAlgorithm
 from stim_math import threephase
-from stim_math.audio_gen.various import ThreePhasePosition, VibrationAlgorithm
+from stim_math.audio_gen.various import ThreePhasePosition, VibrationAlgorithm, ThreePhaseCalibration
 from stim_math.audio_gen.params import ThreephasePulsebasedAlgorithmParams, ThreephaseCalibrationParams, SafetyParams, ThreephaseABTestAlgorithmParams
 from stim_math.axis import AbstractMediaSync
+from stim_math.axis_group import AxisGroup
 from stim_math import limits
+from stim_math.sample_queue import SampleQueue
+
+
+def clip(value, lower, upper):
+    """
+    np.clip() for a single value, without the microseconds of overhead per call. NaN stays NaN.
+    """
+    return min(max(value, lower), upper)
 
 
 @dataclass
@@ -36,9 +45,10 @@ class PulseInfo:
 class ThreePhasePulseBasedAlgorithmBase(AudioGenerationAlgorithm):
     def __init__(self, media: AbstractMediaSync, calibration: ThreephaseCalibrationParams):
         super(ThreePhasePulseBasedAlgorithmBase, self).__init__()
-        self._sample_buffer = np.zeros((2, 0), dtype=np.float32)
+        self._sample_buffer = SampleQueue(2)
         self.media = media
-        self.calibration = calibration
+        self.calibration = ThreePhaseCalibration(calibration)
+        self.pulse_templates = stim_math.pulse.PulseTemplateCache()
 
     def channel_count(self) -> int:
         return 2
@@ -46,56 +56,85 @@ class ThreePhasePulseBasedAlgorithmBase(AudioGenerationAlgorithm):
     def next_pulse_data(self, samplerate, at_time: float, at_command_time: float) -> PulseInfo:
         raise NotImplementedError()
 
+    def plan_next_pulse(self, samplerate, at_time: float, at_command_time: float) -> PulseInfo:
+        """
+        Like next_pulse_data(), for skip_audio(): only the length of the pulse and the state that carries over
+        to the next pulse have to be right. Pass the result to complete_pulse() or skip_pulse().
+        """
+        return self.next_pulse_data(samplerate, at_time, at_command_time)
+
+    def complete_pulse(self, samplerate, at_command_time: float, pulse: PulseInfo) -> PulseInfo:
+        """
+        Fill in the rest of a pulse from plan_next_pulse(), so it can be rendered.
+        """
+        return pulse
+
+    def skip_pulse(self, samplerate, at_command_time: float, pulse: PulseInfo):
+        """
+        Advance the state that complete_pulse() would advance, for a pulse from plan_next_pulse()
+        that is not rendered.
+        """
+        pass
+
     def generate_audio(self, samplerate, steady_clock: np.ndarray, system_time_estimate: np.ndarray):
-        while self._sample_buffer.shape[1] < len(steady_clock):
-            i = self._sample_buffer.shape[1]
+        while len(self._sample_buffer) < len(steady_clock):
+            i = len(self._sample_buffer)
             next_pulse = self.next_pulse_data(samplerate, steady_clock[i], system_time_estimate[i])
             self.add_next_pulse_to_audio_buffer(samplerate, next_pulse)
 
-        n = len(steady_clock)
-        L, R = self._sample_buffer[:, :n]
-        self._sample_buffer = self._sample_buffer[:, n:]
+        # views into the sample buffer, valid until the next call to generate_audio()
+        L, R = self._sample_buffer.pop(len(steady_clock))
         return L, R
 
+    def skip_audio(self, samplerate, steady_clock: np.ndarray, system_time_estimate: np.ndarray):
+        # plan the pulses like generate_audio(), but only render the last pulse if
+        # it does not fit entirely, so the sample buffer holds the same samples afterwards.
+        n = len(steady_clock)
+        i = min(len(self._sample_buffer), n)
+        self._sample_buffer.pop(i)
+        while i < n:
+            next_pulse = self.plan_next_pulse(samplerate, steady_clock[i], system_time_estimate[i])
+            length = next_pulse.total_length_in_samples(samplerate)
+            if i + length > n:
+                next_pulse = self.complete_pulse(samplerate, system_time_estimate[i], next_pulse)
+                self.add_next_pulse_to_audio_buffer(samplerate, next_pulse)
+                self._sample_buffer.pop(n - i)
+            else:
+                self.skip_pulse(samplerate, system_time_estimate[i], next_pulse)
+            i += length
+
     def add_next_pulse_to_audio_buffer(self, samplerate, pulse: PulseInfo):
-        pulse_envelope = stim_math.pulse.create_pulse_with_ramp_time(
-            pulse.pulse_length_in_samples(samplerate),
-            pulse.pulse_width_in_carrier_cycles,
-            pulse.rise_time_in_carrier_cycles)
+        # render pulse and pause directly into the sample buffer
+        n_pulse = pulse.pulse_length_in_samples(samplerate)
+        region = self._sample_buffer.append(n_pulse + pulse.pause_length_in_samples(samplerate))
+        region[:, n_pulse:] = 0
 
         if not self.media.is_playing():
-            # TODO: make more efficient
-            pulse_envelope *= 0
+            region[:, :n_pulse] = 0
+            return
 
-        pause = stim_math.pulse.create_pause(pulse.pause_length_in_samples(samplerate))
-
-        theta = pulse.start_angle + np.linspace(0, 2 * np.pi * pulse.pulse_width_in_carrier_cycles,
-                                                len(pulse_envelope)) * pulse.polarity
-        L, R = threephase.ThreePhaseSignalGenerator.generate(
-            theta, np.full_like(theta, pulse.position[0]), np.full_like(theta, pulse.position[1]))
+        carrier_x, carrier_y = self.pulse_templates.get(
+            samplerate,
+            n_pulse,
+            pulse.pulse_width_in_carrier_cycles,
+            pulse.rise_time_in_carrier_cycles,
+            pulse.polarity,
+            pulse.start_angle)
 
-        # L[:] = 1
-        # R[:] = 1
-        # pulse_envelope[:] = 1
+        # position is constant for the duration of the pulse, so only the 2x2 matrix
+        # from carrier to calibrated (L, R) needs to be computed.
+        matrix = threephase.ThreePhaseSignalGenerator.channel_matrix(
+            pulse.position[0], pulse.position[1], self.calibration.output_matrix())
 
         # center scaling
-        center_calib = stim_math.threephase.ThreePhaseCenterCalibration(self.calibration.center.last_value())
-        pulse_envelope *= center_calib.get_scale(pulse.position[0], pulse.position[1])
-
-        # hardware calibration
-        hw = threephase.ThreePhaseHardwareCalibration(self.calibration.neutral.last_value(),
-                                                      self.calibration.right.last_value())
-        L, R = hw.apply_transform(L, R)
+        matrix *= self.calibration.center_scale(pulse.position[0], pulse.position[1]) * pulse.volume
 
-        pulse_envelope *= pulse.volume
-        L *= pulse_envelope
-        R *= pulse_envelope
-
-        new_data = np.vstack((
-            np.hstack((L, pause)),
-            np.hstack((R, pause)),
-        ))
-        self._sample_buffer = np.hstack((self._sample_buffer, new_data))
+        L = region[0, :n_pulse]
+        R = region[1, :n_pulse]
+        np.multiply(carrier_x, matrix[0, 0], out=L)
+        L += carrier_y * matrix[0, 1]
+        np.multiply(carrier_x, matrix[1, 0], out=R)
+        R += carrier_y * matrix[1, 1]
 
 
 class DefaultThreePhasePulseBasedAlgorithm(ThreePhasePulseBasedAlgorithmBase):
@@ -109,49 +148,85 @@ class DefaultThreePhasePulseBasedAlgorithm(ThreePhasePulseBasedAlgorithmBase):
         self.last_pulse_polarity = 1
         self.last_pulse_start_angle = 0
 
+        # every parameter that is interpolated per pulse
+        self.axes = AxisGroup({
+            'volume_api': params.volume.api,
+            'carrier_frequency': params.carrier_frequency,
+            'pulse_width': params.pulse_width,
+            'pulse_frequency': params.pulse_frequency,
+            'pulse_rise_time': params.pulse_rise_time,
+            'pulse_interval_random': params.pulse_interval_random,
+            'alpha': params.position.alpha,
+            'beta': params.position.beta,
+        })
+        # the parameters that decide the length of a pulse, for skip_audio()
+        self.timing_axes = AxisGroup({
+            'carrier_frequency': params.carrier_frequency,
+            'pulse_width': params.pulse_width,
+            'pulse_frequency': params.pulse_frequency,
+            'pulse_rise_time': params.pulse_rise_time,
+            'pulse_interval_random': params.pulse_interval_random,
+        })
+
     def next_pulse_data(self, samplerate, at_time: float, system_time_estimate: float) -> PulseInfo:
-        self.seq += 1
+        values = self.axes.evaluate_at(system_time_estimate)
+        pulse = self.pulse_timing(values)
+        return self.pulse_output(samplerate, system_time_estimate, values, pulse)
 
-        volume = \
-            np.clip(self.params.volume.master.last_value(), 0, 1) * \
-            np.clip(self.params.volume.api.interpolate(system_time_estimate), 0, 1) * \
-            np.clip(self.params.volume.inactivity.last_value(), 0, 1) * \
-            np.clip(self.params.volume.external.last_value(), 0, 1)
+    def plan_next_pulse(self, samplerate, at_time: float, system_time_estimate: float) -> PulseInfo:
+        return self.pulse_timing(self.timing_axes.evaluate_at(system_time_estimate))
 
-        pulse_carrier_freq = self.params.carrier_frequency.interpolate(system_time_estimate)
-        pulse_carrier_freq = np.clip(pulse_carrier_freq,
-                                     self.safety_limits.minimum_carrier_frequency,
-                                     self.safety_limits.maximum_carrier_frequency)
-        pulse_width = self.params.pulse_width.interpolate(system_time_estimate)
-        pulse_width = np.clip(pulse_width, limits.PulseWidth.min, limits.PulseWidth.max)
-        pulse_freq = self.params.pulse_frequency.interpolate(system_time_estimate)
-        pulse_freq = np.clip(pulse_freq, limits.PulseFrequency.min, limits.PulseFrequency.max)
-        pulse_rise_time = self.params.pulse_rise_time.interpolate(system_time_estimate)
-        pulse_rise_time = np.clip(pulse_rise_time, limits.PulseRiseTime.min, limits.PulseRiseTime.max)
+    def complete_pulse(self, samplerate, system_time_estimate: float, pulse: PulseInfo) -> PulseInfo:
+        return self.pulse_output(samplerate, system_time_estimate, self.axes.evaluate_at(system_time_estimate), pulse)
 
-        pause_duration = np.clip(1 / pulse_freq - pulse_width / pulse_carrier_freq, 0, None)
+    def skip_pulse(self, samplerate, system_time_estimate: float, pulse: PulseInfo):
+        self.vibration.skip(system_time_estimate, samplerate, pulse.total_length_in_samples(samplerate))
 
-        random = self.params.pulse_interval_random.interpolate(system_time_estimate)
-        pause_duration = pause_duration * np.random.uniform(1 - random, 1 + random)
+    def pulse_timing(self, values) -> PulseInfo:
+        """
+        :return: pulse without position and volume, advances polarity, phase and the random generator.
+        """
+        self.seq += 1
+        pulse_carrier_freq = clip(values.carrier_frequency,
+                                  self.safety_limits.minimum_carrier_frequency,
+                                  self.safety_limits.maximum_carrier_frequency)
+        pulse_width = clip(values.pulse_width, limits.PulseWidth.min, limits.PulseWidth.max)
+        pulse_freq = clip(values.pulse_frequency, limits.PulseFrequency.min, limits.PulseFrequency.max)
+        pulse_rise_time = clip(values.pulse_rise_time, limits.PulseRiseTime.min, limits.PulseRiseTime.max)
 
-        alpha, beta = self.position_params.get_position(system_time_estimate)
+        pause_duration = max(1 / pulse_freq - pulse_width / pulse_carrier_freq, 0)
 
-        # exponent transform. TODO: decide whether to keep
-        # transform = ThreePhaseExponentAdjustment(self.params.threephase_exponent.last_value())
-        # volume *= transform.get_scale(alpha, beta)
+        random = values.pulse_interval_random
+        pause_duration = pause_duration * np.random.uniform(1 - random, 1 + random)
 
-        pulse = PulseInfo(
+        return PulseInfo(
             self.polarity(),
             self.phase_offset(),
             pulse_carrier_freq,
             pulse_width,
             pulse_rise_time,
-            (alpha, beta),
+            None,
             pause_duration,
-            volume,
+            None,
         )
-        pulse = self.apply_vibration(system_time_estimate, samplerate, pulse)
-        return pulse
+
+    def pulse_output(self, samplerate, system_time_estimate: float, values, pulse: PulseInfo) -> PulseInfo:
+        """
+        Fill in position and volume of a pulse from pulse_timing(), advances the vibration.
+        """
+        pulse.volume = \
+            clip(self.params.volume.master.last_value(), 0, 1) * \
+            clip(values.volume_api, 0, 1) * \
+            clip(self.params.volume.inactivity.last_value(), 0, 1) * \
+            clip(self.params.volume.external.last_value(), 0, 1)
+
+        pulse.position = self.position_params.transform_position(values.alpha, values.beta)
+
+        # exponent transform. TODO: decide whether to keep
+        # transform = ThreePhaseExponentAdjustment(self.params.threephase_exponent.last_value())
+        # volume *= transform.get_scale(alpha, beta)
+
+        return self.apply_vibration(system_time_estimate, samplerate, pulse)
 
     def apply_vibration(self, at_command_time, samplerate, pulse: PulseInfo) -> PulseInfo:
         pulse.volume *= self.vibration.generate_vibration_float(at_command_time, samplerate, pulse.total_length_in_samples(samplerate))
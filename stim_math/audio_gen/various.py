@@ -1,12 +1,14 @@
 import numpy as np
 
 from stim_math import limits, amplitude_modulation, trig
+from stim_math.threephase import ThreePhaseHardwareCalibration, ThreePhaseCenterCalibration, ab_to_channel_matrix
 from stim_math.sine_generator import AngleGeneratorWithVaryingIPI
 from stim_math.threephase_coordinate_transform import ThreePhaseCoordinateTransform, \
     ThreePhaseCoordinateTransformMapToEdge
 
+from stim_math.axis import parameter_epoch
 from stim_math.audio_gen.params import VibrationParams, ThreephasePositionParams, ThreephasePositionTransformParams, \
-    FourphasePositionParams
+    FourphasePositionParams, ThreephaseCalibrationParams
 
 
 class VibrationAlgorithm:
@@ -40,6 +42,19 @@ class VibrationAlgorithm:
         except TypeError:
             return volume
 
+    def skip(self, command_timeline, samplerate, n_samples: int):
+        """
+        Advance the vibration phase like generate_vibration_signal(), without computing the signal.
+        """
+        for params, angle_generator in ((self.vib_1, self.vibration_1_angle), (self.vib_2, self.vibration_2_angle)):
+            modulation_frequency = params.frequency.interpolate(command_timeline)
+            if not params.enabled.last_value() or modulation_frequency == 0:
+                continue
+            modulation_frequency = np.clip(modulation_frequency,
+                                           limits.ModulationFrequency.min,
+                                           limits.ModulationFrequency.max)
+            angle_generator.skip(n_samples, modulation_frequency, samplerate)
+
     def _calculate_modulation(self, command_timeline, samplerate, n_samples, params: VibrationParams, angle_generator):
         is_enabled = params.enabled.last_value()
         modulation_frequency = params.frequency.interpolate(command_timeline)
@@ -64,15 +79,119 @@ class VibrationAlgorithm:
         return modulation.get_modulation_signal()
 
 
+class ThreePhaseCalibration:
+    """
+    Hardware and center calibration. The matrices are only rebuilt when the calibration parameters change,
+    so on the audio thread applying the calibration is just a few multiply-adds.
+    The parameters are not even read while no axis changed, see ParameterEpoch.
+    """
+    def __init__(self, calibrate: ThreephaseCalibrationParams):
+        self.calibrate = calibrate
+
+        self._hardware_epoch = None
+        self._hardware_key = None
+        self._hardware_matrix = None
+        self._output_matrix = None
+
+        self._center_epoch = None
+        self._center_key = None
+        self._center_calibration = None
+
+    def _update_hardware(self):
+        epoch = parameter_epoch.value()
+        if epoch == self._hardware_epoch:
+            return
+        self._hardware_epoch = epoch
+        key = (self.calibrate.neutral.last_value(), self.calibrate.right.last_value())
+        if key != self._hardware_key:
+            self._hardware_matrix = ThreePhaseHardwareCalibration(*key).corrective_matrix()
+            self._output_matrix = self._hardware_matrix @ ab_to_channel_matrix
+            self._hardware_key = key
+
+    def hardware_matrix(self):
+        """
+        :return: 2x2 matrix that applies the hardware calibration to (L, R)
+        """
+        self._update_hardware()
+        return self._hardware_matrix
+
+    def output_matrix(self):
+        """
+        :return: 2x2 matrix from (alpha, beta) potentials to calibrated (L, R), see ThreePhaseSignalGenerator.generate()
+        """
+        self._update_hardware()
+        return self._output_matrix
+
+    def apply_hardware_calibration(self, L, R):
+        T = self.hardware_matrix()
+        return T[0, 0] * L + T[0, 1] * R, T[1, 0] * L + T[1, 1] * R
+
+    def center_scale(self, alpha, beta):
+        epoch = parameter_epoch.value()
+        if epoch != self._center_epoch:
+            self._center_epoch = epoch
+            key = self.calibrate.center.last_value()
+            if key != self._center_key:
+                self._center_calibration = ThreePhaseCenterCalibration(key)
+                self._center_key = key
+        return self._center_calibration.get_scale(alpha, beta)
+
+
 class ThreePhasePosition:
     def __init__(self, position: ThreephasePositionParams, transform: ThreephasePositionTransformParams):
         self.position_params = position
         self.transform_params = transform
 
+        # transforms are only rebuilt when the parameters change
+        self._transform_epoch = None
+        self._transform_key = None
+        self._transform = None
+        self._map_to_edge_epoch = None
+        self._map_to_edge_key = None
+        self._map_to_edge = None
+
+    def coordinate_transform(self) -> ThreePhaseCoordinateTransform:
+        epoch = parameter_epoch.value()
+        if epoch == self._transform_epoch:
+            return self._transform
+        self._transform_epoch = epoch
+        key = (
+            self.transform_params.transform_rotation_degrees.last_value(),
+            self.transform_params.transform_mirror.last_value(),
+            self.transform_params.transform_top_limit.last_value(),
+            self.transform_params.transform_bottom_limit.last_value(),
+            self.transform_params.transform_left_limit.last_value(),
+            self.transform_params.transform_right_limit.last_value(),
+        )
+        if key != self._transform_key:
+            self._transform = ThreePhaseCoordinateTransform(*key)
+            self._transform_key = key
+        return self._transform
+
+    def map_to_edge_transform(self) -> ThreePhaseCoordinateTransformMapToEdge:
+        epoch = parameter_epoch.value()
+        if epoch == self._map_to_edge_epoch:
+            return self._map_to_edge
+        self._map_to_edge_epoch = epoch
+        key = (
+            self.transform_params.map_to_edge_start.last_value(),
+            self.transform_params.map_to_edge_length.last_value(),
+            self.transform_params.map_to_edge_invert.last_value(),
+        )
+        if key != self._map_to_edge_key:
+            self._map_to_edge = ThreePhaseCoordinateTransformMapToEdge(*key)
+            self._map_to_edge_key = key
+        return self._map_to_edge
+
     def get_position(self, command_timeline):
         alpha = self.position_params.alpha.interpolate(command_timeline)
         beta = self.position_params.beta.interpolate(command_timeline)
+        return self.transform_position(alpha, beta)
 
+    def transform_position(self, alpha, beta):
+        """
+        Apply normalization and the position transforms to interpolated (alpha, beta).
+        """
         # normalize (alpha, beta) to be within the unit circle.
         norm = np.clip(trig.norm(alpha, beta), 1.0, None)
         alpha /= norm
@@ -86,24 +205,13 @@ class ThreePhasePosition:
         # beta = z.imag
 
         if self.transform_params.transform_enabled.last_value():
-            transform = ThreePhaseCoordinateTransform(
-                self.transform_params.transform_rotation_degrees.last_value(),
-                self.transform_params.transform_mirror.last_value(),
-                self.transform_params.transform_top_limit.last_value(),
-                self.transform_params.transform_bottom_limit.last_value(),
-                self.transform_params.transform_left_limit.last_value(),
-                self.transform_params.transform_right_limit.last_value(),
-            )
+            transform = self.coordinate_transform()
             alpha, beta = transform.transform(alpha, beta)
             norm = np.clip(trig.norm(alpha, beta), 1.0, None)
             alpha /= norm
             beta /= norm
         if self.transform_params.map_to_edge_enabled.last_value():
-            transform = ThreePhaseCoordinateTransformMapToEdge(
-                self.transform_params.map_to_edge_start.last_value(),
-                self.transform_params.map_to_edge_length.last_value(),
-                self.transform_params.map_to_edge_invert.last_value(),
-            )
+            transform = self.map_to_edge_transform()
             alpha, beta = transform.transform(alpha, beta)
             norm = np.clip(trig.norm(alpha, beta), 1.0, None)
             alpha /= norm
@@ -120,7 +228,9 @@ class FourPhasePosition:
         alpha = self.position_params.alpha.interpolate(command_timeline)
         beta = self.position_params.beta.interpolate(command_timeline)
         gamma = self.position_params.gamma.interpolate(command_timeline)
+        return self.normalize_position(alpha, beta, gamma)
 
+    def normalize_position(self, alpha, beta, gamma):
         # normalize (alpha, beta) to be within the unit circle.
         norm = np.clip(np.linalg.norm((alpha, beta, gamma), axis=0), 1.0, None)
         alpha /= norm
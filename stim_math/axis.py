@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
+import os
+import threading
 import time
+from typing import NamedTuple
 import numpy as np
 import collections.abc
 
@@ -40,11 +43,53 @@ class DummyTimestampMapper(AbstractTimestampMapper):
         return timestamp
 
 
+class ParameterEpoch:
+    """
+    Counts changes to all axes. A cache of something derived from axis values can store the epoch
+    and skip the recomputation while it is unchanged. Read the epoch before the values it depends on,
+    so a change that happens in between is picked up on the next call.
+
+    The counter starts at an offset unique to the process, so an epoch that is stored in a cache
+    that is pickled to another process (parallel bake) never matches there.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = os.getpid() << 40
+
+    def value(self) -> int:
+        return self._value
+
+    def advance(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+parameter_epoch = ParameterEpoch()
+
+
+class TimelineSnapshot(NamedTuple):
+    """
+    Immutable state of a timeline, read-only views that are never modified afterwards.
+    version increases with every change of the timeline.
+    """
+    x: np.ndarray
+    y: np.ndarray
+    version: int
+
+
+def read_only(a: np.ndarray) -> np.ndarray:
+    view = a.view()
+    view.flags.writeable = False
+    return view
+
+
 # general class for series of x y values.
 class Timeline:
     def __init__(self, x, y):
         self._x = x
         self._y = y
+        self._snapshot = TimelineSnapshot(read_only(x), read_only(y), 0)
 
     def x(self):
         return self._x
@@ -52,54 +97,141 @@ class Timeline:
     def y(self):
         return self._y
 
+    def xy(self):
+        return self._x, self._y
+
+    def snapshot(self) -> TimelineSnapshot:
+        return self._snapshot
+
 
 # series of X, Y values, intended for realtime updates.
 # Old data is regularly removed
 class ShortMemoryTimeline:
-    def __init__(self, init_value, dtype=None, trim_min_size=10, trim_min_age=5, cleanup_interval=100):
-        self.data = np.array([[0, init_value]], dtype=dtype)
+    """
+    The points are kept in preallocated x and y arrays, the live points are the region [start, end).
+    Appending only writes behind the live region, trimming old points only advances start.
+    Replacing live points (future points that are cut off) copies the live points into new arrays,
+    as does appending to full arrays (twice as large if more than half is in use), so appends are amortized O(1).
+
+    Readers only see published snapshots: read-only views of the live region, published with a single
+    reference assignment after the points are written. Published points are never modified,
+    so a snapshot is consistent even if another thread calls add() meanwhile.
+    Writers are serialized by a lock, the ui thread and pattern timers may both write.
+    """
+    def __init__(self, init_value, dtype=None, trim_min_size=10, trim_min_age=5, cleanup_interval=100,
+                 capacity=64):
+        dtype = dtype or np.float64
+        x = np.zeros(capacity, dtype=dtype)
+        y = np.zeros(capacity, dtype=dtype)
+        y[0] = init_value
+        self._lock = threading.Lock()
+        self._state = (x, y, 0, 1)      # writer side
+        self._snapshot = None           # reader side
+        self._publish()
         self.trim_min_size = trim_min_size
         self.trim_min_age = trim_min_age
         self.nonce = 0
         self.cleanup_interval = cleanup_interval
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._snapshot.x)
+
+    def snapshot(self) -> TimelineSnapshot:
+        return self._snapshot
+
+    def xy(self):
+        snapshot = self._snapshot
+        return snapshot.x, snapshot.y
+
     def x(self):
-        return self.data[:, 0]
+        return self._snapshot.x
 
     def y(self):
-        return self.data[:, 1]
+        return self._snapshot.y
+
+    def last_value(self):
+        return self._snapshot.y[-1]
 
     def add(self, value, interval=0.0):
         assert interval >= 0
-        interval = np.clip(interval, 1.0/30, None)    # Optimal value depends on tcode update frequency. Assume 30hz
-        begin_ts = time.time()
-        end_ts = begin_ts + interval
-
-        begin_index = np.searchsorted(self.data[:, 0], begin_ts)
-        end_index = np.searchsorted(self.data[:, 0], end_ts)
-        current_value = np.interp(begin_ts, self.x(), self.y())
-
-        if begin_index == 0:
-            # insert at very beginning, must be a bug?
-            self.data = np.array([[end_ts, value]], dtype=self.data.dtype)
-        elif begin_index == end_index:
-            # strip away future data, add linear segment at end
-            # to avoid changing current data
-            self.data = np.vstack((self.data[:end_index],
-                                   [[begin_ts, current_value],
-                                    [end_ts, value]]))
-        else:
-            # strip away future data, add single data point at end
-            self.data = np.vstack((self.data[:end_index], [[end_ts, value]]))
-
-        self.cleanup_if_needed()
-
-    def cleanup_if_needed(self):
+        interval = max(interval, 1.0/30)    # Optimal value depends on tcode update frequency. Assume 30hz
+        with self._lock:
+            begin_ts = time.time()
+            end_ts = begin_ts + interval
+
+            x, y, start, end = self._state
+            begin_index = start + int(np.searchsorted(x[start:end], begin_ts))
+            # typically no or very few points in the future
+            end_index = begin_index
+            while end_index < end and x[end_index] < end_ts:
+                end_index += 1
+
+            if begin_index == start:
+                # insert at very beginning, must be a bug?
+                self._write(start, ((end_ts, value),))
+            elif begin_index == end_index:
+                # strip away future data, add linear segment at end
+                # to avoid changing current data
+                if begin_index == end:
+                    current_value = y[end - 1]
+                else:
+                    x0, x1 = x[begin_index - 1], x[begin_index]
+                    y0, y1 = y[begin_index - 1], y[begin_index]
+                    current_value = y0 + (y1 - y0) * (begin_ts - x0) / (x1 - x0)
+                self._write(end_index, ((begin_ts, current_value), (end_ts, value)))
+            else:
+                # strip away future data, add single data point at end
+                self._write(end_index, ((end_ts, value),))
+
+            self.cleanup_if_needed(begin_ts)
+            self._publish()
+        parameter_epoch.advance()
+
+    def _publish(self):
+        x, y, start, end = self._state
+        version = self._snapshot.version + 1 if self._snapshot else 0
+        self._snapshot = TimelineSnapshot(read_only(x[start:end]), read_only(y[start:end]), version)
+
+    def _write(self, index, points):
+        """
+        Replace all points from index with points.
+        """
+        x, y, start, old_end = self._state
+        end = index + len(points)
+        if end > len(x) or index < old_end:
+            # full, or published points would change
+            live = index - start
+            capacity = len(x) * 2 if (live + len(points)) * 2 > len(x) else len(x)
+            new_x = np.zeros(capacity, dtype=x.dtype)
+            new_y = np.zeros(capacity, dtype=y.dtype)
+            new_x[:live] = x[start:index]
+            new_y[:live] = y[start:index]
+            x, y, start, index = new_x, new_y, 0, live
+            end = index + len(points)
+        for i, (px, py) in enumerate(points):
+            x[index + i] = px
+            y[index + i] = py
+        self._state = (x, y, start, end)
+
+    def cleanup_if_needed(self, now=None):
         self.nonce += 1
         if self.nonce >= self.cleanup_interval:
-            if self.data.shape[0] > self.trim_min_size and self.data[0][0] < (time.time() - self.trim_min_age):
-                cutoff = time.time() - self.trim_min_age
-                self.data = self.data[self.data[:, 0] > cutoff]
+            self.nonce = 0
+            now = time.time() if now is None else now
+            x, y, start, end = self._state
+            cutoff = now - self.trim_min_age
+            if end - start > self.trim_min_size and x[start] < cutoff:
+                start += int(np.searchsorted(x[start:end], cutoff, side='right'))
+                self._state = (x, y, start, end)
 
 
 class Interpolator(ABC):
@@ -110,13 +242,92 @@ class Interpolator(ABC):
 
 class LinearInterpolator(Interpolator):
     def interpolate(self, timeline: Timeline, timestamp):
-        return np.interp(timestamp, timeline.x(), timeline.y())
+        x, y = timeline.xy()
+        return np.interp(timestamp, x, y)
 
 
 class StairStepInterpolator(Interpolator):
     def interpolate(self, timeline: Timeline, timestamp):
-        index = np.clip(np.searchsorted(timeline.x(), timestamp, side='right') - 1, 0, None)
-        return timeline.y()[index]
+        x, y = timeline.xy()
+        index = np.clip(np.searchsorted(x, timestamp, side='right') - 1, 0, None)
+        return y[index]
+
+
+class CursorInterpolator(Interpolator):
+    """
+    Linear interpolation with the same results as LinearInterpolator, for timelines that are
+    evaluated at (mostly) increasing timestamps, like a funscript during playback.
+
+    The segment of the last lookup is kept as a cursor. Lookups inside that segment need no search at all,
+    the next lookups scan a few points from there, only a seek falls back to a binary search.
+    Time going back more than one point is always a seek, so it goes to the binary search without scanning.
+    Large arrays of timestamps only interpolate against the few points they span.
+    The cursor is only a hint, every lookup validates it, so sharing the interpolator between threads is safe.
+    """
+    max_scan = 4
+
+    def __init__(self):
+        self.cursor = 0
+        self.segment = None     # (x, x0, x1, y0, slope) of the segment at the cursor
+
+    def find(self, x: np.ndarray, t: float) -> int:
+        """
+        :return: index of the last point with x <= t, -1 if t is before the first point
+        """
+        n = len(x)
+        j = min(self.cursor, n - 1)
+        if j > 0 and x.item(j - 1) > t:
+            j = int(np.searchsorted(x, t, side='right')) - 1
+            self.cursor = j
+            return j
+        for _ in range(self.max_scan):
+            if j + 1 < n and x.item(j + 1) <= t:
+                j += 1
+            elif j >= 0 and x.item(j) > t:
+                j -= 1
+            else:
+                break
+        else:
+            j = int(np.searchsorted(x, t, side='right')) - 1
+        self.cursor = j
+        return j
+
+    def interpolate(self, timeline: Timeline, timestamp):
+        x, y = timeline.xy()
+        segment = self.segment
+        if type(timestamp) is not np.ndarray:
+            if segment is not None and segment[0] is x and segment[1] <= timestamp < segment[2]:
+                _, x0, _, y0, slope = segment
+                return np.float64(slope * (float(timestamp) - x0) + y0)
+            timestamp = np.asarray(timestamp)
+
+        if timestamp.ndim:
+            if len(x) > len(timestamp) or len(x) == 0:
+                # np.interp only precomputes the slopes of all points when there are fewer points than timestamps
+                return np.interp(timestamp, x, y)
+            first, last = timestamp.min(), timestamp.max()
+            if segment is not None and segment[0] is x and segment[1] <= first and last < segment[2]:
+                _, x0, _, y0, slope = segment
+                return slope * (timestamp - x0) + y0
+            lo = max(self.find(x, first), 0)
+            hi = self.find(x, last) + 2
+            return np.interp(timestamp, x[lo:hi], y[lo:hi])
+
+        t = float(timestamp)
+        if len(x) == 0 or t != t:
+            return np.interp(timestamp, x, y)   # error or nan, like LinearInterpolator
+
+        j = self.find(x, t)
+        if j < 0:
+            return np.float64(y.item(0))
+        if j == len(x) - 1:
+            return np.float64(y.item(j))
+        # same formula as np.interp
+        x0, x1 = x.item(j), x.item(j + 1)
+        y0 = y.item(j)
+        slope = (y.item(j + 1) - y0) / (x1 - x0)
+        self.segment = (x, x0, x1, y0, slope)
+        return np.float64(slope * (t - x0) + y0)
 
 
 class Axis(AbstractAxis):
@@ -134,6 +345,9 @@ class Axis(AbstractAxis):
     def last_value(self):
         return self.timeline.y()[-1]
 
+    def snapshot(self) -> TimelineSnapshot:
+        return self.timeline.snapshot()
+
 
 class WriteProtectedAxis(Axis):
     def __init__(self, timeline, interpolator: Interpolator, timestamp_mapper: AbstractTimestampMapper):
@@ -145,10 +359,19 @@ class WriteProtectedAxis(Axis):
 
 class ConstantAxis(AbstractAxis):
     def __init__(self, init_value):
-        self.value = init_value
+        self._state = (init_value, 0)   # value and version, published together
+
+    @property
+    def value(self):
+        return self._state[0]
 
     def add(self, value, interval=0.0):
-        self.value = value
+        self._state = (value, self._state[1] + 1)
+        parameter_epoch.advance()
+
+    def snapshot(self) -> TimelineSnapshot:
+        value, version = self._state
+        return TimelineSnapshot(read_only(np.zeros(1)), read_only(np.array([value])), version)
 
     def interpolate(self, timestamp):
         if isinstance(timestamp, collections.abc.Sequence):
@@ -175,8 +398,8 @@ def create_constant_axis(init_value):
 
 def create_precomputed_axis(x, y, timestamp_mapper: AbstractTimestampMapper, interpolation='linear'):
     return WriteProtectedAxis(
-        Timeline(x, y),
-        LinearInterpolator(),
+        Timeline(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)),
+        CursorInterpolator(),
         timestamp_mapper
     )
 
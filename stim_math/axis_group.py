@@ -0,0 +1,216 @@
+import collections
+
+import numpy as np
+
+from stim_math.axis import AbstractAxis, AbstractTimestampMapper, WriteProtectedAxis, Timeline, \
+    LinearInterpolator, CursorInterpolator
+
+
+class SharedTimeline:
+    """
+    Structure of arrays for precomputed axes that use the same timestamp mapper: all axes are resampled
+    onto the union of their timestamps, so one search finds the segment for every axis.
+    Resampling a piecewise linear function at a superset of its points does not change it,
+    the results equal np.interp up to rounding.
+    """
+    max_segments_per_block = 32
+
+    def __init__(self, timestamp_mapper: AbstractTimestampMapper, axes: list[WriteProtectedAxis]):
+        self.timestamp_mapper = timestamp_mapper
+        self.x = np.unique(np.concatenate([axis.timeline.x() for axis in axes]))
+        self.y = np.empty((len(axes), len(self.x)))   # one row per axis
+        for row, axis in zip(self.y, axes):
+            x, y = axis.timeline.xy()
+            row[:] = np.interp(self.x, x, y)
+        if len(self.x) > 1:
+            self.slope = np.diff(self.y, axis=1) / np.diff(self.x)
+        else:
+            self.slope = np.zeros((len(axes), 0))
+        self.search = CursorInterpolator()
+        self.segment = None     # (lower, upper, x0, y0, slope) of the last scalar lookup
+
+    def values_at(self, timestamp: float) -> np.ndarray:
+        """
+        :return: value of every axis at a single (already mapped) timestamp
+        """
+        segment = self.segment
+        if segment is None or not segment[0] <= timestamp < segment[1]:
+            segment = self._segment(self.search.find(self.x, timestamp))
+            self.segment = segment
+        _, _, x0, y0, slope = segment
+        return y0 + slope * (timestamp - x0)
+
+    def _segment(self, j):
+        x = self.x
+        if j < 0:
+            return -np.inf, x[0], x[0], self.y[:, 0], np.zeros(len(self.y))
+        if j >= len(x) - 1:
+            return x[-1], np.inf, x[-1], self.y[:, -1], np.zeros(len(self.y))
+        return x[j], x[j + 1], x[j], self.y[:, j], self.slope[:, j]
+
+    def values(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        :return: array (axis, timestamp) of the values at (already mapped) timestamps
+        """
+        x = self.x
+        if len(x) == 1:
+            return np.repeat(self.y, len(timestamps), axis=1)
+        t = np.clip(timestamps, x[0], x[-1])
+        if len(t) == 0:
+            return np.empty((len(self.y), 0))
+
+        # a block of audio usually spans one or a few segments, only search those
+        increasing = not (t[1:] < t[:-1]).any()
+        first, last = (t[0], t[-1]) if increasing else (t.min(), t.max())
+        lo, hi = np.clip(np.searchsorted(x, (first, last), side='right') - 1, 0, len(x) - 2)
+        if increasing and hi - lo < self.max_segments_per_block:
+            # fill the samples of each segment at once
+            values = np.empty((len(self.y), len(t)))
+            ends = np.searchsorted(t, x[lo + 1:hi + 1], side='left').tolist() + [len(t)]
+            begin = 0
+            for j, end in enumerate(ends, lo):
+                if end > begin:
+                    np.multiply(self.slope[:, j, None], t[begin:end] - x[j], out=values[:, begin:end])
+                    values[:, begin:end] += self.y[:, j, None]
+                begin = end
+            return values
+        j = lo + np.searchsorted(x[lo + 1:hi + 1], t, side='right')
+        return np.take(self.y, j, axis=1) + np.take(self.slope, j, axis=1) * (t - x[j])
+
+
+class AxisGroup:
+    """
+    Evaluates a set of named axes at once.
+
+    Precomputed linear axes (funscripts) with the same timestamp mapper and (nearly) the same timestamps
+    are merged into a SharedTimeline, so the timestamp is mapped once and searched once for all of them.
+    All other axes (ui parameters, tcode, constants, scripts with timestamps of their own)
+    are interpolated individually, like before.
+    The result has a field per axis: a record array for an array of timestamps, a named tuple for a single one.
+
+    Precomputed axes never change, live axes are read on every call, so the group
+    can be built once when the algorithm is created.
+    """
+    # a SharedTimeline holds at most this many times the points of its largest axis,
+    # its memory is (axes * points), so unrelated scripts must not be merged
+    max_union_growth = 1.25
+
+    def __init__(self, axes: dict[str, AbstractAxis]):
+        self.axes = axes
+        self.names = list(axes)
+        self.dtype = np.dtype((np.record, [(name, np.float64) for name in self.names]))
+        self.values_type = collections.namedtuple('AxisValues', self.names)
+
+        precomputed = {}
+        self.others = []        # (column, axis)
+        for column, axis in enumerate(axes.values()):
+            if self.can_share(axis):
+                precomputed.setdefault(id(axis.timestamp_mapper), []).append((column, axis))
+            else:
+                self.others.append((column, axis))
+
+        self.shared = []        # (columns, SharedTimeline)
+        for members in precomputed.values():
+            for cluster in self.clusters(members):
+                if len(cluster) == 1:
+                    self.others += cluster
+                    continue
+                columns = [column for column, _ in cluster]
+                cluster = [axis for _, axis in cluster]
+                self.shared.append((columns, SharedTimeline(cluster[0].timestamp_mapper, cluster)))
+
+    def __getstate__(self):
+        # the named tuple type is created at runtime and can not be pickled, for the parallel bake
+        state = self.__dict__.copy()
+        del state['values_type']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.values_type = collections.namedtuple('AxisValues', self.names)
+
+    def clusters(self, members: list[tuple[int, WriteProtectedAxis]]) -> list[list[tuple[int, WriteProtectedAxis]]]:
+        """
+        Split (column, axis) pairs into clusters whose union of timestamps stays within
+        max_union_growth times the largest axis of the cluster.
+        """
+        clusters = []       # (union of timestamps, limit, members)
+        for column, axis in sorted(members, key=lambda member: -len(member[1].timeline.x())):
+            x = axis.timeline.x()
+            for cluster in clusters:
+                union = np.union1d(cluster[0], x)
+                if len(union) <= cluster[1]:
+                    cluster[0] = union
+                    cluster[2].append((column, axis))
+                    break
+            else:
+                clusters.append([x, self.max_union_growth * len(x), [(column, axis)]])
+        return [cluster[2] for cluster in clusters]
+
+    @staticmethod
+    def can_share(axis: AbstractAxis) -> bool:
+        return isinstance(axis, WriteProtectedAxis) \
+            and isinstance(axis.timeline, Timeline) \
+            and isinstance(axis.interpolator, (LinearInterpolator, CursorInterpolator)) \
+            and len(axis.timeline.x()) > 0
+
+    def evaluate(self, timestamps: np.ndarray) -> np.recarray:
+        """
+        :return: record array with the same length as timestamps,
+        fields are read like values.pulse_width or values['pulse_width']
+        """
+        timestamps = np.asarray(timestamps)
+        values = np.empty((len(timestamps), len(self.names)))
+        for columns, shared in self.shared:
+            values[:, columns] = shared.values(shared.timestamp_mapper.map_timestamp(timestamps)).T
+        for column, axis in self.others:
+            values[:, column] = axis.interpolate(timestamps)
+        return values.view(self.dtype, np.recarray)[:, 0]
+
+    def evaluate_at(self, timestamp: float) -> tuple:
+        """
+        Single timestamp version of evaluate(). Creating a numpy record costs more than
+        interpolating the axes, so this returns a named tuple with the same fields.
+        """
+        values = [None] * len(self.names)
+        for columns, shared in self.shared:
+            for column, value in zip(columns, shared.values_at(shared.timestamp_mapper.map_timestamp(timestamp))):
+                values[column] = value
+        for column, axis in self.others:
+            values[column] = axis.interpolate(timestamp)
+        return self.values_type._make(values)
+
+    def view(self, name: str) -> 'AxisGroupView':
+        return AxisGroupView(self, name)
+
+
+class AxisGroupView(AbstractAxis):
+    """
+    A single axis of an AxisGroup, for code that expects an AbstractAxis.
+    Interpolation reads the same data as AxisGroup.evaluate(), so the values are identical.
+    Only worth it for arrays, for a single axis at a single timestamp the axis itself is faster.
+    """
+    def __init__(self, group: AxisGroup, name: str):
+        self.group = group
+        self.name = name
+        self.axis = group.axes[name]
+        self.column = group.names.index(name)
+        self.shared = None
+        for columns, shared in group.shared:
+            if self.column in columns:
+                self.shared = shared
+                self.row = columns.index(self.column)
+
+    def interpolate(self, timestamp):
+        if self.shared is None:
+            return self.axis.interpolate(timestamp)
+        timestamp = self.shared.timestamp_mapper.map_timestamp(timestamp)
+        if isinstance(timestamp, np.ndarray) and timestamp.ndim:
+            return self.shared.values(timestamp)[self.row]
+        return self.shared.values_at(timestamp)[self.row]
+
+    def last_value(self):
+        return self.axis.last_value()
+
+    def add(self, value, interval=0.0):
+        self.axis.add(value, interval)
@@ -1,3 +1,5 @@
+import collections
+
 import numpy as np
 
 
@@ -19,4 +21,92 @@ def create_pulse_with_ramp_time(n_samples, carrier_cycles, rise_time):
 
 
 def create_pause(n_samples):
-    return np.zeros(n_samples)
\ No newline at end of file
+    return np.zeros(n_samples)
+
+
+def create_unit_pulse(n_samples, carrier_cycles, rise_time, polarity, start_angle):
+    """
+    Carrier multiplied by the pulse envelope, at full volume and without position information.
+    :return: (cos, sin) component of the pulse, as float32
+    """
+    envelope = create_pulse_with_ramp_time(n_samples, carrier_cycles, rise_time)
+    theta = start_angle + np.linspace(0, 2 * np.pi * carrier_cycles, n_samples) * polarity
+    return (np.cos(theta) * envelope).astype(np.float32), (np.sin(theta) * envelope).astype(np.float32)
+
+
+class PulseTemplateCache:
+    """
+    Bounded LRU cache of unit pulses. Pulse shape only depends on a handful of parameters
+    that rarely change, so most pulses can skip the envelope and carrier calculations.
+
+    The start angle is quantized to `angle_steps` steps per carrier cycle, pulse width and rise time
+    to `cycle_steps` steps per carrier cycle. When the shape differs from the previous pulse, for example
+    because a funscript drives the pulse width, the pulse is created without the cache: it would only
+    fill up with templates that are not used again.
+    """
+    def __init__(self, max_size=256, angle_steps=1024, cycle_steps=1024):
+        self.max_size = max_size
+        self.angle_steps = angle_steps
+        self.cycle_steps = cycle_steps
+        self.templates = collections.OrderedDict()
+        self.last_parameters = None
+        self.last_shape = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    def __getstate__(self):
+        # templates are created again on demand, the snapshots of a parallel bake are sent to other processes
+        state = self.__dict__.copy()
+        state['templates'] = collections.OrderedDict()
+        return state
+
+    def get(self, samplerate, n_samples, carrier_cycles, rise_time, polarity, start_angle):
+        angle_step = int(round(start_angle / (2 * np.pi) * self.angle_steps)) % self.angle_steps
+        parameters = (samplerate, n_samples, carrier_cycles, rise_time)
+        if parameters == self.last_parameters:
+            shape = self.last_shape
+        else:
+            self.last_parameters = parameters
+            shape = (samplerate, n_samples,
+                     int(round(carrier_cycles * self.cycle_steps)), int(round(rise_time * self.cycle_steps)))
+        if shape != self.last_shape:
+            self.last_shape = shape
+            self.bypassed += 1
+            return self.create(shape, polarity, angle_step)
+
+        key = shape + (polarity, angle_step)
+        try:
+            template = self.templates[key]
+        except KeyError:
+            self.misses += 1
+            template = self.create(shape, polarity, angle_step)
+            for component in template:
+                component.flags.writeable = False
+            self.templates[key] = template
+            if len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+                self.evictions += 1
+            return template
+
+        self.hits += 1
+        self.templates.move_to_end(key)
+        return template
+
+    def create(self, shape, polarity, angle_step):
+        samplerate, n_samples, cycles_step, rise_time_step = shape
+        return create_unit_pulse(n_samples, cycles_step / self.cycle_steps, rise_time_step / self.cycle_steps,
+                                 polarity, angle_step * 2 * np.pi / self.angle_steps)
+
+    def clear(self):
+        self.templates.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.templates),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bypassed': self.bypassed,
+        }
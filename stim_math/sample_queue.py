@@ -0,0 +1,145 @@
+import numpy as np
+
+
+class SampleQueue:
+    """
+    Fixed-capacity multichannel sample queue, backed by a single preallocated array.
+
+    Producers reserve a region at the back with `append()` and render directly into it,
+    consumers take views from the front with `pop()`. When the back of the array is reached
+    the (small) amount of unread data is moved to the front, so both the write region and
+    the read region are always contiguous views. The array is only reallocated if a single
+    request does not fit, which only happens for unusually large pulses or audio blocks.
+    """
+    def __init__(self, channels: int, capacity: int = 2 ** 16, dtype=np.float32):
+        self._data = np.zeros((channels, capacity), dtype=dtype)
+        self._read = 0
+        self._write = 0
+
+    def __getstate__(self):
+        # only the unread samples, the snapshots of a parallel bake are sent to other processes
+        return self.capacity(), self._data[:, self._read:self._write].copy()
+
+    def __setstate__(self, state):
+        capacity, samples = state
+        self._data = np.zeros((samples.shape[0], capacity), dtype=samples.dtype)
+        self._read = 0
+        self._write = samples.shape[1]
+        self._data[:, :self._write] = samples
+
+    def __len__(self):
+        return self._write - self._read
+
+    def channels(self) -> int:
+        return self._data.shape[0]
+
+    def capacity(self) -> int:
+        return self._data.shape[1]
+
+    def clear(self):
+        self._read = 0
+        self._write = 0
+
+    def append(self, n: int) -> np.ndarray:
+        """
+        Reserve n samples at the back of the queue.
+        :return: writable view of shape (channels, n). Contents are undefined, caller must fill all of it.
+        """
+        if self._write + n > self.capacity():
+            self._make_room(n)
+        region = self._data[:, self._write:self._write + n]
+        self._write += n
+        return region
+
+    def pop(self, n: int) -> np.ndarray:
+        """
+        Remove n samples from the front of the queue.
+        :return: view of shape (channels, n), only valid until the next call to append()
+        """
+        if n > len(self):
+            raise ValueError('not enough samples in queue')
+        region = self._data[:, self._read:self._read + n]
+        self._read += n
+        if self._read == self._write:
+            self._read = self._write = 0
+        return region
+
+    def pop_into(self, out: np.ndarray):
+        """
+        Remove len(out) samples from the front of the queue and copy them into out.
+        :param out: array of shape (n, channels), like the outdata of a sounddevice callback
+        """
+        out[:] = self.pop(out.shape[0]).T
+
+    def _make_room(self, n):
+        size = len(self)
+        if size + n > self.capacity():
+            capacity = self.capacity()
+            while size + n > capacity:
+                capacity *= 2
+            data = np.zeros((self.channels(), capacity), dtype=self._data.dtype)
+        else:
+            data = self._data
+        data[:, :size] = self._data[:, self._read:self._write]
+        self._data = data
+        self._read = 0
+        self._write = size
+
+
+class SampleRing:
+    """
+    Single-producer, single-consumer ring of multichannel samples, for handing audio from
+    a render thread to the audio callback without locks.
+
+    The producer only advances the write counter and the consumer only the read counter.
+    Both are plain ints that increase forever, assigning them is atomic under the GIL,
+    and a counter is only advanced after the samples it covers have been copied.
+    Storage is frame-major (capacity, channels), like the outdata of a sounddevice callback.
+    """
+    def __init__(self, channels: int, capacity: int, dtype=np.float32):
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self._read = 0
+        self._write = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def channels(self) -> int:
+        return self._data.shape[1]
+
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    def free(self) -> int:
+        return self.capacity() - len(self)
+
+    def write(self, channel_data) -> int:
+        """
+        Producer side. Copy one array per channel into the ring.
+        :return: number of samples written, less than given if the ring is full
+        """
+        n = min(len(channel_data[0]), self.free())
+        start = self._write % self.capacity()
+        first = min(n, self.capacity() - start)
+        for channel, data in enumerate(channel_data):
+            self._data[start:start + first, channel] = data[:first]
+            self._data[:n - first, channel] = data[first:n]
+        self._write += n
+        return n
+
+    def read_into(self, out: np.ndarray, channel_map=None) -> int:
+        """
+        Consumer side. Copy up to len(out) samples into out, of shape (n, channels).
+        :param channel_map: output column for every ring channel, default is the same column
+        :return: number of samples copied, the rest of out is left untouched
+        """
+        n = min(out.shape[0], len(self))
+        start = self._read % self.capacity()
+        first = min(n, self.capacity() - start)
+        if channel_map is None:
+            channel_map = range(self.channels())
+        for channel, out_channel in enumerate(channel_map):
+            out[:first, out_channel] = self._data[start:start + first, channel]
+            out[first:n, out_channel] = self._data[:n - first, channel]
+        self._read += n
+        return n
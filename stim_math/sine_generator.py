@@ -1,30 +1,135 @@
+import collections
+
 import numpy as np
 
+# tables of at least this size are built by repeated doubling
+DOUBLING_SIZE = 2048
 
-class SineGenerator1D:
-    def __init__(self):
+
+class Oscillator:
+    """
+    Phase-continuous quadrature oscillator, generates cos and sin of a phase that advances
+    at a constant frequency within a block, without evaluating cos/sin for every sample.
+
+    A block is the rotation exp(1j * theta) at the start of the block, multiplied by the table
+    exp(1j * omega * k). The table only depends on (n, omega) and is cached, so a block costs four
+    multiplies and two adds per sample. theta is accumulated like AngleGenerator and converted
+    to a rotation once per block, so no rounding error accumulates between blocks.
+    When the frequency changes every block (a carrier driven by a funscript), small blocks are
+    evaluated with cos/sin directly instead: building a table that is not used again costs more.
+    Output deviates less than 2e-7 from cos/sin evaluated in float64 (see benchmarks.oscillator).
+    """
+    def __init__(self, cache_size=8):
         self.theta = 0
+        self.cache_size = cache_size
+        self._tables = collections.OrderedDict()
+        self._last_omega = None
+        self._scratch = np.empty(0, dtype=np.float32)
+        self._angles = np.empty(0, dtype=np.float64)
+        self._k = np.arange(0, dtype=np.float64)
+
+    def rotation_table(self, n, omega):
+        """
+        :return: (cos(omega * k), sin(omega * k)) for k in range(n), as float32
+        """
+        key = (n, omega)
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            return table
+
+        if n < DOUBLING_SIZE:
+            angles = np.arange(n) * omega
+            table = (np.cos(angles).astype(np.float32), np.sin(angles).astype(np.float32))
+        else:
+            # build by repeated doubling, faster for large tables and accurate to a few ulp in float64
+            rotation = np.empty(n, dtype=np.complex128)
+            rotation[:1] = 1
+            m = 1
+            while m < n:
+                k = min(m, n - m)
+                np.multiply(rotation[:k], np.exp(1j * omega * m), out=rotation[m:m + k])
+                m *= 2
+            table = (rotation.real.astype(np.float32), rotation.imag.astype(np.float32))
+        table[0].flags.writeable = False
+        table[1].flags.writeable = False
+
+        self._tables[key] = table
+        if len(self._tables) > self.cache_size:
+            self._tables.popitem(last=False)
+        return table
+
+    def generate_into(self, n, frequency: float, samplerate: float, out_cos: np.ndarray, out_sin: np.ndarray):
+        """
+        Write cos and sin of the next n samples into float32 buffers of length n.
+        """
+        omega = 2 * np.pi * frequency / samplerate
+        changed = omega != self._last_omega
+        self._last_omega = omega
+        if changed and n < DOUBLING_SIZE and (n, omega) not in self._tables:
+            self.evaluate_into(n, omega, out_cos, out_sin)
+            self.skip(n, frequency, samplerate)
+            return
+
+        table_cos, table_sin = self.rotation_table(n, omega)
+        c0 = np.float32(np.cos(self.theta))
+        s0 = np.float32(np.sin(self.theta))
+        self.skip(n, frequency, samplerate)
+
+        if len(self._scratch) < n:
+            self._scratch = np.empty(n, dtype=np.float32)
+        scratch = self._scratch[:n]
+        # cos(a + b) = cos a cos b - sin a sin b
+        np.multiply(table_cos, c0, out=out_cos)
+        np.multiply(table_sin, s0, out=scratch)
+        out_cos -= scratch
+        # sin(a + b) = sin a cos b + cos a sin b
+        np.multiply(table_cos, s0, out=out_sin)
+        np.multiply(table_sin, c0, out=scratch)
+        out_sin += scratch
+
+    def evaluate_into(self, n, omega, out_cos: np.ndarray, out_sin: np.ndarray):
+        """
+        Write cos and sin of theta + omega * k directly, for blocks whose table would not be reused.
+        """
+        if len(self._k) < n:
+            self._k = np.arange(n, dtype=np.float64)
+            self._angles = np.empty(n, dtype=np.float64)
+        angles = self._angles[:n]
+        np.multiply(self._k[:n], omega, out=angles)
+        angles += self.theta
+        np.cos(angles, out=out_cos)
+        np.sin(angles, out=out_sin)
 
     def generate(self, n, frequency: float, samplerate: float):
-        begin = self.theta
-        end = self.theta + 2 * np.pi * frequency * (n / samplerate)
-        self.theta = end
+        """
+        :return: (cos, sin) of the next n samples, as new float32 arrays
+        """
+        out_cos = np.empty(n, dtype=np.float32)
+        out_sin = np.empty(n, dtype=np.float32)
+        self.generate_into(n, frequency, samplerate, out_cos, out_sin)
+        return out_cos, out_sin
 
-        t = np.linspace(begin, end, n, endpoint=False)
-        return np.sin(t).astype(np.float32)
+    def skip(self, n, frequency: float, samplerate: float):
+        self.theta = self.theta + 2 * np.pi * frequency * (n / samplerate)
 
 
-class SineGenerator2D:
+class SineGenerator1D:
     def __init__(self):
-        self.theta = 0
+        self.oscillator = Oscillator()
 
     def generate(self, n, frequency: float, samplerate: float):
-        begin = self.theta
-        end = self.theta + 2 * np.pi * frequency * (n / samplerate)
-        self.theta = end
+        _, sin = self.oscillator.generate(n, frequency, samplerate)
+        return sin
 
-        t = np.linspace(begin, end, n, endpoint=False)
-        return np.sin(t).astype(np.float32), np.cos(t).astype(np.float32)
+
+class SineGenerator2D:
+    def __init__(self):
+        self.oscillator = Oscillator()
+
+    def generate(self, n, frequency: float, samplerate: float):
+        cos, sin = self.oscillator.generate(n, frequency, samplerate)
+        return sin, cos
 
 
 class AngleGenerator:
@@ -38,6 +143,9 @@ class AngleGenerator:
 
         return np.linspace(begin, end, n, endpoint=False)
 
+    def skip(self, n, frequency: float, samplerate: float):
+        self.theta = self.theta + 2 * np.pi * frequency * (n / samplerate)
+
 
 class AngleGeneratorWithVaryingIPI:
     def __init__(self):
@@ -68,6 +176,9 @@ class AngleGeneratorWithVaryingIPI:
         x = np.linspace(begin, end, n, endpoint=False)
         return self.randomize(x, random)
 
+    def skip(self, n, frequency: float, samplerate: float):
+        self.theta = self.theta + 2 * np.pi * frequency * (n / samplerate)
+
 
 class PulseGenerator:
     def __init__(self):
@@ -6,6 +6,10 @@ from stim_math.transforms import (
     ab_transform, ab_transform_inv)
 
 
+# maps the (alpha, beta) potentials to the (L, R) channels
+ab_to_channel_matrix = (potential_to_channel_matrix @ ab_transform)[:2, :2] / np.sqrt(3)
+
+
 class ThreePhaseSignalGenerator:
     """
     See also https://github.com/diglet48/restim/wiki/technical-documentation
@@ -58,31 +62,67 @@ class ThreePhaseSignalGenerator:
         return carrier_x, carrier_y
 
     @staticmethod
-    def generate(theta, alpha, beta, chunksize=10000):
+    def generate(theta, alpha, beta, chunksize=10000, output_matrix=None):
+        """
+        :param output_matrix: 2x2 matrix from (alpha, beta) to (L, R). Defaults to ab_to_channel_matrix,
+            pass a pre-multiplied matrix to apply hardware calibration in the same pass.
+        """
+        carrier_x, carrier_y = ThreePhaseSignalGenerator.carrier(theta)
+        return ThreePhaseSignalGenerator.generate_from_carrier(carrier_x, carrier_y, alpha, beta,
+                                                               chunksize, output_matrix)
+
+    @staticmethod
+    def generate_from_carrier(carrier_x, carrier_y, alpha, beta, chunksize=10000, output_matrix=None):
+        """
+        Like generate(), for a carrier that is already evaluated, see stim_math.sine_generator.Oscillator
+        """
+        if output_matrix is None:
+            output_matrix = ab_to_channel_matrix
+
         # split into chunks for better cache performance and lower peak memory usage
-        if len(theta) > (2 * chunksize):
-            L = np.empty_like(theta, dtype=np.float32)
-            R = np.empty_like(theta, dtype=np.float32)
-            for start in np.arange(0, len(theta), chunksize):
+        if len(carrier_x) > (2 * chunksize):
+            L = np.empty_like(carrier_x, dtype=np.float32)
+            R = np.empty_like(carrier_x, dtype=np.float32)
+            for start in np.arange(0, len(carrier_x), chunksize):
                 end = start + chunksize
-                l, r = ThreePhaseSignalGenerator.generate(theta[start:end],
-                                                          alpha[start:end],
-                                                          beta[start:end])
+                l, r = ThreePhaseSignalGenerator.generate_from_carrier(carrier_x[start:end],
+                                                                       carrier_y[start:end],
+                                                                       alpha[start:end],
+                                                                       beta[start:end],
+                                                                       output_matrix=output_matrix)
                 L[start:end] = l
                 R[start:end] = r
             return L, R
 
-        carrier_x, carrier_y = ThreePhaseSignalGenerator.carrier(theta)
-
         # apply projection
         t11, t12, t21, t22 = ThreePhaseSignalGenerator.project_on_ab_coefs(alpha, beta)
         a = t11 * carrier_x + t12 * carrier_y
         b = t21 * carrier_x + t22 * carrier_y
 
-        T = (potential_to_channel_matrix @ ab_transform)[:2, :2] / np.sqrt(3)
-        L, R = T @ np.array([a, b])
+        T = output_matrix
+        L = T[0, 0] * a + T[0, 1] * b
+        R = T[1, 0] * a + T[1, 1] * b
         return L, R
 
+    @staticmethod
+    def squeeze_matrix(alpha: float, beta: float):
+        """
+        Returns the 2x2 squeeze matrix for a single position.
+        """
+        t11, t12, t21, t22 = ThreePhaseSignalGenerator.project_on_ab_coefs(np.atleast_1d(alpha), np.atleast_1d(beta))
+        return np.array([[t11[0], t12[0]],
+                         [t21[0], t22[0]]])
+
+    @staticmethod
+    def channel_matrix(alpha: float, beta: float, output_matrix=None):
+        """
+        Returns the 2x2 matrix that maps the carrier [cos, sin] to [L, R], for a single position.
+        Equivalent to generate(), but suitable for signals with constant position.
+        """
+        if output_matrix is None:
+            output_matrix = ab_to_channel_matrix
+        return output_matrix @ ThreePhaseSignalGenerator.squeeze_matrix(alpha, beta)
+
     @staticmethod
     def alpha_beta_amplitude(alpha, beta):
         """
@@ -224,11 +264,18 @@ class ThreePhaseHardwareCalibration:
         k = 1 / np.max((k1, k2))
         return k * 3**.5
 
-    def apply_transform(self, L, R):
+    def corrective_matrix(self):
+        """
+        :return: 2x2 matrix that applies the calibration to (L, R)
+        """
         transform = self.generate_transform_in_ab()
         corrective_matrix = potential_to_channel_matrix @ ab_transform @ transform @ ab_transform_inv @ potential_to_channel_matrix_inv
         corrective_matrix = corrective_matrix * self.scaling_contant(transform)
-        L, R = corrective_matrix[:2, :2] @ (L, R)
+        return corrective_matrix[:2, :2]
+
+    def apply_transform(self, L, R):
+        corrective_matrix = self.corrective_matrix()
+        L, R = corrective_matrix @ (L, R)
         return L, R
 
 